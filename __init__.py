@@ -5,15 +5,25 @@
 # license that can be found in the LICENSE file or at
 # https://opensource.org/licenses/MIT.
 
-import genie_acs
+from importlib import import_module as _import_module
 import main
 import model
-import raemis
-import routeros_api
-import routers
 
 from main import Application, Config
 
+# the device and router clients pull in their network stacks, so they are only
+# imported when first used
+_lazy = ("genie_acs", "raemis", "routeros_api", "routers")
+
+
+def __getattr__(name: str):
+    if name not in _lazy:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = _import_module(name)
+    globals()[name] = value
+    return value
+
+
 __all__ = [
     "main", "model", "raemis", "genie_acs", "routers", "routeros_api",
     "Application", "Config"
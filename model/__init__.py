@@ -8,6 +8,8 @@
 from .network import IPv4Address, MACAddress, IMEI
 from .atoms import Item, Account, Address, Model, Manufacturer
 from .structures import MergeSet
+from .snapshot import InventorySnapshot
+from .metrics import MetricStore
 
 __all__ = [
     "MACAddress",
@@ -17,6 +19,8 @@ __all__ = [
     "Address",
     "IMEI",
     "MergeSet",
+    "InventorySnapshot",
+    "MetricStore",
     "Model",
     "Manufacturer",
 ]
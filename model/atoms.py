@@ -7,11 +7,18 @@
 
 
 from collections import UserString as _UserString
-from dataclasses import dataclass as _dc
+from dataclasses import dataclass as _dc, fields as _fields
 import logging
-from typing import Any as _Any, FrozenSet as _FrozenSet
+from operator import attrgetter as _attrgetter
+from typing import (
+    Any as _Any,
+    Callable as _Callable,
+    FrozenSet as _FrozenSet,
+    Iterator as _Iterator,
+)
 from typing_extensions import Self as _Self
 from enum import Enum as _Enum
+import re as _re
 from model.network import (
     IPv4Address as _IPv4Address,
     MACAddress as _MACAddress,
@@ -20,6 +27,100 @@ from model.network import (
 )
 
 
+_NUMBER = _re.compile(r"[-+]?\d+(\.\d+)?")
+
+
+def to_reading(value: _Any) -> float | None:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return None if value != value else float(value)
+    found = _NUMBER.search(str(value))
+    return float(found.group()) if found else None
+
+
+# RF readings are kept as floats however the collector found them, in the
+# slot of the same name with a leading underscore
+class _Reading:
+    slot: str
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.slot = f"_{name}"
+
+    def __get__(self, obj: object, owner: type | None = None) -> _Any:
+        if obj is None:
+            return self
+        return getattr(obj, self.slot)
+
+    def __set__(self, obj: object, value: _Any) -> None:
+        setattr(obj, self.slot, to_reading(value))
+
+
+# slotted atoms leave a field unset until something assigns it; reads of an
+# unset field fall back to its default, and assigned() only yields the fields
+# that were set, which is what MergeSet merges. _set has one bit per field so
+# that doesn't take an AttributeError per unset slot
+class _Compact:
+    __slots__ = ("_set", "_key", "_hash")
+    # assigning one of these drops the cached key and hash
+    _identity: frozenset[str] = frozenset()
+    _defaults: dict[str, _Any] = {}
+    _bits: dict[str, int] = {}
+    _layouts: dict[int, tuple[tuple[str, ...], _Callable[[_Any], _Any]]] = {}
+
+    def __getattr__(self, name: str) -> _Any:
+        try:
+            return self._defaults[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name: str, value: _Any) -> None:
+        object.__setattr__(self, name, value)
+        bit = self._bits.get(name)
+        if bit:
+            object.__setattr__(self, "_set", self._set | bit)
+        if name in self._identity:
+            object.__setattr__(self, "_key", None)
+
+    # items collected the same way share a mask, so the slot names and a C
+    # getter for them are worked out once per mask
+    @classmethod
+    def _layout(cls, mask: int) -> tuple[tuple[str, ...], _Callable[[_Any], _Any]]:
+        found = cls._layouts.get(mask)
+        if found is None:
+            names = tuple(n for n, bit in cls._bits.items() if mask & bit)
+            get = _attrgetter(*names) if names else (lambda _: ())
+            if len(names) == 1:
+                get = lambda obj, _get=get: (_get(obj),)
+            found = cls._layouts[mask] = (names, get)
+        return found
+
+    def assigned(self) -> _Iterator[tuple[str, _Any]]:
+        names, get = self._layout(self._set)
+        return zip(names, get(self))
+
+    # pickled as the assigned mask plus the assigned values in field order
+    def __getstate__(self) -> tuple[int, tuple[_Any, ...]]:
+        mask = self._set
+        return mask, self._layout(mask)[1](self)
+
+    def __setstate__(self, state: tuple[int, tuple[_Any, ...]]) -> None:
+        mask, values = state
+        for name, value in zip(self._layout(mask)[0], values):
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, "_set", mask)
+
+    @classmethod
+    def _compact(cls) -> None:
+        cls._defaults = {f.name: f.default for f in _fields(cls)} | {
+            "_set": 0,
+            "_key": None,
+            "_hash": None,
+        }
+        cls._bits = {f.name: 1 << n for n, f in enumerate(_fields(cls))}
+        cls._layouts = {}
+
+
 class Manufacturer(_Enum):
     BAICELLS = "Baicells"
     TELRAD = "Telrad"
@@ -99,7 +200,7 @@ class Name(_UserString):
         return s
 
 
-@_dc
+@_dc(slots=True)
 class Address:
     sonar_id: str | None = None
     line1: str | None = None
@@ -141,8 +242,8 @@ class Address:
         )
 
 
-@_dc
-class Account:
+@_dc(slots=True)
+class Account(_Compact):
     logger = logging.getLogger(__name__)
     sonar_id: str | None = None
     name: Name | None = None
@@ -157,22 +258,31 @@ class Account:
     def __repr__(self) -> str:
         return f'{{{"id: " + str(self.sonar_id) + ", " if self.sonar_id else ""}{"name: " + self.name + ", " if self.name else ""}{"address: " + repr(self.address) if self.address else ""}}}'
 
+    _identity = frozenset(("sonar_id", "name"))
+
     def __hash__(self):
-        return hash(self.key)
+        self.key  # refreshes _hash
+        return self._hash
 
     @property
     def key(self):
-        ret = []
-        if self.sonar_id:
-            ret.append(self.sonar_id)
-        if self.name:
-            ret.append(self.name)
-        return frozenset(ret)
+        key = self._key
+        if key is None:
+            ret = []
+            if self.sonar_id:
+                ret.append(self.sonar_id)
+            if self.name:
+                ret.append(self.name)
+            key = frozenset(ret)
+            object.__setattr__(self, "_key", key)
+            object.__setattr__(self, "_hash", hash(key))
+        return key
 
     def __eq__(self, __o: object) -> bool:
-        if not isinstance(__o, Account) or len(self.key) == 0 or len(__o.key) == 0:
+        if not isinstance(__o, Account):
             return False
-        return any(map(lambda x: x in self.key, __o.key))
+        mine, theirs = self.key, __o.key
+        return bool(mine) and bool(theirs) and not mine.isdisjoint(theirs)
 
     @classmethod
     def from_sonar(cls, d: dict[str, _Any]) -> _Self:
@@ -233,9 +343,10 @@ class Account:
         return ret
 
 
-@_dc
-class Item(object):
+@_dc(slots=True)
+class Item(_Compact):
     logger = logging.getLogger(__name__)
+    _identity = frozenset(("sonar_id", "mac_address", "imei", "imsi", "_account"))
     mac_address: _MACAddress | None = None
     serial_number: str | None = None
     product_id: str | None = None
@@ -251,19 +362,19 @@ class Item(object):
     cell_id: str | None = None
     full_cell_id: str | None = None
     sim_index: str | None = None
-    rsrp: str | None = None
-    rsrq: str | None = None
-    rssi: str | None = None
+    _rsrp: float | None = None
+    _rsrq: float | None = None
+    _rssi: float | None = None
     eci: str | None = None
     earfcn: str | None = None
-    sinr: str | None = None
+    _sinr: float | None = None
     bandwidth: str | None = None
     tx_rate: str | None = None
     max_tx_rate: str | None = None
-    tx_power: str | None = None
+    _tx_power: float | None = None
     rx_rate: str | None = None
     max_rx_rate: str | None = None
-    rx_power: str | None = None
+    _rx_power: float | None = None
     rx_mcs: str | None = None
     tx_mcs: str | None = None
     mcc: str | None = None
@@ -278,6 +389,13 @@ class Item(object):
     _account: Account | None = None
     _ipv4: _IPv4Address | None = None
 
+    rsrp = _Reading()
+    rsrq = _Reading()
+    rssi = _Reading()
+    sinr = _Reading()
+    tx_power = _Reading()
+    rx_power = _Reading()
+
     @property
     def ipv4(self) -> _IPv4Address | None:
         return self._ipv4
@@ -302,14 +420,20 @@ class Item(object):
                 f"item has account {self._account} and trying to assign {__o}, but that does not match and it should"
             )
             raise ValueError
-        for k, v in __o.__dict__.items():
+        for k, v in __o.assigned():
             setattr(self._account, k, v)
 
+    # the cached key remembers which account key it was built with, since an
+    # account can gain a sonar id after it is attached to the item
     @property
     def key(self) -> _FrozenSet[Account | _MACAddress | _IPv4Address | _IMEI | _IMSI]:
+        cached = self._key
+        account = self._account
+        if cached is not None and (account is None or cached[1] is account.key):
+            return cached[0]
         ret = []
-        if self.account:
-            ret.append(self.account)
+        if account:
+            ret.append(account)
         if self.sonar_id:
             ret.append(self.sonar_id)
         if self.mac_address:
@@ -318,10 +442,14 @@ class Item(object):
             ret.append(self.imei)
         if self.imsi:
             ret.append(self.imsi)
-        return frozenset(ret)
+        key = frozenset(ret)
+        object.__setattr__(self, "_key", (key, account.key if account else None))
+        object.__setattr__(self, "_hash", hash(key))
+        return key
 
     def __hash__(self) -> int:
-        return hash(self.key)
+        self.key  # refreshes _hash
+        return self._hash
 
     def __init__(self):
         self.linked_to_account = False
@@ -335,11 +463,10 @@ class Item(object):
     def __eq__(self, __o: object) -> bool:
         if not isinstance(__o, Item):
             return False
-        if len(self.key) == 0 and len(__o.key) == 0:
+        mine, theirs = self.key, __o.key
+        if not mine and not theirs:
             return True
-        elif len(self.key) == 0 or len(__o.key) == 0:
-            return False
-        return any(map(lambda x: x in self.key, __o.key))
+        return not mine.isdisjoint(theirs)
 
     @classmethod
     def from_sonar(cls, d: dict[str, _Any]) -> _Self:
@@ -416,6 +543,10 @@ class Item(object):
         return ret
 
 
+Account._compact()
+Item._compact()
+
+
 def from_sonar(d: dict[str, _Any]) -> Item:
     item = Item()
     if "addresses" in d and d["addresses"]["entities"]:
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import asyncio as _asyncio
+import logging as _logging
+from typing import (
+    TYPE_CHECKING as _TYPE_CHECKING,
+    Any as _Any,
+    AsyncIterable as _AsyncIterable,
+    AsyncIterator as _AsyncIterator,
+    Callable as _Callable,
+    Iterable as _Iterable,
+    TypeVar as _TypeVar,
+)
+
+if _TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor as _PPE
+
+_T = _TypeVar("_T")
+
+
+def _convert_chunk(fn: _Callable[[_Any], _T], chunk: list[_Any]) -> list[_T]:
+    return [fn(x) for x in chunk]
+
+
+# turns api records (dicts) into model objects as pages arrive. conversion is
+# cheaper than pickling records to a worker and the results back, so it runs
+# in-process unless `processes` is set and a page is big enough to pay for it
+class Converter:
+    _logger = _logging.getLogger(__name__)
+    processes: int = 0
+    threshold: int = 5000
+    chunksize: int = 500
+    _pool: "_PPE | None" = None
+
+    @classmethod
+    def _executor(cls) -> "_PPE":
+        if cls._pool is None:
+            # multiprocessing is only imported when the pool is opted into
+            from concurrent.futures import ProcessPoolExecutor as _PPE
+
+            cls._logger.info(f"starting {cls.processes} conversion processes")
+            cls._pool = _PPE(max_workers=cls.processes)
+        return cls._pool
+
+    @classmethod
+    async def convert(
+        cls, fn: _Callable[[_Any], _T], records: _Iterable[_Any]
+    ) -> list[_T]:
+        records = records if isinstance(records, list) else list(records)
+        if cls.processes > 0 and len(records) >= cls.threshold:
+            return await cls._convert_in_pool(fn, records)
+        ret = []
+        for start in range(0, len(records), cls.chunksize):
+            if start:
+                # let other requests make progress during a big page
+                await _asyncio.sleep(0)
+            ret.extend(fn(x) for x in records[start : start + cls.chunksize])
+        return ret
+
+    @classmethod
+    async def _convert_in_pool(
+        cls, fn: _Callable[[_Any], _T], records: list[_Any]
+    ) -> list[_T]:
+        pool = cls._executor()
+        futures = [
+            _asyncio.wrap_future(
+                pool.submit(_convert_chunk, fn, records[k : k + cls.chunksize])
+            )
+            for k in range(0, len(records), cls.chunksize)
+        ]
+        return [x for chunk in await _asyncio.gather(*futures) for x in chunk]
+
+    @classmethod
+    async def convert_pages(
+        cls, fn: _Callable[[_Any], _T], pages: _AsyncIterable[_Iterable[_Any]]
+    ) -> list[_T]:
+        ret = []
+        async for page in pages:
+            ret.extend(await cls.convert(fn, page))
+        return ret
+
+    # converts a stream of single records in bounded batches, so peak memory
+    # depends on the batch size rather than on the size of the response
+    @classmethod
+    async def convert_stream(
+        cls, fn: _Callable[[_Any], _T], records: _AsyncIterable[_Any]
+    ) -> _AsyncIterator[_T]:
+        size = cls.threshold if cls.processes > 0 else cls.chunksize
+        batch = []
+        async for record in records:
+            batch.append(record)
+            if len(batch) >= size:
+                for x in await cls.convert(fn, batch):
+                    yield x
+                batch = []
+        for x in await cls.convert(fn, batch):
+            yield x
+
+    @classmethod
+    def close(cls) -> None:
+        if cls._pool is not None:
+            cls._pool.shutdown(wait=True, cancel_futures=True)
+            cls._pool = None
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json as _json
+import logging as _logging
+import mmap as _mmap
+import os as _os
+import struct as _struct
+import time as _time
+import zlib as _zlib
+from threading import Condition as _Condition
+from typing import Any as _Any, Iterable as _Iterable
+
+_MAGIC = b"PAWAL001"
+# payload length, crc32 of lsn + payload, lsn
+_HEADER = _struct.Struct("<IIQ")
+_LSN = _struct.Struct("<Q")
+
+
+class _Segment:
+    seq: int
+    path: str
+    size: int
+    offset: int
+    first: int
+    last: int
+
+    def __init__(self, path: str, seq: int, size: int, create: bool):
+        self.seq = seq
+        self.path = path
+        self.first = 0
+        self.last = 0
+        self._file = open(path, "w+b" if create else "r+b")
+        if create:
+            self._file.truncate(size)
+        self.size = _os.fstat(self._file.fileno()).st_size
+        self.map = _mmap.mmap(self._file.fileno(), self.size)
+        if create:
+            self.map[: len(_MAGIC)] = _MAGIC
+        self.offset = len(_MAGIC)
+        self.flushed = 0
+
+    def records(self) -> _Iterable[tuple[int, bytes]]:
+        if self.map[: len(_MAGIC)] != _MAGIC:
+            return
+        pos = len(_MAGIC)
+        while pos + _HEADER.size <= self.size:
+            length, crc, lsn = _HEADER.unpack_from(self.map, pos)
+            end = pos + _HEADER.size + length
+            if length == 0 or end > self.size:
+                break
+            payload = bytes(self.map[pos + _HEADER.size : end])
+            if _zlib.crc32(payload, _zlib.crc32(_LSN.pack(lsn))) != crc:
+                break
+            yield lsn, payload
+            pos = end
+        self.offset = pos
+
+    def fits(self, length: int) -> bool:
+        return self.offset + _HEADER.size + length <= self.size
+
+    def write(self, lsn: int, payload: bytes) -> None:
+        crc = _zlib.crc32(payload, _zlib.crc32(_LSN.pack(lsn)))
+        _HEADER.pack_into(self.map, self.offset, len(payload), crc, lsn)
+        start = self.offset + _HEADER.size
+        self.map[start : start + len(payload)] = payload
+        self.offset = start + len(payload)
+        # records copied forward by compaction keep their older lsn
+        self.first = min(self.first, lsn) if self.first else lsn
+        self.last = max(self.last, lsn)
+
+    def flush(self) -> None:
+        # msync wants a page aligned start
+        start = self.flushed - self.flushed % _mmap.PAGESIZE
+        if self.offset > start:
+            self.map.flush(start, self.offset - start)
+        self.flushed = self.offset
+
+    def close(self, remove: bool = False) -> None:
+        self.map.close()
+        self._file.close()
+        if remove:
+            _os.remove(self.path)
+
+
+# append-only journal of json records in memory mapped segment files. a
+# record stays pending until it is acked; pending records survive restarts
+# and are handed back by pending(). writers call sync() to wait for their
+# record to be on disk, and one msync covers every writer waiting at the time
+class Journal:
+    _logger = _logging.getLogger(__name__)
+    path: str
+    segment_size: int
+    max_segments: int
+    _segments: list[_Segment]
+    _pending: dict[int, _Any]
+    _lsn: int
+    _synced: int
+    _syncing: bool
+    _cond: _Condition
+
+    def __init__(
+        self,
+        path: str,
+        segment_size: int = 4 << 20,
+        max_segments: int = 4,
+        delay: float = 0.002,
+    ):
+        self.path = path
+        self.segment_size = int(segment_size)
+        self.max_segments = max(2, int(max_segments))
+        self._delay = delay
+        self._segments = []
+        self._pending = {}
+        self._lsn = 0
+        self._synced = 0
+        self._syncing = False
+        self._compacting = False
+        self._cond = _Condition()
+        _os.makedirs(path, exist_ok=True)
+        self._recover()
+
+    def _segment_path(self, seq: int) -> str:
+        return _os.path.join(self.path, f"{seq:08d}.wal")
+
+    def _recover(self) -> None:
+        acked = set()
+        names = sorted(x for x in _os.listdir(self.path) if x.endswith(".wal"))
+        for name in names:
+            try:
+                segment = _Segment(
+                    _os.path.join(self.path, name), int(name[:-4]), 0, False
+                )
+            except:
+                self._logger.exception(f"could not open journal segment {name}")
+                continue
+            for lsn, payload in segment.records():
+                record = _json.loads(payload)
+                if isinstance(record, dict) and "_ack" in record:
+                    acked.update(record["_ack"])
+                else:
+                    self._pending[lsn] = record
+                segment.first = min(segment.first, lsn) if segment.first else lsn
+                segment.last = max(segment.last, lsn)
+                self._lsn = max(self._lsn, lsn)
+            self._segments.append(segment)
+        for lsn in acked:
+            self._pending.pop(lsn, None)
+        self._pending = dict(sorted(self._pending.items()))
+        if self._segments:
+            # anything after the last good record is a torn write
+            tail = self._segments[-1]
+            tail.map[tail.offset :] = bytes(tail.size - tail.offset)
+            tail.flushed = 0
+            tail.flush()
+            self._logger.info(
+                f"journal {self.path}: {len(self._pending)} pending records in {len(self._segments)} segments"
+            )
+        else:
+            self._rotate()
+        self._synced = self._lsn
+        self.compact()
+
+    def _rotate(self) -> _Segment:
+        seq = self._segments[-1].seq + 1 if self._segments else 1
+        if self._segments:
+            self._segments[-1].flush()
+        segment = _Segment(self._segment_path(seq), seq, self.segment_size, True)
+        self._segments.append(segment)
+        return segment
+
+    def _write(self, lsn: int, payload: bytes) -> None:
+        if _HEADER.size + len(payload) + len(_MAGIC) > self.segment_size:
+            raise ValueError(f"journal record of {len(payload)} bytes is too big")
+        segment = self._segments[-1]
+        if not segment.fits(len(payload)):
+            segment = self._rotate()
+            rotated = True
+        else:
+            rotated = False
+        segment.write(lsn, payload)
+        if rotated and not self._compacting:
+            self.compact()
+
+    def append(self, record: _Any) -> int:
+        payload = _json.dumps(record, separators=(",", ":")).encode()
+        with self._cond:
+            self._lsn += 1
+            self._write(self._lsn, payload)
+            if not (isinstance(record, dict) and "_ack" in record):
+                self._pending[self._lsn] = record
+            return self._lsn
+
+    def extend(self, records: _Iterable[_Any]) -> list[int]:
+        return [self.append(x) for x in records]
+
+    def sync(self, lsn: int | None = None) -> None:
+        with self._cond:
+            lsn = self._lsn if lsn is None else lsn
+            while self._synced < lsn and self._syncing:
+                self._cond.wait()
+            if self._synced >= lsn:
+                return
+            self._syncing = True
+        target = self._synced
+        try:
+            if self._delay:
+                # let other writers get their records into this commit
+                _time.sleep(self._delay)
+            with self._cond:
+                target = self._lsn
+                self._segments[-1].flush()
+        finally:
+            with self._cond:
+                self._syncing = False
+                self._synced = max(self._synced, target)
+                self._cond.notify_all()
+
+    def ack(self, lsns: _Iterable[int]) -> None:
+        with self._cond:
+            lsns = [x for x in lsns if self._pending.pop(x, None) is not None]
+            if lsns:
+                self.append({"_ack": lsns})
+
+    def pending(self) -> list[tuple[int, _Any]]:
+        with self._cond:
+            return list(self._pending.items())
+
+    # drops the oldest segments while they have nothing pending. past
+    # `max_segments` the oldest ones are retired anyway by copying their
+    # pending records forward; the copies keep their lsn so acks still match.
+    # only ever a prefix goes, since a later segment can hold the acks for
+    # records in an older one that is kept
+    def compact(self) -> None:
+        with self._cond:
+            self._compacting = True
+            try:
+                for segment in list(self._segments[:-1]):
+                    live = [
+                        (lsn, record)
+                        for lsn, record in self._pending.items()
+                        if segment.first <= lsn <= segment.last
+                    ]
+                    if live and len(self._segments) <= self.max_segments:
+                        break
+                    for lsn, record in live:
+                        payload = _json.dumps(record, separators=(",", ":"))
+                        self._write(lsn, payload.encode())
+                    self._segments[-1].flush()
+                    segment.close(remove=True)
+                    self._segments.remove(segment)
+            finally:
+                self._compacting = False
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def close(self) -> None:
+        self.sync()
+        with self._cond:
+            for segment in self._segments:
+                segment.flush()
+                segment.close()
+            self._segments = []
@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json as _json
+import logging as _logging
+import math as _math
+import mmap as _mmap
+import os as _os
+import time as _time
+from array import array as _array
+from threading import RLock as _RLock
+from typing import Any as _Any, Iterable as _Iterable, Iterator as _Iterator
+from .atoms import Item as _Item, to_reading as _to_reading
+
+RF_METRICS = ("rsrp", "rsrq", "sinr", "rssi", "tx_rate", "rx_rate", "tx_power")
+
+
+def _float(value: _Any) -> float:
+    found = _to_reading(value)
+    return _math.nan if found is None else found
+
+
+def _readings(values: _Any, skip_zero: bool = True) -> _array:
+    if isinstance(values, str):
+        values = values.replace(",", " ").replace("/", " ").split()
+    elif not isinstance(values, _Iterable):
+        values = (values,)
+    found = _array("d", (_float(v) for v in values))
+    # radios report unused chains as 0 or not at all
+    return _array("d", (v for v in found if v == v and not (skip_zero and v == 0)))
+
+
+# collapse per-antenna readings ("-95,-97", [b"-95", "-97"], ...) to one value
+def reduce_chains(
+    values: _Any, how: str = "mean", skip_zero: bool = True
+) -> float | None:
+    found = _readings(values, skip_zero)
+    if not found:
+        return None
+    if how == "mean":
+        return _math.fsum(found) / len(found)
+    if how == "max":
+        return max(found)
+    if how == "min":
+        return min(found)
+    raise ValueError(f"unknown reduction {how}")
+
+
+def _quantile(ordered: _array, q: float) -> float:
+    pos = (len(ordered) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+def fleet_stats(
+    items: _Iterable[_Item],
+    metric: str = "sinr",
+    by: str = "cell_id",
+    quantiles: tuple[float, ...] = (0.1, 0.5, 0.9),
+) -> dict[str, dict[str, float]]:
+    groups: dict[str, _array] = {}
+    for i in items:
+        value = getattr(i, metric, None)
+        group = getattr(i, by, None)
+        if value is None or group is None:
+            continue
+        groups.setdefault(str(group), _array("d")).append(value)
+    ret = {}
+    for group, values in groups.items():
+        ordered = _array("d", sorted(values))
+        stats = {f"p{round(q * 100)}": _quantile(ordered, q) for q in quantiles}
+        stats["count"] = len(ordered)
+        stats["mean"] = _math.fsum(ordered) / len(ordered)
+        ret[group] = stats
+    return ret
+
+
+_NAN = _array("f", [_math.nan]).tobytes()
+
+
+# one fixed size slot per device. samples sit on a fixed grid of `step`
+# seconds from the store epoch, so no times are stored: a sample's place in
+# the ring is its step number. steps that fall out of the recent ring have
+# already been averaged into a coarser ring of `archive_step` buckets.
+#   newest, next_bucket                  uint32 newest step + 1 (0 when empty),
+#                                        first bucket not yet archived
+#   recent[metric][capacity]             float32, NaN when a step has no reading
+#   archive[metric][archive_capacity]    float32 bucket means, NaN likewise
+# with the defaults that is a day at 5 minutes and 30 days at an hour, about
+# 28 KB a device.
+class MetricStore:
+    _logger = _logging.getLogger(__name__)
+    _version = 2
+    path: str | None
+    capacity: int
+    metrics: tuple[str, ...]
+    step: int
+    archive_step: int
+    archive_capacity: int
+    epoch: int
+    _devices: dict[str, int]
+    _slots: int
+    _buf: _mmap.mmap | bytearray
+    _file: _Any
+    _lock: _RLock
+
+    def __init__(
+        self,
+        path: str | None = None,
+        capacity: int = 288,
+        metrics: tuple[str, ...] = RF_METRICS,
+        step: int = 300,
+        archive_step: int = 3600,
+        archive_capacity: int = 30 * 24,
+    ):
+        self.path = path
+        self.capacity = int(capacity)
+        self.metrics = tuple(metrics)
+        self.step = int(step)
+        self.archive_step = int(archive_step)
+        self.archive_capacity = int(archive_capacity)
+        if self.archive_step % self.step or self.capacity < self._ratio:
+            raise ValueError(
+                f"archive step {archive_step} must be a multiple of step {step} "
+                f"that fits in {capacity} samples"
+            )
+        self.epoch = int(_time.time())
+        self._devices = {}
+        self._file = None
+        self._lock = _RLock()
+        self._open()
+
+    @property
+    def _ratio(self) -> int:
+        return self.archive_step // self.step
+
+    @property
+    def _slot_size(self) -> int:
+        return 4 * (2 + (self.capacity + self.archive_capacity) * len(self.metrics))
+
+    def _open(self) -> None:
+        self._slots = 0
+        if self.path is None:
+            self._buf = bytearray()
+            return
+        if not self._load_index():
+            # an unreadable or mismatched index makes the data file meaningless
+            self._devices = {}
+            mode = "w+b"
+        else:
+            mode = "r+b" if _os.path.exists(self.path) else "w+b"
+        self._file = open(self.path, mode)
+        size = len(self._devices) * self._slot_size
+        if _os.fstat(self._file.fileno()).st_size < size:
+            self._file.truncate(size)
+        # the file grows in chunks, the index says how many slots are in use
+        self._slots = _os.fstat(self._file.fileno()).st_size // self._slot_size
+        self._map(self._slots * self._slot_size)
+
+    def _map(self, size: int) -> None:
+        if size == 0:
+            self._buf = bytearray()
+        else:
+            self._buf = _mmap.mmap(self._file.fileno(), size)
+
+    def _layout(self) -> dict[str, _Any]:
+        return {
+            "version": self._version,
+            "capacity": self.capacity,
+            "step": self.step,
+            "archive_step": self.archive_step,
+            "archive_capacity": self.archive_capacity,
+            "metrics": list(self.metrics),
+        }
+
+    def _load_index(self) -> bool:
+        try:
+            with open(f"{self.path}.json", "r") as f:
+                index = _json.load(f)
+        except FileNotFoundError:
+            return False
+        except:
+            self._logger.exception(f"could not read metric index {self.path}.json")
+            return False
+        if any(index.get(k) != v for k, v in self._layout().items()):
+            self._logger.error(
+                f"metric store {self.path} has a different layout, starting over"
+            )
+            return False
+        self.epoch = int(index["epoch"])
+        self._devices = {str(k): int(v) for k, v in index["devices"].items()}
+        self._logger.info(f"loaded metrics for {len(self._devices)} devices")
+        return True
+
+    def _grow(self) -> int:
+        slot = len(self._devices)
+        size = self._slot_size
+        if self._file is None:
+            self._buf.extend(bytes(size))
+        elif slot >= self._slots:
+            # doubling keeps remapping rare as devices are added
+            self._slots = max(slot + 1, 2 * self._slots)
+            if isinstance(self._buf, _mmap.mmap):
+                self._buf.close()
+            self._file.truncate(self._slots * size)
+            self._map(self._slots * size)
+        # a slot past the index may hold a device that was never flushed
+        base = slot * size
+        self._buf[base : base + 8] = bytes(8)
+        self._buf[base + 8 : base + size] = _NAN * ((size - 8) // 4)
+        return slot
+
+    def _views(self, slot: int) -> tuple[memoryview, memoryview, memoryview]:
+        base = slot * self._slot_size
+        raw = memoryview(self._buf)[base : base + self._slot_size]
+        head = raw[:8].cast("I")
+        split = 8 + 4 * self.capacity * len(self.metrics)
+        recent = raw[8:split].cast("f")
+        archive = raw[split:].cast("f")
+        return head, recent, archive
+
+    @classmethod
+    def device_key(cls, *items: _Item) -> str | None:
+        for field in ("mac_address", "imei", "imsi"):
+            for i in items:
+                value = getattr(i, field, None) if i is not None else None
+                if value:
+                    return f"{field}:{value}"
+        return None
+
+    def devices(self) -> list[str]:
+        return list(self._devices)
+
+    def append(
+        self, device: str, values: dict[str, _Any], ts: float | None = None
+    ) -> bool:
+        ts = _time.time() if ts is None else ts
+        k = (int(ts) - self.epoch) // self.step
+        if k < 0:
+            return False
+        with self._lock:
+            slot = self._devices.get(device)
+            if slot is None:
+                slot = self._grow()
+                self._devices[device] = slot
+            head, recent, archive = self._views(slot)
+            try:
+                if not head[0]:
+                    head[1] = k // self._ratio
+                elif k < head[0] - 1:
+                    self._logger.debug(f"dropping out of order sample for {device}")
+                    return False
+                else:
+                    self._advance(head, recent, archive, k)
+                # a later sample in the same step replaces the earlier one
+                pos = k % self.capacity
+                for m, name in enumerate(self.metrics):
+                    recent[m * self.capacity + pos] = _float(values.get(name))
+                head[0] = k + 1
+            finally:
+                head.release()
+                recent.release()
+                archive.release()
+        return True
+
+    # archives the buckets that are complete once step `k` is reached, then
+    # clears the steps skipped on the way there
+    def _advance(
+        self, head: memoryview, recent: memoryview, archive: memoryview, k: int
+    ) -> None:
+        newest = head[0] - 1
+        ratio = self._ratio
+        bucket = k // ratio
+        for b in range(max(head[1], bucket - self.archive_capacity), bucket):
+            lo = max(b * ratio, newest - self.capacity + 1)
+            hi = min((b + 1) * ratio, newest + 1)
+            pos = b % self.archive_capacity
+            for m in range(len(self.metrics)):
+                base = m * self.capacity
+                found = [recent[base + j % self.capacity] for j in range(lo, hi)]
+                found = [v for v in found if not _math.isnan(v)]
+                archive[m * self.archive_capacity + pos] = (
+                    _math.fsum(found) / len(found) if found else _math.nan
+                )
+        head[1] = max(head[1], bucket)
+        for j in range(max(newest + 1, k - self.capacity + 1), k + 1):
+            for m in range(len(self.metrics)):
+                recent[m * self.capacity + j % self.capacity] = _math.nan
+
+    def record(self, *items: _Item, ts: float | None = None) -> bool:
+        device = self.device_key(*items)
+        if device is None or not items:
+            return False
+        values = {m: getattr(items[0], m, None) for m in self.metrics}
+        if all(v is None for v in values.values()):
+            return False
+        return self.append(device, values, ts)
+
+    def range(
+        self,
+        device: str,
+        metric: str,
+        start: float | None = None,
+        end: float | None = None,
+    ) -> list[tuple[int, float]]:
+        return list(self._iter(device, metric, start, end))
+
+    # archived bucket means for whatever has left the recent ring, then the
+    # recent steps themselves
+    def _iter(
+        self, device: str, metric: str, start: float | None, end: float | None
+    ) -> _Iterator[tuple[int, float]]:
+        m = self.metrics.index(metric)
+        with self._lock:
+            slot = self._devices.get(device)
+            if slot is None:
+                return
+            head, recent, archive = self._views(slot)
+            try:
+                found = []
+                if head[0]:
+                    newest = head[0] - 1
+                    ratio = self._ratio
+                    # the first whole bucket still in the ring
+                    cut = -(-max(0, newest - self.capacity + 1) // ratio)
+                    first = max(0, head[1] - self.archive_capacity)
+                    for b in range(first, min(head[1], cut)):
+                        pos = m * self.archive_capacity + b % self.archive_capacity
+                        found.append((b * self.archive_step, archive[pos]))
+                    for j in range(cut * ratio, newest + 1):
+                        pos = m * self.capacity + j % self.capacity
+                        found.append((j * self.step, recent[pos]))
+            finally:
+                head.release()
+                recent.release()
+                archive.release()
+        for offset, value in found:
+            ts = self.epoch + offset
+            if _math.isnan(value):
+                continue
+            if (start is None or ts >= start) and (end is None or ts <= end):
+                yield ts, value
+
+    def downsample(
+        self,
+        device: str,
+        metric: str,
+        step: float,
+        start: float | None = None,
+        end: float | None = None,
+        how: str = "mean",
+    ) -> list[tuple[int, float]]:
+        reduce = {
+            "mean": lambda v: sum(v) / len(v),
+            "min": min,
+            "max": max,
+            "last": lambda v: v[-1],
+        }[how]
+        buckets: dict[int, list[float]] = {}
+        origin = start if start is not None else 0
+        for ts, value in self._iter(device, metric, start, end):
+            bucket = int(origin + ((ts - origin) // step) * step)
+            buckets.setdefault(bucket, []).append(value)
+        return [(k, reduce(v)) for k, v in buckets.items()]
+
+    def flush(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            if isinstance(self._buf, _mmap.mmap):
+                self._buf.flush()
+            index = self._layout()
+            index["epoch"] = self.epoch
+            index["devices"] = self._devices
+            tmp = f"{self.path}.json.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    _json.dump(index, f, separators=(",", ":"))
+                    f.flush()
+                    _os.fsync(f.fileno())
+                _os.replace(tmp, f"{self.path}.json")
+            except:
+                self._logger.exception(f"could not write metric index {self.path}")
+
+    def close(self) -> None:
+        self.flush()
+        with self._lock:
+            if isinstance(self._buf, _mmap.mmap):
+                self._buf.close()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __contains__(self, device: object) -> bool:
+        return device in self._devices
@@ -13,12 +13,13 @@ import logging as _logging
 from typing_extensions import Self as _Self
 import logging
 import re as _re
+from functools import lru_cache as _lru_cache
 
 
 class IPv4Address:
+    __slots__ = ("_ip", "_cidr_mask")
     _logger = logging.getLogger(__name__)
-    address: tuple[int, int, int, int]
-    netmask: tuple[int, int, int, int]
+    _ip: int
     _cidr_mask: int
 
     def __init__(
@@ -42,7 +43,7 @@ class IPv4Address:
                     f"Provided string, {address} is not in the (PCRE) form of (\\d{{1,3}}.){{3}}\\d{{1,3}}"
                 )
             try:
-                self.address = tuple(map(lambda x: int(x), address.split(".")))
+                addr = tuple(map(lambda x: int(x), address.split(".")))
             except:
                 self._logger.error(
                     f"The provided string, {address}, has one or more grops of characters that cannot parse as an integer"
@@ -51,7 +52,7 @@ class IPv4Address:
 
         if octets:
             try:
-                self.address = tuple(map(lambda x: int(x), octets))
+                addr = tuple(map(lambda x: int(x), octets))
             except:
                 self._logger.error(
                     f"The provided list, {octets}, has one or more grops of characters that cannot parse as an integer"
@@ -65,23 +66,76 @@ class IPv4Address:
             self._logger.error("invalid netmask provided")
             raise ValueError
 
-        if not self.is_valid_ipv4(self.address, netmask=netmask):
+        if not self.is_valid_ipv4(addr, netmask=netmask):
             self._logger.error(
-                f"ipv4 adddress/netmask combo ({self.address}/{netmask}) invalid, see warning logs"
+                f"ipv4 adddress/netmask combo ({addr}/{netmask}) invalid, see warning logs"
             )
             raise ValueError
 
-        self.netmask = netmask
-        self._cidr_mask = self.netmask_to_cidr(self.netmask)
+        self._ip = (addr[0] << 24) | (addr[1] << 16) | (addr[2] << 8) | addr[3]
+        self._cidr_mask = self.netmask_to_cidr(netmask)
+
+    @classmethod
+    def _octets(cls, value: int) -> tuple[int, int, int, int]:
+        return (value >> 24 & 0xFF, value >> 16 & 0xFF, value >> 8 & 0xFF,
+                value & 0xFF)
+
+    @property
+    def address(self) -> tuple[int, int, int, int]:
+        return self._octets(self._ip)
+
+    @property
+    def netmask(self) -> tuple[int, int, int, int]:
+        return self._octets(0xFFFFFFFF << (32 - self._cidr_mask) & 0xFFFFFFFF)
+
+    @property
+    def _mask(self) -> int:
+        return 0xFFFFFFFF << (32 - self._cidr_mask) & 0xFFFFFFFF
 
     @property
     def network(self) -> tuple[int, int, int, int]:
-        return tuple(self.address[a] & m for a, m in enumerate(self.netmask))
+        return self._octets(self._ip & self._mask)
 
     @property
     def broadcast(self) -> tuple[int, int, int, int]:
-        return tuple(
-            self.address[a] | (0xFF ^ m) for a, m in enumerate(self.netmask))
+        return self._octets(self._ip | (self._mask ^ 0xFFFFFFFF))
+
+    @classmethod
+    def from_int(cls, ip: int, cidr_mask: int = 32) -> _Self:
+        ret = object.__new__(cls)
+        ret._ip = ip
+        ret._cidr_mask = cidr_mask
+        return ret
+
+    # a single pass over "a.b.c.d" or "a.b.c.d/n"; addresses never change once
+    # built, so the ones seen every poll are shared instead of rebuilt
+    @classmethod
+    @_lru_cache(maxsize=1 << 16)
+    def parse(cls, text: str, cidr_mask: int = 32) -> _Self:
+        head, _, tail = text.strip().partition("/")
+        parts = head.split(".")
+        try:
+            if tail:
+                cidr_mask = int(tail)
+            if len(parts) != 4 or not 2 <= cidr_mask <= 32:
+                raise ValueError
+            ip = 0
+            for part in parts:
+                if not (part.isascii() and part.isdigit() and len(part) <= 3):
+                    raise ValueError
+                octet = int(part)
+                if octet > 255:
+                    raise ValueError
+                ip = ip << 8 | octet
+        except ValueError:
+            cls._logger.error(f"{text} is not an IPv4 address")
+            raise ValueError(text) from None
+        host = ip & (0xFFFFFFFF >> cidr_mask)
+        if cidr_mask != 32 and host in (0, 0xFFFFFFFF >> cidr_mask):
+            cls._logger.error(
+                f"ip address {text} cannot be the network or broadcast address")
+            raise ValueError(text)
+        return cls.from_int(ip, cidr_mask)
 
     @classmethod
     def is_valid_ipv4(
@@ -235,27 +289,30 @@ class IPv4Address:
             return repr(self) == __o
         if not isinstance(__o, IPv4Address):
             return False
-        return self.address == __o.address and self._cidr_mask == __o._cidr_mask
+        return self._ip == __o._ip and self._cidr_mask == __o._cidr_mask
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        return hash(self._ip | self._cidr_mask << 32)
+
+    def __int__(self) -> int:
+        return self._ip
 
     def __contains__(self, __o: object) -> bool:
         if not isinstance(__o, IPv4Address):
             return False
-        return self.network == __o.network
+        return self._ip & self._mask == __o._ip & __o._mask
 
     @classmethod
     def to_ip(cls, __o: object) -> _Self:
         if isinstance(__o, IPv4Address):
-            return IPv4Address(octets=__o.address, cidr_mask=__o._cidr_mask)
+            return __o
         if not isinstance(__o, Sequence):
             raise ValueError(
                 f"type {type(__o)} is not convertable to an IP address")
         elif isinstance(__o, str):
-            return IPv4Address(address=__o)
+            return IPv4Address.parse(__o)
         elif isinstance(__o, bytes):
-            return IPv4Address(address=__o.decode())
+            return IPv4Address.parse(__o.decode())
         elif isinstance(__o, Sequence):
             if not all(map(lambda x: isinstance(x, Integral), __o)):
                 cls._logger.error(
@@ -272,7 +329,9 @@ class IPv4Address:
 
 
 class MACAddress:
+    __slots__ = ("_mac",)
     _log = _logging.getLogger(__name__)
+    _mac: bytes
 
     def __init__(self, mac: str) -> None:
         if not isinstance(mac, str):
@@ -306,10 +365,10 @@ class MACAddress:
     def __eq__(self, __o: object) -> bool:
         if not isinstance(__o, MACAddress):
             return False
-        return str(self) == str(__o)
+        return self._mac == __o._mac
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        return hash(self._mac)
 
     def __repr__(self) -> str:
         return bytes.hex(self._mac, ":", 1).upper()
@@ -319,6 +378,7 @@ class MACAddress:
 
 
 class IMEI(str):
+    __slots__ = ()
     _log = logging.getLogger(__name__)
 
     def __new__(cls, obj: object = "") -> _Self:
@@ -336,6 +396,7 @@ class IMEI(str):
 
 
 class IMSI(str):
+    __slots__ = ()
     __log = logging.getLogger(__name__)
 
     def __new__(cls, obj: object = "") -> _Self:
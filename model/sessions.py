@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+from array import array as _array
+from dataclasses import dataclass as _dc, field as _field
+from typing import Iterable as _Iterable
+from .atoms import Item as _Item
+from .network import IPv4Address as _IPv4Address
+
+
+@_dc(slots=True)
+class SessionDelta:
+    added: dict[str, _IPv4Address] = _field(default_factory=dict)
+    changed: dict[str, _IPv4Address] = _field(default_factory=dict)
+    removed: list[str] = _field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.changed) + len(self.removed)
+
+    # imsi -> new address, None for a session that went away
+    @property
+    def changes(self) -> dict[str, _IPv4Address | None]:
+        ret: dict[str, _IPv4Address | None] = dict.fromkeys(self.removed)
+        ret.update(self.added)
+        ret.update(self.changed)
+        return ret
+
+    @property
+    def summary(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed session(s)"
+        )
+
+
+# the imsi -> ip map of the last data session pull, kept as two sorted int
+# arrays (12 bytes a session) so an unchanged pull is one array comparison
+class SessionSnapshot:
+    _imsis: _array
+    _ips: _array
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self._imsis = _array("Q")
+        self._ips = _array("I")
+
+    def __len__(self) -> int:
+        return len(self._imsis)
+
+    def forget(self, imsis: _Iterable[str]) -> None:
+        drop = {int(x) for x in imsis}
+        if not drop:
+            return
+        keep = [k for k, imsi in enumerate(self._imsis) if imsi not in drop]
+        self._imsis = _array("Q", (self._imsis[k] for k in keep))
+        self._ips = _array("I", (self._ips[k] for k in keep))
+
+    # replaces the snapshot with `sessions` and returns what changed
+    def diff(self, sessions: _Iterable[_Item]) -> SessionDelta:
+        current: dict[int, int] = {}
+        for session in sessions:
+            # sessions without both are skipped by the allocator anyway
+            if session.imsi and session.ipv4 is not None:
+                current[int(session.imsi)] = int(session.ipv4)
+        imsis = _array("Q", sorted(current))
+        ips = _array("I", (current[x] for x in imsis))
+        ret = SessionDelta()
+        if imsis == self._imsis and ips == self._ips:
+            return ret
+        previous = dict(zip(self._imsis, self._ips))
+        for imsi, ip in current.items():
+            old = previous.pop(imsi, None)
+            if old is None:
+                ret.added[f"{imsi:015d}"] = _IPv4Address.from_int(ip)
+            elif old != ip:
+                ret.changed[f"{imsi:015d}"] = _IPv4Address.from_int(ip)
+        ret.removed.extend(f"{x:015d}" for x in previous)
+        self._imsis = imsis
+        self._ips = ips
+        return ret
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import logging as _logging
+import os as _os
+import pickle as _pickle
+import time as _time
+from typing import Any as _Any, Iterable as _Iterable
+from .atoms import Item as _Item
+from .structures import MergeSet as _MergeSet
+
+
+class InventorySnapshot:
+    _logger = _logging.getLogger(__name__)
+    _version = 2
+    path: str
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def save(
+        self, inventory: _Iterable[_Item], meta: dict[str, _Any] | None = None
+    ) -> None:
+        items = list(inventory)
+        payload = {
+            "version": self._version,
+            "created": _time.time(),
+            "meta": dict(meta) if meta else {},
+            "items": items,
+        }
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                _pickle.dump(payload, f, protocol=_pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                _os.fsync(f.fileno())
+            _os.replace(tmp, self.path)
+            self._logger.info(f"saved {len(items)} items to snapshot {self.path}")
+        except:
+            self._logger.exception(f"could not write inventory snapshot {self.path}")
+
+    def load(self) -> tuple[_MergeSet[_Item], dict[str, _Any]] | None:
+        try:
+            with open(self.path, "rb") as f:
+                payload = _pickle.load(f)
+        except FileNotFoundError:
+            self._logger.info(f"no inventory snapshot at {self.path}")
+            return None
+        except:
+            self._logger.exception(f"could not read inventory snapshot {self.path}")
+            return None
+        if not isinstance(payload, dict) or payload.get("version") != self._version:
+            self._logger.error(
+                f"inventory snapshot {self.path} has an unknown format, ignoring it"
+            )
+            return None
+        meta = dict(payload.get("meta", {}))
+        meta["created"] = payload.get("created")
+        inventory = _MergeSet(payload.get("items", ()))
+        self._logger.info(
+            f"loaded {len(inventory)} items from snapshot {self.path} taken at {_time.ctime(meta['created'])}"
+        )
+        return inventory, meta
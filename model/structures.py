@@ -11,65 +11,146 @@ from .atoms import Item as _Item, Account as _Account
 
 
 _T = _TypeVar("_T", _Item, _Account)
+_Component = tuple[str, _Any]
 
 
 class MergeSet(set[_T]):
     _log = _logging.getLogger(__name__)
+    _index: dict[_Component, _T]
 
-    def add(self, __element: _T) -> _T:
+    def __init__(self, __iterable: _Iterable[_T] = ()) -> None:
+        super().__init__()
+        self._index = {}
+        for x in __iterable:
+            self.add(x)
+
+    @classmethod
+    def _components(cls, __element: _T) -> tuple[_Component, ...]:
+        if isinstance(__element, _Item):
+            account = __element.account
+            parts = (
+                ("account", account.key if account else None),
+                ("sonar_id", __element.sonar_id),
+                ("mac_address", __element.mac_address),
+                ("imei", __element.imei),
+                ("imsi", __element.imsi),
+            )
+        else:
+            parts = (("sonar_id", __element.sonar_id), ("name", __element.name))
+        return tuple(x for x in parts if x[1])
+
+    def _matches(self, components: _Iterable[_Component]) -> list[_T]:
+        found: dict[int, _T] = {}
+        for c in components:
+            rec = self._index.get(c)
+            if rec is not None:
+                found.setdefault(id(rec), rec)
+        return list(found.values())
+
+    def _attach(self, __element: _T) -> None:
+        super().add(__element)
+        for c in self._components(__element):
+            self._index[c] = __element
+
+    def _detach(self, __element: _T) -> None:
+        for c in self._components(__element):
+            if self._index.get(c) is __element:
+                del self._index[c]
         try:
-            if __element == _Item():
+            super().remove(__element)
+        except KeyError:
+            self._log.exception(
+                f"somehow errored removing {__element} from set after finding it in the set"
+            )
+
+    def _merge(self, mine: _T, current: _T) -> None:
+        items = list(current.assigned())
+        self._log.debug(f"adding all items {items} to {mine}")
+        for k, v in items:
+            try:
+                setattr(mine, k, v)
+                self._log.debug(f"added {v} for {k}")
+            except:
+                self._log.exception(
+                    f"error when adding {v} for key {k} to {mine}", stack_info=True
+                )
+                continue
+
+    def add(self, __element: _T) -> _T:
+        components = self._components(__element)
+        if not components:
+            if isinstance(__element, _Item):
                 return __element
-            self._log.info(f"adding old {__element} to set")
-            mine = next(x for x in iter(self) if x == __element)
-        except StopIteration:
+            super().add(__element)
+            return __element
+        self._log.info(f"adding old {__element} to set")
+        matches = self._matches(components)
+        if not matches:
             self._log.debug(
                 f"merged key of {__element} not found in the set, adding it"
             )
             self._log.info(f"adding new {__element} to set")
-            super().add(__element)
+            self._attach(__element)
             return __element
-        try:
-            super().remove(mine)
-        except KeyError as ke:
-            self._log.exception(
-                f"somehow errored removing {mine} from set after finding it in the set"
-            )
-        current = __element
+        mine = matches[0]
+        self._detach(mine)
+        self._merge(mine, __element)
         while True:
-            items = current.__dict__.items()
-            self._log.debug(f"adding all items {items} to {mine}")
-            for k, v in items:
-                try:
-                    setattr(mine, k, v)
-                    self._log.debug(f"added {v} for {k}")
-                except:
-                    self._log.exception(
-                        f"error when adding {v} for key {k} to {mine}", stack_info=True
-                    )
-                    continue
-            try:
-                current = next(x for x in iter(self) if x == mine)
-                super().remove(current)
-            except KeyError as ke:
-                self._log.exception(
-                    f"somehow errored removing {current} from set after finding it in the set"
-                )
-                raise ke
-            except StopIteration:
+            others = self._matches(self._components(mine))
+            if not others:
                 break
+            for other in others:
+                self._detach(other)
+                self._merge(mine, other)
         self._log.debug(f"adding the updated item back, maybe new items in key: {mine}")
         self._log.info(f"adding new {mine} to set")
-        super().add(mine)
+        self._attach(mine)
         return mine
 
+    def update(self, *__s: _Iterable[_T]) -> None:
+        for it in __s:
+            for x in it:
+                self.add(x)
+
+    def remove(self, __element: _T) -> None:
+        super().remove(__element)
+        for c in self._components(__element):
+            rec = self._index.get(c)
+            if rec is not None and rec == __element:
+                del self._index[c]
+
+    def discard(self, __element: _T) -> None:
+        try:
+            self.remove(__element)
+        except KeyError:
+            pass
+
+    def pop(self) -> _T:
+        ret = super().pop()
+        for c in self._components(ret):
+            if self._index.get(c) is ret:
+                del self._index[c]
+        return ret
+
+    def clear(self) -> None:
+        super().clear()
+        self._index.clear()
+
+    # members are indexed by their key components; anyone changing sonar_id,
+    # mac_address, imei, imsi or account on a member in place must reindex
+    def reindex(self) -> None:
+        records = list(set.__iter__(self))
+        self.clear()
+        for x in records:
+            self.add(x)
+
     def issubset(self, __s: _Iterable[_Any]) -> bool:
-        return all(map(lambda x: x in iter(self), __s))
+        return all(isinstance(x, _Item | _Account) and x in self for x in __s)
 
     def __contains__(self, __o: object) -> bool:
         if not isinstance(__o, _Item | _Account):
             raise ValueError("must be Item type to test inclusion")
-        return any(map(lambda x: x == __o, iter(self)))
+        return bool(self._matches(self._components(__o)))
 
     def __eq__(self, __o: object) -> bool:
         if not isinstance(__o, MergeSet):
@@ -6,8 +6,10 @@
 # https://opensource.org/licenses/MIT.
 
 
+import pickle
 import pytest
 from model.network import IPv4Address, MACAddress, IMEI, IMSI
+from model.atoms import Item, Model, Account, Name
 
 
 class TestIMSI:
@@ -173,3 +175,63 @@ class TestIPAddress:
 
     def test_str(self, address_two):
         assert str(address_two) == "192.68.1.99/24"
+
+    def test_parse(self, address_one, address_cidr_c):
+        assert IPv4Address.parse("192.68.1.100") == address_one
+        assert IPv4Address.parse("192.68.1.99/24") == address_cidr_c
+        assert IPv4Address.parse("192.68.1.100") is IPv4Address.parse("192.68.1.100")
+        assert IPv4Address.from_int(address_one._ip) == address_one
+        for bad in ("192.68.1", "192.68.1.256", "192.68.1.0/24", "a.b.c.d"):
+            with pytest.raises(ValueError):
+                IPv4Address.parse(bad)
+
+
+class TestItem:
+    def test_readings(self):
+        i = Item()
+        assert i.rsrp is None
+        i.rsrp = "-95.5 dBm"
+        i.sinr = 12
+        i.rsrq = "n/a"
+        assert i.rsrp == -95.5
+        assert i.sinr == 12.0
+        assert i.rsrq is None
+
+    def test_assigned(self):
+        i = Item()
+        i.imsi = IMSI("1" * 15)
+        i.rsrp = "-90"
+        assert not hasattr(i, "__dict__")
+        assert dict(i.assigned()) == {
+            "imsi": "1" * 15,
+            "linked_to_account": False,
+            "_rsrp": -90.0,
+        }
+        assert i.model == Model.UNKNOWN
+
+    def test_pickle(self):
+        i = Item()
+        i.mac_address = MACAddress("abcdef123456")
+        i.ipv4 = IPv4Address(address="10.0.0.1")
+        i.sinr = 3
+        j = pickle.loads(pickle.dumps(i))
+        assert j == i
+        assert j.sinr == 3.0
+        assert repr(j.ipv4) == "10.0.0.1"
+        assert dict(j.assigned()).keys() == dict(i.assigned()).keys()
+
+    def test_key_cache(self):
+        i = Item()
+        assert i.key == frozenset()
+        i.mac_address = MACAddress("abcdef123456")
+        assert i.key == frozenset([MACAddress("abcdef123456")])
+        h = hash(i)
+        i.serial_number = "1"
+        assert hash(i) == h
+        account = Account(Name("John Smith"))
+        i.account = account
+        assert account in i.key
+        h = hash(i)
+        account.sonar_id = "12"
+        assert hash(i) != h
+        assert hash(i) == hash(i.key)
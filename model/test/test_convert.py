@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import asyncio
+import pytest
+from model.atoms import Item
+from model.convert import Converter
+
+
+def _to_item(record):
+    i = Item()
+    i.cell_id = record["cell_id"]
+    return i
+
+
+class TestConverter:
+    @pytest.fixture
+    def records(self):
+        yield [{"cell_id": str(k)} for k in range(1200)]
+
+    def test_convert(self, records):
+        items = asyncio.run(Converter.convert(_to_item, records))
+        assert [i.cell_id for i in items] == [r["cell_id"] for r in records]
+        assert Converter._pool is None
+
+    def test_pages(self, records):
+        async def pages():
+            for k in range(0, len(records), 100):
+                yield records[k : k + 100]
+
+        items = asyncio.run(Converter.convert_pages(_to_item, pages()))
+        assert len(items) == len(records)
+        assert items[-1].cell_id == "1199"
+
+    def test_processes(self, records, monkeypatch):
+        monkeypatch.setattr(Converter, "processes", 2)
+        monkeypatch.setattr(Converter, "threshold", 1000)
+        try:
+            items = asyncio.run(Converter.convert(_to_item, records))
+            assert Converter._pool is not None
+        finally:
+            Converter.close()
+        assert [i.cell_id for i in items] == [r["cell_id"] for r in records]
+        assert Converter._pool is None
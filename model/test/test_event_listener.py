@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json
+import socket
+import time
+import pytest
+from urllib.parse import urlencode
+from model.journal import Journal
+from model.network import IPv4Address
+from raemis.event_listener import Listener, parse_event
+
+
+def _body(event: str, imsi: str = "311000000000005", **extra) -> bytes:
+    form = {"imsi": imsi, "event_type": event, "event_time": "2023-01-02 03:04:05.5"}
+    form.update(extra)
+    return urlencode(form).encode()
+
+
+class TestParseEvent:
+    def test_activated(self):
+        e = parse_event(
+            _body("PDP_CONTEXT_ACTIVATED", add_text=json.dumps({"ip": "10.0.0.5"}))
+        )
+        assert e.event == "pdp_context_activated"
+        assert e.imsi == "311000000000005"
+        assert e.ipv4 == IPv4Address(address="10.0.0.5")
+
+    def test_deactivated(self):
+        e = parse_event(_body("pdp_context_deactivated"))
+        assert e.ipv4 is None
+
+    def test_other(self):
+        assert parse_event(_body("attach")) is None
+        with pytest.raises(ValueError):
+            parse_event(b"imsi=311000000000005")
+
+
+class TestListener:
+    @pytest.fixture
+    def listener(self):
+        batches = []
+        l = Listener(batches.append, port=0, host="127.0.0.1")
+        l.start_event_receiver_server()
+        yield l, batches
+        l.stop()
+
+    def _post(self, port: int, body: bytes, path: str = "/events") -> bytes:
+        with socket.create_connection(("127.0.0.1", port)) as s:
+            s.sendall(
+                f"POST {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode() + body
+            )
+            return b"".join(iter(lambda: s.recv(4096), b""))
+
+    def test_post(self, listener):
+        l, batches = listener
+        reply = self._post(l.port, _body("pdp_context_deactivated"))
+        assert reply.startswith(b"HTTP/1.1 200 OK")
+        assert reply.endswith(b"\r\n\r\n")
+        assert self._post(l.port, b"", "/other").startswith(b"HTTP/1.1 404")
+        assert self._post(l.port, b"imsi=1").startswith(b"HTTP/1.1 400")
+        for _ in range(100):
+            if batches:
+                break
+            time.sleep(0.01)
+        assert [e.event for b in batches for e in b] == ["pdp_context_deactivated"]
+        assert l.metrics()["received"] == 2
+        assert l.metrics()["malformed"] == 1
+
+    def test_bad_length(self, listener):
+        l, _ = listener
+        for length in ("abc", "-1", "1_0"):
+            with socket.create_connection(("127.0.0.1", l.port)) as s:
+                s.sendall(
+                    f"POST /events HTTP/1.1\r\nContent-Length: {length}\r\n\r\n"
+                    "imsi=1".encode()
+                )
+                reply = b"".join(iter(lambda: s.recv(4096), b""))
+            assert reply.startswith(b"HTTP/1.1 400")
+        assert l.metrics()["malformed"] == 3
+
+    def test_journal(self, tmp_path):
+        batches = []
+        journal = Journal(str(tmp_path / "journal"))
+        l = Listener(batches.append, port=0, host="127.0.0.1", journal=journal)
+        l.start_event_receiver_server()
+        try:
+            for imsi in ("311000000000005", "311000000000006"):
+                reply = self._post(l.port, _body("pdp_context_deactivated", imsi))
+                assert reply.startswith(b"HTTP/1.1 200 OK")
+            for _ in range(100):
+                if sum(len(b) for b in batches) == 2:
+                    break
+                time.sleep(0.01)
+        finally:
+            l.stop()
+        events = [e for b in batches for e in b]
+        # answered only once on disk, and still pending until the allocator acks
+        assert [(e.lsn, e.imsi) for e in events] == [
+            (lsn, r["imsi"]) for lsn, r in journal.pending()
+        ]
+        assert len(set(e.lsn for e in events)) == 2
+        journal.close()
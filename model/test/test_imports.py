@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEAVY = (
+    "sonar.api_connection",
+    "raemis.api_connection",
+    "snmp",
+    "aiosnmp",
+    "gql",
+    "aiohttp",
+    "web_scraper",
+    "routeros_api",
+    "concurrent.futures.process",
+)
+
+
+def _import(code: str) -> tuple[set[str], float]:
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"{code}\nprint(*sys.modules)"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # self time in microseconds of every module imported
+    total = sum(
+        int(line.split(":")[1].split("|")[0])
+        for line in out.stderr.splitlines()
+        if line.startswith("import time:") and "self [us]" not in line
+    )
+    return set(out.stdout.split()), total / 1e6
+
+
+class TestImports:
+    @pytest.fixture
+    def allocator(self):
+        yield _import(
+            "import sys, sonar.ip_allocation, model.convert, model.snapshot"
+        )
+
+    def test_allocator_is_light(self, allocator):
+        modules, _ = allocator
+        assert not modules & set(HEAVY)
+
+    def test_allocator_import_time(self, allocator):
+        _, seconds = allocator
+        assert seconds < 0.5
+
+    def test_routers_does_not_connect(self):
+        modules, _ = _import(
+            "import sys, routers, main\n"
+            "assert main.Application._config is None\n"
+            "assert routers.MikroTikRouter()._api_pool is None"
+        )
+        assert "routers" in modules
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import asyncio
+import threading
+import time
+import pytest
+from model.atoms import Item
+from model.journal import Journal
+from model.network import IMSI, IPv4Address
+from sonar.ip_allocation import Attachment, PullAllocator, PushAllocator
+
+
+class FakeSonar:
+    def __init__(self):
+        self.attachments = []
+        self.calls = {"get": 0, "create": 0, "update": 0, "delete": 0}
+        self.failures = 0
+
+    def add(self, item_id: str, ip: str) -> None:
+        a = Attachment(item_id)
+        a.sonar_id = f"a{len(self.attachments)}"
+        a.set_address(IPv4Address.parse(ip))
+        self.attachments.append(a)
+
+    async def get_assignments(self):
+        self.calls["get"] += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("sonar is down")
+        ret = []
+        for a in self.attachments:
+            b = Attachment(a.sonar_item_id, a.timestamp)
+            b.sonar_id = a.sonar_id
+            b.set_address(a.address)
+            ret.append(b)
+        return ret
+
+    async def create(self, a):
+        self.calls["create"] += 1
+        self.add(a.sonar_item_id, repr(a.address))
+        a.sonar_id = self.attachments[-1].sonar_id
+        return a
+
+    async def update(self, a):
+        self.calls["update"] += 1
+        for b in self.attachments:
+            if b.sonar_id == a.sonar_id:
+                b.sonar_item_id = a.sonar_item_id
+                b.set_address(a.address)
+        return a
+
+    async def delete(self, a):
+        self.calls["delete"] += 1
+        self.attachments = [b for b in self.attachments if b.sonar_id != a.sonar_id]
+        return a
+
+
+def _items(sessions: dict[str, IPv4Address]) -> list[Item]:
+    ret = []
+    for imsi, ip in sessions.items():
+        i = Item()
+        i.imsi = IMSI(imsi)
+        i.ipv4 = ip
+        ret.append(i)
+    return ret
+
+
+@pytest.fixture
+def inventory():
+    ret = []
+    for k in range(3):
+        i = Item()
+        i.imsi = IMSI(f"3110{k:011d}")
+        i.sonar_id = str(k)
+        ret.append(i)
+    yield ret
+
+
+@pytest.fixture
+def sessions(inventory):
+    ret = {}
+    for k, item in enumerate(inventory):
+        ret[str(item.imsi)] = IPv4Address.parse(f"10.0.0.{k}")
+    yield ret
+
+
+@pytest.fixture
+def sonar(sessions):
+    sonar = FakeSonar()
+    for k, ip in enumerate(sessions.values()):
+        sonar.add(str(k), repr(ip))
+    yield sonar
+
+
+class TestPullAllocator:
+    def test_failed_pull(self, sonar, sessions, inventory):
+        failed = []
+
+        async def get_addresses():
+            if failed:
+                # the data session pull failed partway
+                raise ConnectionError("raemis went away")
+            return _items(sessions)
+
+        allocator = PullAllocator(
+            sonar.get_assignments,
+            get_addresses,
+            sonar.create,
+            sonar.update,
+            sonar.delete,
+            threading.Event(),
+            inventory,
+            delay=0,
+        )
+        try:
+            allocator._run(allocator._pull())
+            failed.append(True)
+            with pytest.raises(ConnectionError):
+                allocator._run(allocator._pull())
+            assert sonar.calls["delete"] == 0
+            assert len(allocator._sessions) == 3
+            failed.clear()
+            allocator._run(allocator._pull())
+        finally:
+            allocator._stop()
+        assert sonar.calls["delete"] == 0
+        assert len(sonar.attachments) == 3
+
+
+class TestPushAllocator:
+    def allocator(self, sonar, sessions, inventory, stop, journal=None):
+        async def get_addresses():
+            return _items(sessions)
+
+        return PushAllocator(
+            sonar.get_assignments,
+            get_addresses,
+            sonar.create,
+            sonar.update,
+            sonar.delete,
+            stop,
+            inventory,
+            delay=3600,
+            window=0.01,
+            retry=0.05,
+            journal=journal,
+        )
+
+    def test_failed_first_reconcile(self, sonar, sessions, inventory):
+        sonar.failures = 2
+        stop = threading.Event()
+        allocator = self.allocator(sonar, sessions, inventory, stop)
+        # an event for a session sonar already has, before the cache is loaded
+        allocator.on_event(
+            "pdp_context_activated", "311000000000001", sessions["311000000000001"]
+        )
+        thread = threading.Thread(target=allocator.poll)
+        thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while sonar.calls["get"] < 3 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+        finally:
+            stop.set()
+            thread.join()
+        assert sonar.calls["get"] == 3
+        assert sonar.calls["create"] == 0
+        assert len(sonar.attachments) == 3
+
+    def test_swallowed_create(self, sonar, sessions, inventory):
+        async def create(a):
+            # logs and hands the attachment back, as the sonar client used to
+            return a
+
+        item = Item()
+        item.imsi = IMSI("311000000000009")
+        item.sonar_id = "9"
+        inventory.append(item)
+        sessions[str(item.imsi)] = IPv4Address.parse("10.0.0.9")
+        allocator = self.allocator(sonar, sessions, inventory, threading.Event())
+        allocator._create = create
+        try:
+            plan = allocator._run(allocator._reconcile())
+        finally:
+            allocator._stop()
+        assert plan.failed == 1
+        assert [x.sonar_item_id for x in plan.rejected] == ["9"]
+        assert allocator._resync
+        assert "9" not in allocator._by_item
+
+    def test_sonar_errors(self, sonar, sessions, inventory, monkeypatch):
+        pytest.importorskip("gql")
+        pytest.importorskip("urllib3")
+        from sonar.api_connection import Sonar
+
+        async def execute(func, *args, **kwargs):
+            raise ConnectionError("sonar is down")
+
+        monkeypatch.setattr(Sonar, "execute", execute)
+        allocator = self.allocator(sonar, sessions, inventory, threading.Event())
+        allocator._create = Sonar.create_ip_assignment
+        allocator._update = Sonar.update_ip_assignment
+        allocator._delete = Sonar.delete_ip_assignment
+        sessions["311000000000000"] = IPv4Address.parse("10.0.1.1")
+        sonar.attachments.pop()
+        try:
+            plan = allocator._run(allocator._reconcile())
+        finally:
+            allocator._stop()
+        assert plan.failed == 2
+        assert allocator._resync
+        assert len(sonar.attachments) == 2
+
+    def test_failed_update_stays_journaled(
+        self, sonar, sessions, inventory, tmp_path
+    ):
+        async def update(a):
+            raise ConnectionError("sonar is down")
+
+        item = Item()
+        item.imsi = IMSI("311000000000009")
+        item.sonar_id = "9"
+        inventory.append(item)
+        sessions[str(item.imsi)] = IPv4Address.parse("10.0.0.9")
+        sessions["311000000000001"] = IPv4Address.parse("10.0.1.1")
+        journal = Journal(str(tmp_path / "journal"))
+        allocator = self.allocator(
+            sonar, sessions, inventory, threading.Event(), journal
+        )
+        allocator._update = update
+        try:
+            plan = allocator._run(allocator._reconcile())
+        finally:
+            allocator._stop()
+        assert plan.failed == 1
+        assert [(r["op"], r["ip"]) for _, r in journal.pending()] == [
+            ("update", "10.0.1.1")
+        ]
+        journal.close()
+
+    def test_failed_push_acked_by_full_pass(
+        self, sonar, sessions, inventory, tmp_path
+    ):
+        def push_plan(changes):
+            raise ConnectionError("sonar is down")
+
+        journal = Journal(str(tmp_path / "journal"))
+        stop = threading.Event()
+        allocator = self.allocator(sonar, sessions, inventory, stop, journal)
+        thread = threading.Thread(target=allocator.poll)
+        thread.start()
+        try:
+            deadline = time.monotonic() + 5
+            while sonar.calls["get"] < 1 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            allocator.push_plan = push_plan
+            imsi, ip = "311000000000001", "10.0.1.1"
+            sessions[imsi] = IPv4Address.parse(ip)
+            lsn = journal.append(
+                {"event": "pdp_context_activated", "imsi": imsi, "ip": ip}
+            )
+            allocator.on_event("pdp_context_activated", imsi, sessions[imsi], lsn)
+            while sonar.calls["get"] < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.1)
+        finally:
+            stop.set()
+            thread.join()
+            journal.close()
+        assert sonar.calls["get"] == 2
+        assert sonar.calls["update"] == 1
+        assert journal.pending() == []
+
+    def test_sonar_fetch_errors(self, monkeypatch):
+        pytest.importorskip("gql")
+        pytest.importorskip("urllib3")
+        from sonar.api_connection import Sonar
+
+        pages = [
+            {"id": "a0", "ipassignmentable_id": "0", "subnet": "10.0.0.1/32"},
+            {"id": "a1", "ipassignmentable_id": "1", "subnet": "fd00::1/128"},
+        ]
+
+        async def execute(func, *args, **kwargs):
+            if not pages:
+                raise ConnectionError("sonar is down")
+            return pages
+
+        monkeypatch.setattr(Sonar, "execute", execute)
+        got = asyncio.run(Sonar.get_ip_address_assignments())
+        assert [(x.sonar_id, repr(x.address)) for x in got] == [("a0", "10.0.0.1")]
+        # neither a bad record nor a failed fetch may pass for a short list
+        pages.append({"id": "a2", "ipassignmentable_id": "2", "subnet": "10.0.0.0/24"})
+        with pytest.raises(ValueError):
+            asyncio.run(Sonar.get_ip_address_assignments())
+        pages.clear()
+        with pytest.raises(ConnectionError):
+            asyncio.run(Sonar.get_ip_address_assignments())
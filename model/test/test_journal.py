@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import threading
+import pytest
+from model.journal import Journal
+
+
+class TestJournal:
+    @pytest.fixture
+    def path(self, tmp_path):
+        yield str(tmp_path / "journal")
+
+    def test_reopen(self, path):
+        journal = Journal(path)
+        lsns = journal.extend({"n": k} for k in range(10))
+        journal.ack(lsns[:7])
+        journal.close()
+        journal = Journal(path)
+        assert journal.pending() == [(x, {"n": k}) for k, x in enumerate(lsns)][7:]
+        assert journal.append({"n": 10}) > lsns[-1]
+        journal.close()
+
+    def test_torn_tail(self, path):
+        journal = Journal(path)
+        journal.extend({"n": k} for k in range(3))
+        journal.close()
+        name = sorted(os.listdir(path))[-1]
+        with open(os.path.join(path, name), "r+b") as f:
+            data = f.read()
+            end = data.rstrip(b"\0")
+            # corrupt the last record's payload
+            f.seek(len(end) - 2)
+            f.write(b"??")
+        journal = Journal(path)
+        assert [x["n"] for _, x in journal.pending()] == [0, 1]
+        journal.append({"n": 3})
+        journal.close()
+        assert [x["n"] for _, x in Journal(path).pending()] == [0, 1, 3]
+
+    def test_rotation(self, path):
+        journal = Journal(path, segment_size=4096, max_segments=3)
+        kept = journal.append({"keep": True})
+        for k in range(500):
+            journal.ack([journal.append({"n": k, "pad": "x" * 50})])
+        assert len(os.listdir(path)) <= 3
+        journal.close()
+        journal = Journal(path, segment_size=4096, max_segments=3)
+        assert journal.pending() == [(kept, {"keep": True})]
+        journal.close()
+
+    def test_ack_in_later_segment(self, path):
+        journal = Journal(path, segment_size=4096, max_segments=10)
+        kept = journal.append({"pad": "x" * 995})
+        lsns = [journal.append({"pad": "x" * 995}) for _ in range(3)]
+        assert len(os.listdir(path)) == 1
+        # the ack goes to the next segment, the records it covers stay behind
+        journal.ack(lsns)
+        for _ in range(20):
+            journal.ack([journal.append({"pad": "x" * 995})])
+        journal.close()
+        journal = Journal(path, segment_size=4096, max_segments=10)
+        assert [x for x, _ in journal.pending()] == [kept]
+        journal.close()
+
+    def test_group_commit(self, path):
+        journal = Journal(path)
+        syncs = []
+        flush = journal._segments[-1].flush
+
+        def counted():
+            syncs.append(1)
+            flush()
+
+        journal._segments[-1].flush = counted
+
+        def writer():
+            for k in range(50):
+                journal.sync(journal.append({"n": k}))
+
+        threads = [threading.Thread(target=writer) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(journal) == 400
+        assert len(syncs) < 400
+        journal.close()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import asyncio
+import json
+import pytest
+from raemis.json_stream import JSONArrayParser, iter_json_array
+
+
+class TestJSONArrayParser:
+    @pytest.fixture
+    def records(self):
+        yield [
+            {"imsi": f"3110{k:011d}", "name": f'Ünïcode "{k}", ]', "n": k * 1.5}
+            for k in range(50)
+        ] + [12345, True, None, "x", [1, {"a": []}]]
+
+    def test_chunks(self, records):
+        raw = json.dumps(records).encode()
+        for size in (1, 3, 7, 64, len(raw)):
+            parser = JSONArrayParser()
+            found = []
+            for k in range(0, len(raw), size):
+                found.extend(parser.feed(raw[k : k + size]))
+            found.extend(parser.close())
+            assert found == records
+
+    def test_incremental(self):
+        parser = JSONArrayParser()
+        assert parser.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+        assert parser.feed(b": 2}, 12") == [{"b": 2}]
+        assert parser.feed(b"3]") == [123]
+        assert parser.close() == []
+
+    def test_not_array(self):
+        parser = JSONArrayParser()
+        assert parser.feed(b'{"error": "denied"}') == []
+        assert parser.close() == [{"error": "denied"}]
+
+    def test_invalid(self):
+        for raw in (b"[1, 2", b"[1,]", b"[1 2]", b"[1] 2"):
+            parser = JSONArrayParser()
+            with pytest.raises(json.JSONDecodeError):
+                parser.feed(raw)
+                parser.close()
+
+    def test_iter(self, records):
+        raw = json.dumps(records).encode()
+
+        async def chunks():
+            for k in range(0, len(raw), 10):
+                yield raw[k : k + 10]
+
+        async def collect():
+            return [x async for x in iter_json_array(chunks())]
+
+        assert asyncio.run(collect()) == records
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import os
+import pytest
+from model.atoms import Item
+from model.metrics import MetricStore, reduce_chains, fleet_stats
+from model.network import MACAddress
+
+
+class TestReduceChains:
+    def test_mean(self):
+        assert reduce_chains("-95, -97") == -96
+        assert reduce_chains(["-95", "0", "n/a", b"-99"]) == -97
+        assert reduce_chains("-90/-100", how="max") == -90
+        assert reduce_chains("") is None
+
+    def test_zero(self):
+        assert reduce_chains(["0", "10"], skip_zero=False) == 5
+
+    def test_fleet_stats(self):
+        items = []
+        for k in range(11):
+            i = Item()
+            i.cell_id = "1" if k < 10 else "2"
+            i.sinr = str(k)
+            items.append(i)
+        items.append(Item())
+        stats = fleet_stats(items)
+        assert stats["1"]["p50"] == 4.5
+        assert stats["1"]["p90"] == 8.1
+        assert stats["1"]["count"] == 10
+        assert stats["2"]["mean"] == 10
+
+
+LAYOUT = {"capacity": 8, "step": 300, "archive_step": 1200}
+
+
+class TestMetricStore:
+    @pytest.fixture
+    def path(self, tmp_path):
+        yield str(tmp_path / "metrics.bin")
+
+    @pytest.fixture
+    def store(self):
+        s = MetricStore(
+            capacity=4,
+            metrics=("rsrp", "sinr"),
+            step=10,
+            archive_step=20,
+            archive_capacity=4,
+        )
+        s.epoch = 1000
+        yield s
+
+    def test_record(self, store):
+        i = Item()
+        i.mac_address = MACAddress("abcdef123456")
+        i.rsrp = "-95.5"
+        assert store.record(i, ts=1010)
+        assert not store.record(Item(), ts=1020)
+        device = store.device_key(i)
+        assert store.range(device, "rsrp") == [(1010, -95.5)]
+        assert store.range(device, "sinr") == []
+
+    def test_ring(self, store):
+        for k in range(6):
+            store.append("a", {"rsrp": k, "sinr": "12 dB"}, ts=1000 + k * 10)
+        # steps 0 and 1 left the ring and are kept as their mean
+        assert [v for _, v in store.range("a", "rsrp")] == [0.5, 2, 3, 4, 5]
+        assert store.range("a", "rsrp", start=1035, end=1045) == [(1040, 4)]
+        assert not store.append("a", {"rsrp": 1}, ts=1001)
+        assert store.append("a", {"rsrp": 6}, ts=1055)
+        assert store.range("a", "rsrp", start=1050) == [(1050, 6)]
+
+    def test_archive(self, store):
+        for k in range(4):
+            store.append("a", {"rsrp": k, "sinr": 1}, ts=1000 + k * 10)
+        # a gap longer than the ring, with an empty bucket in it
+        store.append("a", {"rsrp": 10}, ts=1080)
+        store.append("a", {"rsrp": 11}, ts=1090)
+        assert store.range("a", "rsrp") == [
+            (1000, 0.5),
+            (1020, 2.5),
+            (1080, 10),
+            (1090, 11),
+        ]
+        assert store.range("a", "sinr") == [(1000, 1), (1020, 1)]
+        # only the last four buckets are archived
+        store.append("a", {"rsrp": 12}, ts=1120)
+        assert store.range("a", "rsrp", end=1079) == []
+        assert store.range("a", "rsrp")[0] == (1080, 10.5)
+
+    def test_default_size(self):
+        # a day at 5 minutes and a month at an hour stays under 30 KB a device
+        assert MetricStore()._slot_size < 30 << 10
+        with pytest.raises(ValueError):
+            MetricStore(capacity=8, step=300, archive_step=3600)
+
+    def test_downsample(self, store):
+        for k in range(4):
+            store.append("a", {"rsrp": k}, ts=1000 + k * 10)
+        assert store.downsample("a", "rsrp", 20, start=1000) == [
+            (1000, 0.5),
+            (1020, 2.5),
+        ]
+        assert store.downsample("a", "rsrp", 20, start=1000, how="max") == [
+            (1000, 1),
+            (1020, 3),
+        ]
+
+    def test_reopen(self, path):
+        s = MetricStore(path, **LAYOUT)
+        s.append("a", {"rsrp": -100}, ts=s.epoch + 5)
+        s.append("b", {"sinr": 7.25}, ts=s.epoch + 5)
+        s.close()
+        s = MetricStore(path, **LAYOUT)
+        assert len(s) == 2
+        assert s.range("a", "rsrp") == [(s.epoch, -100)]
+        assert s.range("b", "sinr") == [(s.epoch, 7.25)]
+        s.close()
+        assert len(MetricStore(path, **{**LAYOUT, "capacity": 16})) == 0
+
+    def test_unflushed_slot(self, path):
+        s = MetricStore(path, **LAYOUT)
+        s.append("a", {"rsrp": -100}, ts=s.epoch + 5)
+        s.flush()
+        s.append("b", {"rsrp": -90}, ts=s.epoch + 5)
+        # crash before the index is written
+        s._buf.close()
+        s._file.close()
+        s = MetricStore(path, **LAYOUT)
+        assert s.devices() == ["a"]
+        s.append("c", {"sinr": 3}, ts=s.epoch + 6)
+        assert s.range("c", "rsrp") == []
+        assert s.range("c", "sinr") == [(s.epoch, 3)]
+        s.close()
+
+    def test_grow_in_chunks(self, path):
+        s = MetricStore(path, **LAYOUT)
+        for k in range(5):
+            s.append(str(k), {"rsrp": k}, ts=s.epoch + 5)
+        assert os.path.getsize(path) == 8 * s._slot_size
+        s.close()
+        s = MetricStore(path, **LAYOUT)
+        assert [s.range(str(k), "rsrp")[0][1] for k in range(5)] == list(range(5))
+        s.close()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import asyncio
+import json
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("requests")
+
+from raemis.api_connection import Raemis, RaemisEndpoint
+
+
+class FakeContent:
+    def __init__(self, body: bytes, fail_at: int | None = None):
+        self.body = body
+        self.fail_at = fail_at
+
+    async def iter_chunked(self, n: int):
+        for k in range(0, len(self.body), n):
+            if self.fail_at is not None and k >= self.fail_at:
+                raise ConnectionResetError("connection lost")
+            yield self.body[k : k + n]
+
+
+class FakeResponse:
+    def __init__(self, body: bytes, status: int = 200, fail_at: int | None = None):
+        self.status = status
+        self.headers = {}
+        self.content = FakeContent(body, fail_at)
+
+
+class TestRaemis:
+    @pytest.fixture
+    def body(self):
+        yield json.dumps(
+            [
+                {"imsi": f"3110{k:011d}", "ip": f"10.0.{k >> 8}.{k & 255}"}
+                for k in range(100)
+            ]
+        ).encode()
+
+    def sessions(self, monkeypatch, response):
+        async def get_data(ep, headers={}):
+            yield response
+
+        monkeypatch.setattr(Raemis, "_get_data", get_data)
+        monkeypatch.setattr(Raemis, "_chunk_size", 64)
+        return asyncio.run(Raemis.list_data_sessions())
+
+    def test_sessions(self, monkeypatch, body):
+        found = self.sessions(monkeypatch, FakeResponse(body))
+        assert len(found) == 100
+
+    def test_truncated(self, monkeypatch, body):
+        with pytest.raises(ConnectionResetError):
+            self.sessions(monkeypatch, FakeResponse(body, fail_at=len(body) // 2))
+
+    def test_not_modified(self, monkeypatch, body):
+        requests = []
+
+        async def get_data(ep, headers={}):
+            requests.append(headers)
+            if headers.get("If-None-Match") == '"v1"':
+                yield FakeResponse(b"", 304)
+            else:
+                response = FakeResponse(body)
+                response.headers = {"ETag": '"v1"'}
+                yield response
+
+        monkeypatch.setattr(Raemis, "_get_data", get_data)
+        monkeypatch.setattr(Raemis, "_conditional", True)
+        monkeypatch.setattr(Raemis, "_cache", {})
+        first = asyncio.run(Raemis.list_data_sessions())
+        second = asyncio.run(Raemis.list_data_sessions())
+        assert requests == [{}, {"If-None-Match": '"v1"'}]
+        assert [(x.imsi, x.ipv4) for x in second] == [(x.imsi, x.ipv4) for x in first]
+        assert len(Raemis._cache[RaemisEndpoint.DATA_SESSIONS].body) < len(body)
+
+    def test_error_status(self, monkeypatch):
+        with pytest.raises(Exception):
+            self.sessions(monkeypatch, FakeResponse(b'{"error": "denied"}', 500))
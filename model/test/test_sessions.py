@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import pytest
+from model.atoms import Item
+from model.network import IMSI, IPv4Address
+from model.sessions import SessionSnapshot
+
+
+def _session(imsi: str, ip: str | None) -> Item:
+    i = Item()
+    i.imsi = IMSI(imsi)
+    if ip:
+        i.ipv4 = IPv4Address.parse(ip)
+    return i
+
+
+class TestSessionSnapshot:
+    @pytest.fixture
+    def sessions(self):
+        yield [
+            _session("001010000000001", "10.0.0.1"),
+            _session("311000000000002", "10.0.0.2"),
+            _session("311000000000003", "10.0.0.3"),
+        ]
+
+    def test_first(self, sessions):
+        snapshot = SessionSnapshot()
+        delta = snapshot.diff(sessions)
+        assert list(delta.added) == [str(x.imsi) for x in sessions]
+        assert delta.added["001010000000001"] == IPv4Address.parse("10.0.0.1")
+        assert len(snapshot) == 3
+
+    def test_unchanged(self, sessions):
+        snapshot = SessionSnapshot()
+        snapshot.diff(sessions)
+        delta = snapshot.diff(list(reversed(sessions)))
+        assert not delta
+        assert len(delta) == 0
+
+    def test_delta(self, sessions):
+        snapshot = SessionSnapshot()
+        snapshot.diff(sessions)
+        current = [
+            sessions[0],
+            _session("311000000000002", "10.0.0.9"),
+            _session("311000000000004", "10.0.0.3"),
+            _session("311000000000005", None),
+        ]
+        delta = snapshot.diff(current)
+        assert delta.added == {"311000000000004": IPv4Address.parse("10.0.0.3")}
+        assert delta.changed == {"311000000000002": IPv4Address.parse("10.0.0.9")}
+        assert delta.removed == ["311000000000003"]
+        assert delta.changes["311000000000003"] is None
+        assert not snapshot.diff(current)
+
+    def test_forget(self, sessions):
+        snapshot = SessionSnapshot()
+        snapshot.diff(sessions)
+        snapshot.forget(["311000000000002"])
+        delta = snapshot.diff(sessions)
+        assert list(delta.added) == ["311000000000002"]
+        assert not delta.changed and not delta.removed
+
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import pytest
+from model.atoms import Item, Account, Name
+from model.network import MACAddress, IMSI, IPv4Address
+from model.snapshot import InventorySnapshot
+from model.structures import MergeSet
+
+
+class TestInventorySnapshot:
+    @pytest.fixture
+    def snapshot(self, tmp_path):
+        yield InventorySnapshot(str(tmp_path / "inventory.pickle"))
+
+    @pytest.fixture
+    def inventory(self):
+        s = MergeSet()
+        i = Item()
+        i.sonar_id = "1234"
+        i.mac_address = MACAddress("abcdef123456")
+        i.ipv4 = IPv4Address(address="10.0.0.1")
+        i.account = Account(Name("John Smith"))
+        s.add(i)
+        i = Item()
+        i.imsi = IMSI("1" * 15)
+        s.add(i)
+        yield s
+
+    def test_missing(self, snapshot):
+        assert snapshot.load() is None
+
+    def test_round_trip(self, snapshot, inventory):
+        snapshot.save(inventory, {"pages": {"inventory_items": 3}})
+        loaded, meta = snapshot.load()
+        assert loaded == inventory
+        assert len(loaded) == 2
+        assert meta["pages"] == {"inventory_items": 3}
+        assert meta["created"]
+        item = next(x for x in loaded if x.sonar_id)
+        assert repr(item.ipv4) == "10.0.0.1"
+        assert item.account.name == "John Smith"
+
+    def test_corrupt(self, snapshot):
+        with open(snapshot.path, "wb") as f:
+            f.write(b"not a snapshot")
+        assert snapshot.load() is None
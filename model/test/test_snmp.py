@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+from model.atoms import Item
+from model.network import MACAddress
+from snmp import DeviceCache
+
+
+def _device(mac: str | None = None) -> Item:
+    i = Item()
+    i.mac_address = MACAddress(mac) if mac else None
+    return i
+
+
+class TestDeviceCache:
+    def test_identity_over_address(self):
+        cache = DeviceCache()
+        cache.put("bec", "bec 7000", "10.0.0.5", _device(), _device("abcdef123456"))
+        assert cache.get(_device("abcdef123456"), "10.0.0.6") == ("bec", "bec 7000")
+        # another device handed the same address is classified again
+        assert cache.get(_device(), "10.0.0.5") is None
+
+    def test_address_only(self):
+        cache = DeviceCache()
+        cache.put("netgear", "netgear", "10.0.0.5", _device())
+        assert cache.get(_device(), "10.0.0.5") == ("netgear", "netgear")
+        cache.put("bec", "bec 7000", "10.0.0.5", _device("abcdef123456"))
+        assert cache.get(_device(), "10.0.0.5") is None
+        assert len(cache) == 1
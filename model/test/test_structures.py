@@ -153,3 +153,44 @@ class TestMergeSet:
         t.add(i2)
         t.add(i3)
         assert t == set_all
+
+    def test_cascade_merge_collapses(self, imei, imsi, mac_address, sonar_id):
+        i1 = Item()
+        i2 = Item()
+        i3 = Item()
+        i1.sonar_id = sonar_id
+        i2.imsi = imsi
+        i3.imsi = imsi
+        i3.mac_address = mac_address
+        t = MergeSet()
+        t.add(i1)
+        t.add(i2)
+        assert len(t) == 2
+        i4 = Item()
+        i4.sonar_id = sonar_id
+        i4.mac_address = mac_address
+        t.add(i3)
+        t.add(i4)
+        assert len(t) == 1
+        merged = next(iter(t))
+        assert merged.sonar_id == sonar_id
+        assert merged.imsi == imsi
+        assert merged.mac_address == mac_address
+
+    def test_contains(self, set_id_mac1_dup, mac_address, mac_address2):
+        i = Item()
+        i.mac_address = mac_address
+        assert i in set_id_mac1_dup
+        i = Item()
+        i.mac_address = mac_address2
+        assert i not in set_id_mac1_dup
+
+    def test_reindex(self, set_id, sonar_id, imei):
+        item = next(iter(set_id))
+        item.imei = imei
+        i = Item()
+        i.imei = imei
+        assert i not in set_id
+        set_id.reindex()
+        assert i in set_id
+        assert len(set_id) == 1
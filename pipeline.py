@@ -25,25 +25,39 @@ FList = type(list[Future[Any]])
 
 
 class Pipeline:
-    procExec: ProcessPoolExecutor
-    threadExec: ThreadPoolExecutor
+    _procExec: ProcessPoolExecutor | None = None
+    _threadExec: ThreadPoolExecutor | None = None
+    _pool_size: int
     cursor: Future
     logger = logging.getLogger(__name__)
     _inst: Self | None = None
 
     def __init__(self, pool_size: int = 250):
-        self.procExec = ProcessPoolExecutor(max_workers=8)
-        self.threadExec = ThreadPoolExecutor(max_workers=pool_size)
+        self._pool_size = pool_size
         self.cursor = Future()
 
+    # workers are only started once something is submitted to them
+    @property
+    def procExec(self) -> ProcessPoolExecutor:
+        if self._procExec is None:
+            self._procExec = ProcessPoolExecutor(max_workers=8)
+        return self._procExec
+
+    @property
+    def threadExec(self) -> ThreadPoolExecutor:
+        if self._threadExec is None:
+            self._threadExec = ThreadPoolExecutor(max_workers=self._pool_size)
+        return self._threadExec
+
     def __new__(cls: type[Self], *args, **kwargs) -> Self:
         if not cls._inst:
             cls._inst = super(Pipeline, cls).__new__(cls)
         return cls._inst
 
     def __del__(self):
-        (x.shutdown(wait=True, cancel_futures=False)
-         for x in [self.procExec, self.threadExec])
+        for x in [self._procExec, self._threadExec]:
+            if x is not None:
+                x.shutdown(wait=True, cancel_futures=False)
 
     def map(
         self,
@@ -10,17 +10,50 @@ import sys as _sys
 import logging as _logging
 from sonar.api_connection import Sonar as _Sonar
 from raemis.api_connection import Raemis as _Raemis
-from snmp import Session as _Session
 from model.atoms import Item as _Item, Manufacturer, Model
 from model.structures import MergeSet as _MergeSet
 from asyncio import run as _run
-from web_scraper.baicells import Baicells as _Baicells
-from sonar.ip_allocation import PullAllocator as _PullAllocator
+from typing import Any as _Any, Coroutine as _Coroutine, TypeVar as _TypeVar
+from sonar.ip_allocation import (
+    PullAllocator as _PullAllocator,
+    PushAllocator as _PushAllocator,
+    AllocationPlan as _AllocationPlan,
+)
+from raemis.event_listener import Listener as _Listener
+from main import Application
 from multiprocessing.managers import SyncManager as _SyncManager
 from threading import Event as _Event
 from multiprocessing.dummy import DummyProcess as _Thread
 from logging.handlers import RotatingFileHandler
-from web_scraper.telrad import Telrad12300 as _Telrad
+from sonar.fingerprints import FingerprintStore as _FingerprintStore
+from model.snapshot import InventorySnapshot as _InventorySnapshot
+from model.metrics import MetricStore as _MetricStore
+from model.convert import Converter as _Converter
+from model.journal import Journal as _Journal
+
+_T = _TypeVar("_T")
+
+
+async def _with_sonar(coro: _Coroutine[_Any, _Any, _T]) -> _T:
+    try:
+        return await coro
+    finally:
+        await _Sonar.close()
+
+
+async def _with_raemis(coro: _Coroutine[_Any, _Any, _T]) -> _T:
+    try:
+        return await coro
+    finally:
+        await _Raemis.close()
+
+
+# the allocator keeps one loop for its whole life, and its pools with it
+async def _close_pools() -> None:
+    try:
+        await _Sonar.close()
+    finally:
+        await _Raemis.close()
 
 
 class PollingAgent:
@@ -29,24 +62,47 @@ class PollingAgent:
     _allocator: _PullAllocator
     _manager: _SyncManager
     _stop_event: _Event
+    _fingerprints: _FingerprintStore
+    _fingerprint_file = "sonar_fingerprints.json"
+    _snapshot: _InventorySnapshot
+    _snapshot_file = "inventory_snapshot.pickle"
+    _allocator_list: list[_Item]
+    _metrics: _MetricStore
+    _metrics_file = "rf_metrics.bin"
+    _events = False
+    _event_port = 9997
+    _reconcile = 15 * 60
+    _listener: _Listener
+    _journal: _Journal | None = None
+    _journal_dir = "event_journal"
 
     def startup(self):
         self._logger.info("starting polling agent thread")
         self._inventory = _MergeSet()
+        self._fingerprints = _FingerprintStore(self._fingerprint_file)
+        self._snapshot = _InventorySnapshot(self._snapshot_file)
+        self._metrics = _MetricStore(self._metrics_file)
         self._manager = _SyncManager()
         self._manager.start()
         self._stop_event = self._manager.Event()
 
-    def run_allocator(self):
+    def _build_allocator(
+        self, base_list: list[_Item], push: bool = False
+    ) -> _PullAllocator:
         create = _Sonar.create_ip_assignment
         update = _Sonar.update_ip_assignment
         delete = _Sonar.delete_ip_assignment
         get_assignments = _Sonar.get_ip_address_assignments
-        get_addresses = _Raemis.get_data_sessions
-        base_list: list[_Item] = self._manager.list(list(self._inventory))
-        delay = 1 * 60
+        get_addresses = _Raemis.list_data_sessions
+        # with events driving changes the full pass is only a safety net
+        delay = self._reconcile if push else 1 * 60
+        if push:
+            kwargs = {"journal": self._journal}
+        else:
+            # unchanged pulls skip sonar, this bounds how long drift can last
+            kwargs = {"full_interval": self._reconcile}
 
-        self._allocator = _PullAllocator(
+        return (_PushAllocator if push else _PullAllocator)(
             get_assignments=get_assignments,
             get_addresses=get_addresses,
             create=create,
@@ -55,17 +111,39 @@ class PollingAgent:
             event=self._stop_event,
             base_list=base_list,
             delay=delay,
+            shutdown=_close_pools,
+            **kwargs,
         )
+
+    def run_allocator(self):
+        self._allocator_list = self._manager.list(list(self._inventory))
+        if self._events and self._journal_dir:
+            self._journal = _Journal(self._journal_dir)
+        self._allocator = self._build_allocator(self._allocator_list, self._events)
+        if self._events:
+            self._listener = _Listener(
+                self._allocator.on_events, self._event_port, journal=self._journal
+            )
+            self._listener.start_event_receiver_server()
         self._poll_thread = _Thread(target=self._allocator.poll, name="poller")
         self._poll_thread.start()
 
+    def preview_allocation(self) -> _AllocationPlan:
+        return self._build_allocator(list(self._inventory)).dry_run()
+
     def shutdown(self):
         self._stop_event.set()
         self._logger.info("sent stop event to poller")
+        if hasattr(self, "_listener"):
+            self._listener.stop()
         self._poll_thread.join()
         self._logger.info("joined ip poll thread")
+        if self._journal is not None:
+            self._journal.close()
         self._manager.shutdown()
         self._logger.info("shut down manager")
+        self._metrics.close()
+        _Converter.close()
 
     def run_full_scan(self):
         self.get_base_inventory_information()
@@ -74,14 +152,31 @@ class PollingAgent:
         self.get_detailed_inventory_stats()
 
     def get_subscriber_information(self):
-        subs = _run(_Raemis.get_subscribers())
-        for item in subs:
-            self._inventory.add(item)
+        async def collect():
+            try:
+                async for item in _Raemis.get_subscribers():
+                    self._inventory.add(item)
+            except Exception:
+                self._logger.exception("could not read all raemis subscribers")
+
+        _run(_with_raemis(collect()))
 
     def get_inventory_network_information(self):
-        ips = _run(_Raemis.get_data_sessions())
-        for item in ips:
-            self._inventory.add(item)
+        # the scrapers are only needed for a full scan, not for the allocator
+        from web_scraper.baicells import Baicells as _Baicells
+        from web_scraper.telrad import Telrad12300 as _Telrad
+
+        _Baicells.metrics = self._metrics
+        _Telrad.metrics = self._metrics
+
+        async def collect():
+            try:
+                async for item in _Raemis.get_data_sessions():
+                    self._inventory.add(item)
+            except Exception:
+                self._logger.exception("could not read all raemis data sessions")
+
+        _run(_with_raemis(collect()))
         web_tel = _run(_Telrad.get_items(self._inventory))
         for item in web_tel:
             if item:
@@ -91,33 +186,93 @@ class PollingAgent:
             item.model = Model.OD06
             item.manufacturer = Manufacturer.BAICELLS
             self._inventory.add(item)
+        self._metrics.flush()
 
     def get_detailed_inventory_stats(self):
-        snmp = _run(_Session.get_all_values(self._inventory))
-        for item in snmp:
-            self._inventory.add(item)
+        from snmp import Session as _Session
+
+        _Session.metrics = self._metrics
+
+        async def collect():
+            async for item in _Session.scan(list(self._inventory)):
+                self._inventory.add(item)
+
+        _run(collect())
+        self._metrics.flush()
 
     def add_raemis_info_to_item_notes(self):
-        _run(_Sonar.add_raemis_name_to_items(self._inventory))
+        _run(_with_sonar(_Sonar.add_raemis_name_to_items(self._inventory)))
 
     def try_to_match_items_to_accounts_by_name_guessing(self):
-        _run(_Sonar.match_names_and_link(self._inventory))
+        _run(_with_sonar(_Sonar.match_names_and_link(self._inventory)))
+        # linking swaps item.account in place, which the index is keyed on
+        self._inventory.reindex()
 
     def create_missing_inventory_items(self):
-        _run(_Sonar.create_missing(self._inventory))
+        _run(_with_sonar(_Sonar.create_missing(self._inventory)))
+        self._inventory.reindex()
 
     def update_inventory_item_information(self):
-        _run(_Sonar.update_needed(self._inventory))
+        _run(
+            _with_sonar(
+                _Sonar.update_needed(self._inventory, fingerprints=self._fingerprints)
+            )
+        )
+        self._fingerprints.save()
 
-    def get_base_inventory_information(self):
-        self._logger.info("starting inventory initilization")
-        acct = _run(_Sonar.execute(_Sonar.get_all_clients_and_assigned_inventory))
+    def _pull_base_inventory(self) -> _MergeSet[_Item]:
+        inventory = _MergeSet()
+        acct = _run(
+            _with_sonar(_Sonar.execute(_Sonar.get_all_clients_and_assigned_inventory))
+        )
         for item in acct:
-            self._inventory.add(item)
-        inv = _run(_Sonar.execute(_Sonar.get_inventory_items))
+            inventory.add(item)
+        inv = _run(_with_sonar(_Sonar.execute(_Sonar.get_inventory_items)))
         for item in inv:
+            inventory.add(item)
+        return inventory
+
+    def get_base_inventory_information(self):
+        self._logger.info("starting inventory initilization")
+        for item in self._pull_base_inventory():
             self._inventory.add(item)
+        self.save_snapshot()
+
+    def load_snapshot(self) -> bool:
+        loaded = self._snapshot.load()
+        if loaded is None:
+            return False
+        self._inventory, _ = loaded
+        return True
+
+    def save_snapshot(self):
+        self._snapshot.save(self._inventory, {"pages": dict(_Sonar.page_info)})
+
+    def refresh_inventory(self):
+        self._logger.info("refreshing inventory from sonar")
+        try:
+            fresh = self._pull_base_inventory()
+        except:
+            self._logger.exception("failed to refresh inventory from sonar")
+            return
+        self._inventory = fresh
+        if hasattr(self, "_allocator_list"):
+            # one slice assignment swaps the allocator's view in a single call
+            self._allocator_list[:] = list(fresh)
+        self._logger.info(f"swapped in {len(fresh)} inventory items from sonar")
+        self.save_snapshot()
+
+    def refresh_inventory_in_background(self):
+        self._refresh_thread = _Thread(target=self.refresh_inventory, name="refresh")
+        self._refresh_thread.start()
+
 
+_raemis = Application.config.raemis
+# env overrides arrive as strings
+PollingAgent._events = str(getattr(_raemis, "events", False)).lower() in ("true", "1")
+PollingAgent._event_port = int(getattr(_raemis, "port", 9997))
+PollingAgent._reconcile = float(getattr(_raemis, "reconcile", 15 * 60))
+PollingAgent._journal_dir = getattr(_raemis, "journal", PollingAgent._journal_dir)
 
 if __name__ == "__main__":
 
@@ -150,6 +305,10 @@ if __name__ == "__main__":
     _logging.root.addHandler(fh)
     polling_agent = PollingAgent()
     polling_agent.startup()
-    polling_agent.get_base_inventory_information()
-    polling_agent.run_allocator()
+    if polling_agent.load_snapshot():
+        polling_agent.run_allocator()
+        polling_agent.refresh_inventory_in_background()
+    else:
+        polling_agent.get_base_inventory_information()
+        polling_agent.run_allocator()
     polling_agent._poll_thread.join()
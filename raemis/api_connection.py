@@ -5,24 +5,33 @@
 # license that can be found in the LICENSE file or at
 # https://opensource.org/licenses/MIT.
 
+import asyncio as _asyncio
 import re as _re
+import zlib as _zlib
 import requests as _requests
 from model.atoms import Account as _Account, Item as _Item, Name as _Name
 from model.network import IMEI as _IMEI, IMSI as _IMSI, IPv4Address as _IPv4Address
 import logging as _logging
-from typing import Any as _Any, Iterable as _Iterable, AsyncIterable as _AsyncIterable
+from typing import (
+    Any as _Any,
+    AsyncIterable as _AsyncIterable,
+    AsyncIterator as _AsyncIterator,
+)
+from contextlib import aclosing as _aclosing
+from dataclasses import dataclass as _dc
 from enum import Enum as _Enum, unique as _unique
+from weakref import WeakKeyDictionary as _WeakKeyDictionary
 from typing_extensions import Self as _Self
 from aiohttp.client import (
     ClientSession as _ClientSession,
     ClientResponse as _ClientResponse,
+    ClientTimeout as _ClientTimeout,
 )
-from aiohttp import BasicAuth as _BasicAuth
-from concurrent.futures import ProcessPoolExecutor as _PPE
+from aiohttp import BasicAuth as _BasicAuth, TCPConnector as _TCPConnector
+from model.convert import Converter as _Converter
+from raemis.json_stream import iter_json_array as _iter_json_array
 from main import Application
 
-_exec = _PPE()
-
 
 @_unique
 class RaemisEndpoint(_Enum):
@@ -38,49 +47,191 @@ class HTTPMethod(_Enum):
     POST = "POST"
 
 
+class RaemisSession:
+    _logger = _logging.getLogger(__name__)
+    _url: str
+    _auth: _BasicAuth
+    _limit: int
+    _keepalive: float
+    _timeout: float
+    _session: _ClientSession | None
+    _lock: _asyncio.Lock
+
+    def __init__(
+        self,
+        url: str,
+        auth: _BasicAuth,
+        limit: int = 4,
+        keepalive: float = 60,
+        timeout: float = 60,
+    ):
+        self._url = url
+        self._auth = auth
+        self._limit = limit
+        self._keepalive = keepalive
+        self._timeout = timeout
+        self._session = None
+        self._lock = _asyncio.Lock()
+
+    async def connect(self) -> _ClientSession:
+        async with self._lock:
+            if self._session is None or self._session.closed:
+                self._logger.info(
+                    f"opening raemis connection pool ({self._limit} connections)"
+                )
+                self._session = _ClientSession(
+                    base_url=self._url,
+                    auth=self._auth,
+                    connector=_TCPConnector(
+                        limit=self._limit, keepalive_timeout=self._keepalive
+                    ),
+                    timeout=_ClientTimeout(
+                        total=self._timeout or None, sock_connect=10
+                    ),
+                )
+            return self._session
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._session is not None:
+                try:
+                    await self._session.close()
+                except:
+                    self._logger.exception("failed closing raemis connection pool")
+                self._logger.info("closed raemis connection pool")
+            self._session = None
+
+
+# the last body of an endpoint, compressed, with the validators the epc sent
+# for it. a 304 replays it through the same streaming parser, so memory
+# stays flat and the copy costs a small fraction of the decoded records
+@_dc(slots=True)
+class _Cached:
+    etag: str | None
+    modified: str | None
+    body: bytes
+
+
 class Raemis:
     _logger = _logging.getLogger(__name__)
-    session: _ClientSession
     _username = Application.config.raemis.username
     _password = Application.config.raemis.password
     _auth: _BasicAuth = _BasicAuth(login=_username, password=_password)
     apiUrl: str = Application.config.raemis.url
     _inst: _Self | None = None
+    _chunk_size: int = 1 << 16
+    _connection_limit: int = 4
+    _keepalive: float = 60
+    _timeout: float = 60
+    _retries: int = 3
+    _conditional: bool = True
+    _cache: dict[RaemisEndpoint, _Cached] = {}
+    # same as sonar: connectors are bound to their event loop
+    _pools: "_WeakKeyDictionary[_asyncio.AbstractEventLoop, RaemisSession]" = (
+        _WeakKeyDictionary()
+    )
 
     @classmethod
-    async def get_subscribers(cls) -> _Iterable[_Item]:
-        data = list()
-        try:
-            cls._logger.info("creating items from raemis subscribers")
-            async for data in cls._get_data(RaemisEndpoint.SUBSCRIBERS):
-                data = await data.json()
-                cls._logger.info(
-                    f'returning {len(data) if data is not None else "N/A"} subscribers'
-                )
-                data = await cls._convert_api_subscribers(data)
-        except:
-            cls._logger.exception("raemis error", stack_info=True)
-        return data
+    def pool(cls) -> RaemisSession:
+        loop = _asyncio.get_running_loop()
+        pool = cls._pools.get(loop)
+        if pool is None:
+            pool = RaemisSession(
+                cls.apiUrl,
+                cls._auth,
+                cls._connection_limit,
+                cls._keepalive,
+                cls._timeout,
+            )
+            cls._pools[loop] = pool
+        return pool
+
+    @classmethod
+    async def close(cls) -> None:
+        pool = cls._pools.pop(_asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.close()
+
+    @classmethod
+    async def get_subscribers(cls) -> _AsyncIterator[_Item]:
+        cls._logger.info("creating items from raemis subscribers")
+        count = 0
+        records = cls._stream(RaemisEndpoint.SUBSCRIBERS)
+        items = _Converter.convert_stream(cls._convert_api_subscriber, records)
+        async with _aclosing(records), _aclosing(items):
+            async for item in items:
+                count += 1
+                yield item
+        cls._logger.info(f"returned {count} subscribers")
+
+    @classmethod
+    async def get_subscribers_json(cls) -> _AsyncIterator[dict[str, _Any]]:
+        cls._logger.info("getting json from raemis for subscribers")
+        async with _aclosing(cls._stream(RaemisEndpoint.SUBSCRIBERS)) as records:
+            async for record in records:
+                yield record
 
     @classmethod
-    async def get_subscribers_json(cls) -> _Iterable[dict[str, _Any]]:
-        data = None
+    async def _stream(cls, ep: RaemisEndpoint) -> _AsyncIterator[dict[str, _Any]]:
+        cached = cls._cache.get(ep) if cls._conditional else None
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.modified:
+                headers["If-Modified-Since"] = cached.modified
         try:
-            cls._logger.info("getting json from raemis for subscribers")
-            async for data in cls._get_data(RaemisEndpoint.SUBSCRIBERS):
-                data = await data.json()
-                cls._logger.info(
-                    f'returning {len(data) if data is not None else "N/A"} subscribers'
-                )
-        except:
-            cls._logger.exception("raemis error", stack_info=True)
-        return data
+            # closed right away so the connection goes back to the pool
+            async with _aclosing(cls._get_data(ep, headers)) as responses:
+                async for resp in responses:
+                    parts = None
+                    if resp.status == 304 and cached is not None:
+                        cls._logger.debug(f"{ep.value} not modified")
+                        chunks = cls._replay(cached.body)
+                    elif resp.status != 200:
+                        raise _requests.ConnectionError(
+                            f"HTTP {resp.status} from {ep.value}"
+                        )
+                    else:
+                        etag = resp.headers.get("ETag")
+                        modified = resp.headers.get("Last-Modified")
+                        chunks = resp.content.iter_chunked(cls._chunk_size)
+                        cls._cache.pop(ep, None)
+                        # only keep a copy when the epc can tell us it is still good
+                        if cls._conditional and (etag or modified):
+                            parts = []
+                            chunks = cls._compress(chunks, parts)
+                    async for record in _iter_json_array(chunks):
+                        yield record
+                    if parts is not None:
+                        cls._cache[ep] = _Cached(etag, modified, b"".join(parts))
+        # not a bare except, closing the generator early must not be swallowed.
+        # a short list would read as sessions that ended, so errors go up
+        except Exception:
+            cls._logger.exception(f"raemis error reading {ep.value}", stack_info=True)
+            raise
+
+    @classmethod
+    async def _compress(
+        cls, chunks: _AsyncIterable[bytes], parts: list[bytes]
+    ) -> _AsyncIterator[bytes]:
+        compressor = _zlib.compressobj(1)
+        async for chunk in chunks:
+            parts.append(compressor.compress(chunk))
+            yield chunk
+        parts.append(compressor.flush())
 
     @classmethod
-    async def _convert_api_subscribers(
-        cls, json: list[dict[str, str]]
-    ) -> _Iterable[_Item]:
-        return list(_exec.map(cls._convert_api_subscriber, json, chunksize=100))
+    async def _replay(cls, body: bytes) -> _AsyncIterator[bytes]:
+        decompressor = _zlib.decompressobj()
+        while True:
+            # no bigger than what the network would have handed us
+            chunk = decompressor.decompress(body, cls._chunk_size)
+            body = decompressor.unconsumed_tail
+            if not chunk and not body:
+                break
+            yield chunk
+        yield decompressor.flush()
 
     @classmethod
     def _convert_api_subscriber(cls, json: dict[str, str]) -> _Item:
@@ -150,25 +301,20 @@ class Raemis:
         )
 
     @classmethod
-    async def get_data_sessions(cls) -> _Iterable[_Item]:
-        data = list()
-        try:
-            cls._logger.info("getting data sessions from raemis")
-            async for data in cls._get_data(RaemisEndpoint.DATA_SESSIONS):
-                data = await data.json()
-                cls._logger.info(
-                    f'returning {len(data) if data is not None else "N/A"} data session records'
-                )
-                data = await cls._convert_sessions_to_items(data)
-        except:
-            cls._logger.exception("raemis error", stack_info=True)
-        return data
+    async def get_data_sessions(cls) -> _AsyncIterator[_Item]:
+        cls._logger.info("getting data sessions from raemis")
+        count = 0
+        records = cls._stream(RaemisEndpoint.DATA_SESSIONS)
+        items = _Converter.convert_stream(cls._convert_session_to_item, records)
+        async with _aclosing(records), _aclosing(items):
+            async for item in items:
+                count += 1
+                yield item
+        cls._logger.info(f"returned {count} data session records")
 
     @classmethod
-    async def _convert_sessions_to_items(
-        cls, d: list[dict[str, str]]
-    ) -> _Iterable[_Item]:
-        return list(_exec.map(cls._convert_session_to_item, d, chunksize=75))
+    async def list_data_sessions(cls) -> list[_Item]:
+        return [x async for x in cls.get_data_sessions()]
 
     @classmethod
     def _convert_session_to_item(cls, i: dict[str, str]) -> _Item:
@@ -178,7 +324,7 @@ class Raemis:
         if "imsi" in i and i["imsi"]:
             ret.imsi = _IMSI(i["imsi"])
         if "ip" in i and i["ip"]:
-            ret.ipv4 = _IPv4Address(address=i["ip"])
+            ret.ipv4 = _IPv4Address.parse(i["ip"])
         cls._logger.debug(
             f'found ip address: {ret.ipv4 if ret.ipv4 else "N/A"} for item: {ret if ret else "UNKNOWN"}'
         )
@@ -205,30 +351,60 @@ class Raemis:
                 return
 
     @classmethod
-    async def _get_data(cls, ep: RaemisEndpoint) -> _AsyncIterable[_ClientResponse]:
-        async for x in cls._request(HTTPMethod.GET, ep):
-            try:
-                yield x
-            except:
-                return
+    async def _get_data(
+        cls, ep: RaemisEndpoint, headers: dict[str, str] = {}
+    ) -> _AsyncIterable[_ClientResponse]:
+        async with _aclosing(cls._request(HTTPMethod.GET, ep, headers=headers)) as r:
+            async for x in r:
+                try:
+                    yield x
+                except:
+                    return
 
     @classmethod
     async def _request(
-        cls, method: HTTPMethod, ep: RaemisEndpoint, data: dict[str, str] = {}
+        cls,
+        method: HTTPMethod,
+        ep: RaemisEndpoint,
+        data: dict[str, str] = {},
+        headers: dict[str, str] = {},
     ) -> _AsyncIterable[_ClientResponse]:
-        try:
-            async with _ClientSession(base_url=cls.apiUrl, auth=cls._auth) as session:
+        # only a GET is safe to send again
+        attempts = max(1, cls._retries) if method == HTTPMethod.GET else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                session = await cls.pool().connect()
                 resp = await session.request(
-                    method=method.value, url=ep.value, data=data
+                    method=method.value, url=ep.value, data=data, headers=headers
                 )
-                try:
-                    yield resp
-                except:
-                    resp.close()
+                if resp.status >= 500 and attempt < attempts:
+                    resp.release()
+                    raise ConnectionError(f"HTTP {resp.status}")
+                break
+            except (InterruptedError, _asyncio.CancelledError):
+                raise
+            except:
+                cls._logger.exception(
+                    f"unable to resolve HTTP {method.value} request to {ep.value} (attempt {attempt} of {attempts})",
+                    stack_info=True,
+                )
+                if attempt == attempts:
+                    raise _requests.ConnectionError
+                await _asyncio.sleep(2 ** (attempt - 1))
+        try:
+            yield resp
+        finally:
+            # hands the connection back to the pool once the body is read
+            resp.release()
 
-        except:
-            cls._logger.exception(
-                f"unable to resolve HTTP {method.value} request to {ep.value}",
-                stack_info=True,
-            )
-            raise _requests.ConnectionError
+
+_config = Application.config.raemis
+Raemis._connection_limit = int(getattr(_config, "connections", 4))
+Raemis._keepalive = float(getattr(_config, "keepalive", 60))
+Raemis._timeout = float(getattr(_config, "timeout", 60))
+Raemis._retries = int(getattr(_config, "retries", 3))
+# env overrides arrive as strings
+Raemis._conditional = str(getattr(_config, "conditional", True)).lower() in (
+    "true",
+    "1",
+)
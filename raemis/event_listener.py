@@ -5,167 +5,419 @@
 # license that can be found in the LICENSE file or at
 # https://opensource.org/licenses/MIT.
 
-from http.server import BaseHTTPRequestHandler as _BaseHTTPRequestHandler
-from http.server import BaseHTTPRequestHandler as _BaseHTTPRequestHandler
-from socketserver import ThreadingTCPServer as _ThreadingTCPServer
+import asyncio as _asyncio
+from collections import deque as _deque
 import time as _time
-import pprint as _pprint
 import threading as _threading
+from dataclasses import dataclass as _dc, replace as _replace
+from datetime import datetime as _datetime
 from urllib.parse import parse_qs as _parse_qs
 import logging as _logging
 import json as _json
+from typing import Any as _Any, Callable as _Callable
+from model.network import IPv4Address as _IPv4Address
+from model.journal import Journal as _Journal
 
+# keys raemis has used for the ue address in pdp context event data
+_ADDRESS_KEYS = ("ip", "ue_ip", "ip_address", "pdn_address", "address")
+_SESSION_EVENTS = ("pdp_context_activated", "pdp_context_deactivated")
 
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    503: "Service Unavailable",
+}
+
+
+def session_address(data: _Any) -> _IPv4Address | None:
+    if not isinstance(data, dict):
+        return None
+    for key in _ADDRESS_KEYS:
+        if data.get(key):
+            try:
+                return _IPv4Address.parse(str(data[key]).strip())
+            except:
+                return None
+    return None
+
+
+@_dc(frozen=True, slots=True)
+class SessionEvent:
+    event: str
+    imsi: str
+    ipv4: _IPv4Address | None
+    time: float
+    lsn: int = 0
+
+    def to_record(self) -> dict[str, _Any]:
+        return {
+            "event": self.event,
+            "imsi": self.imsi,
+            "ip": repr(self.ipv4) if self.ipv4 is not None else None,
+            "time": self.time,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict[str, _Any], lsn: int = 0) -> "SessionEvent":
+        ipv4 = _IPv4Address.parse(record["ip"]) if record.get("ip") else None
+        return cls(record["event"], record["imsi"], ipv4, record["time"], lsn)
+
+
+def parse_event(body: bytes) -> SessionEvent | None:
+    form = _parse_qs(body.decode("utf-8", "replace"))
+
+    def first(key: str) -> str:
+        values = form.get(key)
+        return values[0].strip() if values else ""
+
+    event = first("event_type").lower()
+    imsi = first("imsi")
+    if not event or not imsi:
+        raise ValueError("event without an event_type or imsi")
+    if event not in _SESSION_EVENTS:
+        return None
+    ipv4 = None
+    if event == "pdp_context_activated" and first("add_text"):
+        ipv4 = session_address(_json.loads(first("add_text")))
+    try:
+        ts = _datetime.strptime(first("event_time"), "%Y-%m-%d %H:%M:%S.%f")
+        when = ts.timestamp()
+    except ValueError:
+        when = _time.time()
+    return SessionEvent(event, imsi, ipv4, when)
+
+
+# asyncio receiver for raemis event posts. posts are parsed on the loop and
+# queued; a consumer hands whatever is queued to `sink` as one batch. when the
+# queue is full a post waits up to `put_timeout` (not reading any further
+# requests on that connection) and is then turned away with a 503. with a
+# journal, a post is only answered once its event is on disk
 class Listener:
     _logger = _logging.getLogger(__name__)
-    _server_thread: _threading.Thread
+    _EVENT_PATH: str = "/events"
+    _METRICS_PATH: str = "/metrics"
+    _server_thread: _threading.Thread | None
+    _loop: _asyncio.AbstractEventLoop | None
+    _stopping: _asyncio.Event | None
+    _queue: _asyncio.Queue
+    _port: int
+    _host: str
+    _max_queue: int
+    _max_batch: int
+    _max_body: int
+    _put_timeout: float
+    _idle_timeout: float
+    _report: float
+    _started: _threading.Event
+    _journal: _Journal | None
+    _waiters: list[tuple[dict[str, _Any], _asyncio.Future]]
+    _commit: _asyncio.Event
+
+    def __init__(
+        self,
+        sink: _Callable[[list[SessionEvent]], None] | None = None,
+        port: int = 9997,
+        host: str = "0.0.0.0",
+        max_queue: int = 10000,
+        max_batch: int = 500,
+        put_timeout: float = 5.0,
+        report: float = 60.0,
+        journal: _Journal | None = None,
+    ):
+        self._sink = sink
+        self._journal = journal
+        self._waiters = []
+        self._port = port
+        self._host = host
+        self._max_queue = max_queue
+        self._max_batch = max_batch
+        self._max_body = 1 << 16
+        self._put_timeout = put_timeout
+        self._idle_timeout = 30.0
+        self._report = report
+        self._server_thread = None
+        self._loop = None
+        self._stopping = None
+        self._started = _threading.Event()
+        self.received = 0
+        self.ignored = 0
+        self.rejected = 0
+        self.malformed = 0
+        self.delivered = 0
+        self.batches = 0
+        self.events_per_second = 0.0
+
+    @property
+    def port(self) -> int:
+        return self._port
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._loop is not None else 0
+
+    def metrics(self) -> dict[str, _Any]:
+        return {
+            "received": self.received,
+            "ignored": self.ignored,
+            "rejected": self.rejected,
+            "malformed": self.malformed,
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "queue_depth": self.queue_depth,
+            "queue_size": self._max_queue,
+            "events_per_second": round(self.events_per_second, 2),
+        }
 
     def start_event_receiver_server(self) -> None:
+        self._server_thread = _threading.Thread(
+            target=self._run, name="event-receiver", daemon=True
+        )
+        self._server_thread.start()
+        self._started.wait(10)
+
+    def _run(self) -> None:
         try:
-            self._eventReceiver = _ThreadingTCPServer(
-                ("0.0.0.0", 9997), EventReceiver, bind_and_activate=True
-            )
-            self._server_thread = _threading.Thread(
-                target=self._eventReceiver.serve_forever
-            )
-            self._eventReceiver.timeout = 3
-            self._eventReceiver.block_on_close = False
-            self._eventReceiver.request_queue_size = 25
-            self._eventReceiver.daemon_threads = True
-            self._server_thread.daemon = True
-            self._server_thread.start()
-            self._logger.info("event receiver server thread started")
+            _asyncio.run(self._serve())
         except:
-            self._logger.exception("could not start event erceiver server")
+            self._logger.exception("could not run event receiver server")
+        finally:
+            self._started.set()
 
-    def __del__(self) -> None:
-        self.done = True
+    async def _serve(self) -> None:
+        self._loop = _asyncio.get_running_loop()
+        self._stopping = _asyncio.Event()
+        self._queue = _asyncio.Queue(self._max_queue)
+        server = await _asyncio.start_server(
+            self._handle, self._host, self._port, backlog=1024
+        )
+        self._port = server.sockets[0].getsockname()[1]
+        self._commit = _asyncio.Event()
+        tasks = [
+            _asyncio.create_task(self._consume()),
+            _asyncio.create_task(self._measure()),
+            _asyncio.create_task(self._committer()),
+        ]
+        self._logger.info(f"event receiver listening on {self._host}:{self._port}")
+        self._started.set()
         try:
-            self._eventReceiver.server_close()
-            self._eventReceiver.shutdown()
+            async with server:
+                await self._stopping.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._drain()
             self._logger.info("Event receiver HTTP server shutdown")
+
+    def stop(self) -> None:
+        if self._loop is not None and self._stopping is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._stopping.set)
+            except RuntimeError:
+                pass
+        if self._server_thread is not None:
+            self._server_thread.join(10)
+            self._server_thread = None
+
+    def __del__(self) -> None:
+        try:
+            self.stop()
         except:
             self._logger.error("event receiver HTTP server failed to shutdown")
 
+    async def _handle(
+        self, reader: _asyncio.StreamReader, writer: _asyncio.StreamWriter
+    ) -> None:
+        try:
+            while await self._handle_one(reader, writer):
+                pass
+        except (
+            _asyncio.IncompleteReadError,
+            _asyncio.TimeoutError,
+            ConnectionError,
+        ):
+            pass
+        except Exception:
+            self._logger.exception("event receiver connection failed")
+        finally:
+            writer.close()
 
-class EventReceiver(_BaseHTTPRequestHandler):
-    _EVENT_PATH: str = "/events"
-    _logger = _logging.getLogger(__name__)
-    _last_time = _time.thread_time_ns()
-    _this_time = _time.thread_time_ns()
-
-    def posts_per_second(self):
-        return 1e9 / (self._last_time - self._this_time)
-
-    def update_time(self):
-        self._last_time = self._this_time
-        self._this_time = _time.thread_time_ns()
-
-    def do_POST(self):
-        if self._EVENT_PATH in self.path:
-            self._logger.info("received event data from Raemis")
-            data_len = self.headers.get("Content-Length")
-            content_type = self.headers.get("Content-Type")
-            data_len = int(data_len) if data_len else 0
-            self.rfile.flush()
-            post_data = self.rfile.read(data_len)
-            post_data = _parse_qs(post_data, True, False)
-            if b"imsi" not in post_data:
-                self._logger.error(
-                    f"no imsi in {post_data} aborting processing this record"
-                )
-                return
-            imsis = post_data[b"imsi"]
-            if b"add_text" not in post_data:
-                self._logger.warn(
-                    f'no "add_text" in {post_data} NOT aborting processing this record'
-                )
-            add_text = post_data[b"add_text"]
-            if b"event_type" not in post_data:
-                self._logger.error(
-                    f"no event_type in {post_data} aborting processing this record"
-                )
-                return
-            events = post_data[b"event_type"]
-            if b"event_time" not in post_data:
-                self._logger.warn(
-                    f'no "event_time" in {post_data} NOT aborting processing this record'
-                )
-            event_times = post_data[b"event_time"]
-            if (
-                not imsis
-                or not isinstance(imsis, list)
-                or not add_text
-                or not isinstance(add_text, list)
-                or not events
-                or not isinstance(events, list)
-                or not event_times
-                or not isinstance(event_times, list)
-                or not "x-www-form-urlencoded" == content_type.lower().strip()
-            ):
-                self.send_response(200)
-                self.send_header("Content-Type", "text/html")
-                self.send_header("Content-Length", "0")
-                self.end_headers()
-                self.wfile.flush()
-                self.connection.close()
-                self._logger.error(
-                    f"hit some kind of snag parsing the lists and content-type: {content_type}"
-                )
-                self._logger.error(
-                    f"\tlists:\n\t{imsis}\n\t{add_text}\n\t{events}\n\t{event_times}"
-                )
-            event = data = event_time = imsi = ""
+    async def _handle_one(
+        self, reader: _asyncio.StreamReader, writer: _asyncio.StreamWriter
+    ) -> bool:
+        try:
+            head = await _asyncio.wait_for(
+                reader.readuntil(b"\r\n\r\n"), self._idle_timeout
+            )
+        except _asyncio.LimitOverrunError:
+            await self._reply(writer, 431, close=True)
+            return False
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await self._reply(writer, 400, close=True)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep = connection != "close" and (
+            version != "HTTP/1.0" or connection == "keep-alive"
+        )
+        length = headers.get("content-length") or "0"
+        # int() would also take "-1", "+1" and "1_000"
+        if not (length.isascii() and length.isdigit()):
+            self.malformed += 1
+            await self._reply(writer, 400, close=True)
+            return False
+        length = int(length)
+        if length > self._max_body:
+            await self._reply(writer, 413, close=True)
+            return False
+        body = await reader.readexactly(length) if length else b""
+        path = target.split("?", 1)[0]
+        if path == self._METRICS_PATH and method == "GET":
+            data = _json.dumps(self.metrics()).encode()
+            await self._reply(writer, 200, data, "application/json", not keep)
+        elif not path.startswith(self._EVENT_PATH):
+            await self._reply(writer, 404, close=not keep)
+        elif method != "POST":
+            await self._reply(writer, 405, close=not keep)
+        else:
+            status = await self._accept(body)
+            keep = keep and status != 503
+            await self._reply(writer, status, close=not keep)
+        return keep
+
+    async def _accept(self, body: bytes) -> int:
+        self.received += 1
+        try:
+            event = parse_event(body)
+        except:
+            self.malformed += 1
+            self._logger.error(f"unable to parse event post: {body[:200]!r}")
+            return 400
+        if event is None:
+            self.ignored += 1
+            return 200
+        if self._journal is not None:
             try:
-                event = events[0].decode().strip().lower()
-                event_time = event_times[0].decode().strip().lower()
-                imsi = imsis[0].decode().strip().lower()
-                data = add_text[0].decode().strip().lower()
+                event = _replace(event, lsn=await self._durable(event.to_record()))
             except:
-                self._logger.error("unable to parse POST data:")
-                self._logger.error(f"event: {event}")
-                self._logger.error(f"time: {event_time}")
-                self._logger.error(f"imsi: {imsi}")
-                self._logger.error(f"extra: {data}")
-            if data:
-                try:
-                    data = _json.loads(data)
-                except:
-                    self._logger.error(f"unable to parse extra data ({data}) as JSON")
-                    return
+                self._logger.exception("could not write event journal")
+                return 503
+        try:
+            self._queue.put_nowait(event)
+        except _asyncio.QueueFull:
             try:
-                event_time = _time.strptime(event_time, "%Y-%m-%d %H:%M:%S.%f")
-            except:
-                self._logger.warn(
-                    f'unable to parse time {event_time} with format string "%Y-%m-%d %H:%M:%S.%f"'
-                )
-            if event == "pdp_context_activated":
-                self._logger.info(f"parsing event: {event}")
-                data = dict(data)
-            elif event == "pdp_context_deactivated":
-                self._logger.info(f"parsing event: {event}")
+                await _asyncio.wait_for(self._queue.put(event), self._put_timeout)
+            except _asyncio.TimeoutError:
+                self.rejected += 1
+                # a storm would flood the log, the count shows up in metrics
+                self._logger.debug(f"event queue full, turned away {event}")
+                if self._journal is not None:
+                    # raemis will send it again, it must not replay as well
+                    loop = _asyncio.get_running_loop()
+                    await loop.run_in_executor(None, self._journal.ack, [event.lsn])
+                return 503
+        return 200
+
+    # resolves to the record's lsn once it is on disk
+    async def _durable(self, record: dict[str, _Any]) -> int:
+        future = _asyncio.get_running_loop().create_future()
+        self._waiters.append((record, future))
+        self._commit.set()
+        return await future
+
+    def _write(self, records: list[dict[str, _Any]]) -> list[int]:
+        lsns = self._journal.extend(records)
+        self._journal.sync(lsns[-1])
+        return lsns
+
+    # group commit: the records of every post waiting are appended and synced
+    # together off the loop, since appends can rotate and compact the journal
+    async def _committer(self) -> None:
+        loop = _asyncio.get_running_loop()
+        while True:
+            await self._commit.wait()
+            self._commit.clear()
+            waiters, self._waiters = self._waiters, []
+            if not waiters:
+                continue
+            records = [record for record, _ in waiters]
+            try:
+                lsns = await loop.run_in_executor(None, self._write, records)
+            except Exception as e:
+                for _, future in waiters:
+                    if not future.done():
+                        future.set_exception(e)
             else:
-                self._logger.warn(f"event {event} not parsed")
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Content-Length", str(len(post_data)))
-            self.end_headers()
-            self.wfile.write(_pprint.pformat(post_data).encode())
-            self.wfile.flush()
-            self.connection.close()
-            self._logger.info(
-                f"Received {self.posts_per_second()} POST requests from Raemis per second"
-            )
-        return
-
-    def do_GET(self):
-        print("got stuff")
-        self._logger.info("received GET event data from Raemis")
-        obj = _json.dumps({"error": "incorrect method"})
-        obj = obj.encode("utf-8")
-        self.send_response(404)
-        self.send_header("Content-Type", "text/html")
-        self.end_headers()
-        self.wfile.write(obj)
-        self.connection.close()
-        return
+                for (_, future), lsn in zip(waiters, lsns):
+                    if not future.done():
+                        future.set_result(lsn)
+
+    async def _reply(
+        self,
+        writer: _asyncio.StreamWriter,
+        status: int,
+        body: bytes = b"",
+        content_type: str = "text/plain",
+        close: bool = False,
+    ) -> None:
+        head = (
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+        )
+        if status == 503:
+            head += "Retry-After: 1\r\n"
+        if close:
+            head += "Connection: close\r\n"
+        writer.write(head.encode("latin-1") + b"\r\n" + body)
+        await writer.drain()
+
+    async def _consume(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self._max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self._deliver(batch)
+            # let handlers refill the queue before the next hand-off
+            await _asyncio.sleep(0)
+
+    def _drain(self) -> None:
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            self._deliver(batch)
+
+    def _deliver(self, batch: list[SessionEvent]) -> None:
+        self.batches += 1
+        self.delivered += len(batch)
+        if self._sink is None:
+            self._logger.debug(f"no sink for {len(batch)} events")
+            return
+        try:
+            self._sink(batch)
+        except:
+            self._logger.exception(f"event sink failed on {len(batch)} events")
+
+    # events/sec over the last few seconds, logged every `report` seconds
+    async def _measure(self) -> None:
+        samples = _deque([(_time.monotonic(), self.received)], maxlen=6)
+        logged = samples[0][0]
+        while True:
+            await _asyncio.sleep(1)
+            now = _time.monotonic()
+            samples.append((now, self.received))
+            then, before = samples[0]
+            self.events_per_second = (self.received - before) / (now - then)
+            if now - logged >= self._report:
+                logged = now
+                self._logger.info(f"event receiver: {self.metrics()}")
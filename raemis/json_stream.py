@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import codecs as _codecs
+from json import JSONDecoder as _JSONDecoder, JSONDecodeError as _JSONDecodeError
+from json import loads as _loads
+from typing import (
+    Any as _Any,
+    AsyncIterable as _AsyncIterable,
+    AsyncIterator as _AsyncIterator,
+)
+
+_WHITESPACE = " \t\r\n"
+_START, _VALUE_OR_END, _VALUE, _COMMA_OR_END, _DONE, _WHOLE = range(6)
+
+
+# incremental parser for a top level json array: feed it chunks of the body
+# and it hands back each element as soon as it is complete, so only one
+# element (plus the unread tail of the last chunk) is held at a time
+class JSONArrayParser:
+    _decoder = _JSONDecoder()
+    _text: str
+    _pos: int
+    _state: int
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._state = _START
+        self._utf8 = _codecs.getincrementaldecoder("utf-8")()
+
+    def feed(self, data: bytes | str) -> list[_Any]:
+        if isinstance(data, bytes):
+            data = self._utf8.decode(data)
+        self._text = self._text[self._pos :] + data
+        self._pos = 0
+        return self._parse(final=False)
+
+    def close(self) -> list[_Any]:
+        self._text = self._text[self._pos :] + self._utf8.decode(b"", final=True)
+        self._pos = 0
+        ret = self._parse(final=True)
+        if self._state == _WHOLE:
+            # not an array, fall back to decoding the whole body at once
+            value = _loads(self._text) if self._text.strip() else []
+            self._text = ""
+            self._state = _DONE
+            return value if isinstance(value, list) else [value]
+        if self._state != _DONE:
+            raise _JSONDecodeError("unterminated array", self._text, self._pos)
+        return ret
+
+    def _parse(self, final: bool) -> list[_Any]:
+        ret = []
+        text, pos, n = self._text, self._pos, len(self._text)
+        while self._state != _WHOLE:
+            while pos < n and text[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= n:
+                break
+            if self._state == _START:
+                if text[pos] != "[":
+                    self._state = _WHOLE
+                    break
+                self._state = _VALUE_OR_END
+                pos += 1
+            elif self._state == _COMMA_OR_END:
+                if text[pos] == ",":
+                    self._state = _VALUE
+                elif text[pos] == "]":
+                    self._state = _DONE
+                else:
+                    raise _JSONDecodeError("expected ',' or ']'", text, pos)
+                pos += 1
+            elif self._state == _DONE:
+                raise _JSONDecodeError("extra data after array", text, pos)
+            elif self._state == _VALUE_OR_END and text[pos] == "]":
+                self._state = _DONE
+                pos += 1
+            else:
+                try:
+                    value, end = self._decoder.raw_decode(text, pos)
+                except _JSONDecodeError:
+                    if final:
+                        raise
+                    break
+                # a number or literal at the end may continue in the next chunk
+                if end >= n and not final:
+                    break
+                ret.append(value)
+                self._state = _COMMA_OR_END
+                pos = end
+        self._pos = pos
+        return ret
+
+
+async def iter_json_array(chunks: _AsyncIterable[bytes]) -> _AsyncIterator[_Any]:
+    parser = JSONArrayParser()
+    async for chunk in chunks:
+        for value in parser.feed(chunk):
+            yield value
+    for value in parser.close():
+        yield value
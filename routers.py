@@ -11,6 +11,7 @@ from routeros_api import RouterOsApiPool
 from routeros_api.api import RouterOsApi
 from routeros_api.resource import RouterOsResource
 import logging
+from typing import Any
 
 
 class MikroTikError(ConnectionError):
@@ -27,39 +28,54 @@ class MikroTikDeletionError(MikroTikError):
 
 class MikroTikRouter:
     _logger = logging.getLogger(__name__)
-    _api_client: RouterOsApi
+    _api_client: RouterOsApi | None
     _address_lists: None | RouterOsResource
     _filter: None | RouterOsResource
-    _api_pool: RouterOsApiPool
+    _api_pool: RouterOsApiPool | None
+    _settings: dict[str, Any]
 
     def __init__(
         self,
-        address=Application.config.mikrotik.host,
-        port=Application.config.mikrotik.port,
-        username=Application.config.mikrotik.username,
-        password=Application.config.mikrotik.password,
+        address: str | None = None,
+        port: int | None = None,
+        username: str | None = None,
+        password: str | None = None,
     ):
+        # read at construction, defaults would open the config on import
+        config = Application.config.mikrotik
+        self._settings = {
+            "host": config.host if address is None else address,
+            "port": config.port if port is None else port,
+            "username": config.username if username is None else username,
+            "password": config.password if password is None else password,
+        }
         self._address_lists = None
         self._filter = None
-        try:
-            self._api_pool = RouterOsApiPool(
-                host=address,
-                username=username,
-                password=password,
-                port=port,
-                use_ssl=True,
-                ssl_verify=False,
-                ssl_verify_hostname=False,
-                plaintext_login=True,
-            )
-            self._api_pool.set_timeout(60)
-            self._api_client = self._api_pool.get_api()
-            self._logger.debug("MikroTik api client pool created")
-        except:
-            self._logger.exception("Failed to initilize MikroTik api pool")
+        self._api_pool = None
+        self._api_client = None
+
+    # the router is only dialed when a resource is first needed
+    @property
+    def api(self) -> RouterOsApi:
+        if self._api_client is None:
+            try:
+                self._api_pool = RouterOsApiPool(
+                    **self._settings,
+                    use_ssl=True,
+                    ssl_verify=False,
+                    ssl_verify_hostname=False,
+                    plaintext_login=True,
+                )
+                self._api_pool.set_timeout(60)
+                self._api_client = self._api_pool.get_api()
+                self._logger.debug("MikroTik api client pool created")
+            except:
+                self._logger.exception("Failed to initilize MikroTik api pool")
+                raise MikroTikError("cannot connect to router")
+        return self._api_client
 
     def __del__(self):
-        if self._api_pool.connected:
+        if self._api_pool is not None and self._api_pool.connected:
             try:
                 self._api_pool.disconnect()
             except:
@@ -111,7 +127,7 @@ class MikroTikRouter:
     def filter(self) -> RouterOsResource:
         if self._filter is None:
             try:
-                self._filter = self._api_client.get_resource("/ip/firewall/filter")
+                self._filter = self.api.get_resource("/ip/firewall/filter")
             except:
                 self._logger.exception("unable to get firewall filter rules")
                 raise MikroTikError("cannot get firewall")
@@ -121,7 +137,7 @@ class MikroTikRouter:
     def address_lists(self) -> RouterOsResource:
         if self._address_lists is None:
             try:
-                self._address_lists = self._api_client.get_resource(
+                self._address_lists = self.api.get_resource(
                     "/ip/firewall/address-list"
                 )
             except:
@@ -7,98 +7,308 @@
 
 from model.network import MACAddress as _MACAddress, IMEI as _IMEI, IMSI as _IMSI
 from model.atoms import Item as _Item, Model as _Model, Manufacturer as _Manufacturer
+from model.metrics import MetricStore as _MetricStore, reduce_chains as _reduce_chains
 from typing import (
-    AsyncIterable as _AsyncIterable,
+    Any as _Any,
+    AsyncIterator as _AsyncIterator,
     Iterable as _Iterable,
-    Coroutine as _Coroutine,
 )
+from dataclasses import dataclass as _dc, field as _field
 import re as _re
+import socket as _socket
+import time as _time
 import logging
 from asyncio import gather as _gather
 from aiosnmp import Snmp as _Snmp, SnmpVarbind as _SnmpVarBind
-from aiosnmp.exceptions import SnmpTimeoutError as _SnmpTimeoutError
+from aiosnmp.exceptions import (
+    SnmpTimeoutError as _SnmpTimeoutError,
+    SnmpErrorTooBig as _SnmpErrorTooBig,
+)
+from aiosnmp.message import SnmpMessage as _SnmpMessage
+from aiosnmp.protocols import SnmpProtocol as _SnmpProtocol
+from main import Application
 import asyncio as _asyncio
 
 
+class TokenBucket:
+    rate: float
+    capacity: float
+    _tokens: float
+    _stamp: float | None
+    _lock: _asyncio.Lock
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = float(rate)
+        self.capacity = float(max(1, burst if burst is not None else int(rate) or 1))
+        self._tokens = self.capacity
+        self._stamp = None
+        self._lock = _asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            now = _asyncio.get_running_loop().time()
+            if self._stamp is not None:
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._stamp) * self.rate
+                )
+            self._stamp = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            wait = (1 - self._tokens) / self.rate
+            await _asyncio.sleep(wait)
+            # the token that accrued while sleeping is the one being spent
+            self._tokens = 0
+            self._stamp = now + wait
+
+
+# an aiosnmp client that borrows the scanner's UDP endpoint instead of opening
+# its own socket; responses are matched on (host, port, request_id)
+class _SharedSnmp(_Snmp):
+    __slots__ = ("_scanner",)
+
+    def __init__(self, scanner: "Scanner", **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._scanner = scanner
+
+    async def _connect(self) -> None:
+        self._transport, self._protocol = await self._scanner._endpoint()
+        self._sockaddr = (self.host, self.port)
+
+    def close(self) -> None:
+        self._protocol = None
+        self._transport = None
+        self._sockaddr = None
+        self._closed = True
+
+    async def _send(self, message: _SnmpMessage) -> list[_SnmpVarBind]:
+        await self._scanner._bucket.acquire()
+        return await super()._send(message)
+
+
+class Scanner:
+    _logger = logging.getLogger(__name__)
+    concurrency: int
+    deadline: float
+    timeout: float
+    retries: int
+    community: str
+    _bucket: TokenBucket
+    _transport: _asyncio.DatagramTransport | None
+    _protocol: _SnmpProtocol | None
+    _lock: _asyncio.Lock
+
+    def __init__(
+        self,
+        concurrency: int = 64,
+        rate: float = 200.0,
+        burst: int | None = None,
+        deadline: float = 30.0,
+        timeout: float = 5,
+        retries: int = 3,
+        community: str = "public",
+    ):
+        self.concurrency = max(1, int(concurrency))
+        self.deadline = float(deadline)
+        self.timeout = timeout
+        self.retries = retries
+        self.community = community
+        self._bucket = TokenBucket(rate, burst)
+        self._transport = None
+        self._protocol = None
+        self._lock = _asyncio.Lock()
+
+    async def __aenter__(self) -> "Scanner":
+        await self._endpoint()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+    async def _endpoint(self) -> tuple[_asyncio.DatagramTransport, _SnmpProtocol]:
+        async with self._lock:
+            if self._transport is None or self._transport.is_closing():
+                loop = _asyncio.get_running_loop()
+                self._transport, self._protocol = await loop.create_datagram_endpoint(
+                    lambda: _SnmpProtocol(self.timeout, self.retries, True),
+                    local_addr=("0.0.0.0", 0),
+                    family=_socket.AF_INET,
+                )
+            return self._transport, self._protocol
+
+    def close(self) -> None:
+        if self._transport is not None and not self._transport.is_closing():
+            self._transport.close()
+        self._transport = None
+        self._protocol = None
+
+    def client(self, host: str) -> _Snmp:
+        return _SharedSnmp(
+            self,
+            host=host,
+            community=self.community,
+            timeout=self.timeout,
+            retries=self.retries,
+        )
+
+    async def _scan_one(self, item: _Item) -> _Item:
+        host = Session._host(item)
+        try:
+            async with self.client(host) as snmp:
+                return await _asyncio.wait_for(
+                    Session._probe(item, snmp), self.deadline
+                )
+        except _asyncio.TimeoutError:
+            self._logger.warning(f"gave up on {host} after {self.deadline}s")
+        except:
+            self._logger.exception(f"couldnt scan {host}")
+        return _Item()
+
+    async def scan(self, items: _Iterable[_Item]) -> _AsyncIterator[_Item]:
+        targets = [x for x in items if x.ipv4]
+        if not targets:
+            return
+        pending = iter(targets)
+        results: _asyncio.Queue[_Item] = _asyncio.Queue()
+
+        async def worker() -> None:
+            for item in pending:
+                await results.put(await self._scan_one(item))
+
+        workers = [
+            _asyncio.create_task(worker())
+            for _ in range(min(self.concurrency, len(targets)))
+        ]
+        try:
+            for _ in range(len(targets)):
+                yield await results.get()
+        finally:
+            for w in workers:
+                w.cancel()
+            await _gather(*workers, return_exceptions=True)
+
+
 class Session(object):
     _logger = logging.getLogger(__name__)
+    _concurrency = 64
+    _rate = 200.0
+    _deadline = 30.0
+    _max_oids = 24
+    _pdu_budget = 1400
+    _varbind_budget = 48
+    _max_repetitions = 8
+    _devices: "DeviceCache"
+    metrics: _MetricStore | None = None
+
+    @classmethod
+    def scanner(cls) -> Scanner:
+        return Scanner(
+            concurrency=cls._concurrency, rate=cls._rate, deadline=cls._deadline
+        )
+
+    @classmethod
+    async def scan(cls, l: _Iterable[_Item]) -> _AsyncIterator[_Item]:
+        async with cls.scanner() as scanner:
+            async for item in scanner.scan(l):
+                yield item
 
     @classmethod
     async def get_all_values(cls, l: _Iterable[_Item]) -> _Iterable[_Item]:
-        tasks: _Iterable[_Coroutine[None, None, _Item]] = []
-        for item in l:
-            tasks.append(cls.get_item_values(item))
-        return await _gather(*tasks)
+        return [x async for x in cls.scan(l)]
+
+    @classmethod
+    def _host(cls, i: _Item) -> str:
+        ip = str(i.ipv4)
+        return ip.split("/", 1)[0]
 
     @classmethod
     async def get_item_values(cls, i: _Item) -> _Item:
-        ret = _Item()
         if not i.ipv4:
-            return ret
-
+            return _Item()
         async with _Snmp(
-            host=str(i.ipv4)[: str(i.ipv4).index("/")],
+            host=cls._host(i),
             community="public",
             timeout=5,
             retries=3,
         ) as snmp:
-            cls._logger.info(f"getting SNMP info for IP {snmp.host}")
-            try:
-                info = (await cls._get_device_info(snmp)).strip().lower()
-                t120_info = _re.compile(r"linux\s*[a-z0-9_]*\s*[-0-9\.]+uc\d")
-                t123_info = _re.compile(r"linux\s*gdm\d{1,5}\s*[-0-9\.]+uc\d")
-                bec69_info = _re.compile(
-                    r"(bec)?\s*((ridgewave)|(bec))?\s*((6[95]00)|(7000))((ael)|(-r21)|(\s*r28-g))?\s*4g/lte"
+            return await cls._probe(i, snmp)
+
+    @classmethod
+    async def _probe(cls, i: _Item, snmp: _Snmp) -> _Item:
+        ret = _Item()
+        cls._logger.info(f"getting SNMP info for IP {snmp.host}")
+        try:
+            known = cls._devices.get(i, snmp.host)
+            if known:
+                kind, info = known
+                ret = await cls._probe_kind(kind, snmp, info)
+                if ret.mac_address or ret.imei or kind == _NETGEAR:
+                    cls._devices.put(kind, info, snmp.host, i, ret)
+                    cls._record(ret, i)
+                    cls._logger.info(f"returning {ret} for {snmp.host}")
+                    return ret
+                cls._logger.info(
+                    f"cached {kind} probe found nothing for {snmp.host}, reclassifying"
                 )
-                test = await cls._snmp_get_value(snmp, "1.3.6.1.4.1.17713.20.2.1.4.1.0")
-                if _re.match(t123_info, info) and not test:
-                    ret = await cls._get_telrad_12300(snmp)
-                elif _re.match(t120_info, info) or "12000" in test:
-                    ret = await cls._get_telrad_12000(snmp)
-                elif _re.match(bec69_info, info) or (
-                    i.imei and str(i.imei).startswith("8699")
-                ):
-                    ret = await cls._get_bec6900(snmp, info)
-                elif ret.manufacturer == _Manufacturer.BAICELLS:
-                    cls._logger.info(f"found a Baicells device at {snmp.host}")
-                elif "efi" in info:
-                    ret.model = _Model.WAC104
-                    ret.manufacturer = _Manufacturer.NETGEAR
-                    cls._logger.info(
-                        f"Netgear device found for {snmp.host} -- skipping"
-                    )
-                else:
-                    cls._logger.error(f"no model type determined for {snmp.host}")
-            except:
-                cls._logger.exception(f"couldnt get snmp info for {snmp.host}")
+                cls._devices.forget(snmp.host, i)
+            found = await cls.get_many(snmp, [_SYS_DESCR, _TELRAD_PRODUCT])
+            info = found.get(_SYS_DESCR, "").strip().lower()
+            kind = cls._classify(i, info, found.get(_TELRAD_PRODUCT, ""))
+            if kind is None:
+                cls._logger.error(f"no model type determined for {snmp.host}")
+            else:
+                ret = await cls._probe_kind(kind, snmp, info)
+                cls._devices.put(kind, info, snmp.host, i, ret)
+                cls._record(ret, i)
+        except:
+            cls._logger.exception(f"couldnt get snmp info for {snmp.host}")
         cls._logger.info(f"returning {ret} for {snmp.host}")
         return ret
 
+    @classmethod
+    def _record(cls, ret: _Item, i: _Item) -> None:
+        if cls.metrics is not None:
+            cls.metrics.record(ret, i)
+
+    @classmethod
+    def _classify(cls, i: _Item, info: str, test: str) -> str | None:
+        if _T123_INFO.match(info) and not test:
+            return _T12300
+        if _T120_INFO.match(info) or "12000" in test:
+            return _T12000
+        if _BEC69_INFO.match(info) or (i.imei and str(i.imei).startswith("8699")):
+            return _BEC
+        if "efi" in info:
+            return _NETGEAR
+        return None
+
+    @classmethod
+    async def _probe_kind(cls, kind: str, snmp: _Snmp, info: str) -> _Item:
+        if kind == _T12300:
+            return await cls._get_telrad_12300(snmp)
+        if kind == _T12000:
+            return await cls._get_telrad_12000(snmp)
+        if kind == _BEC:
+            return await cls._get_bec6900(snmp, info)
+        ret = _Item()
+        ret.model = _Model.WAC104
+        ret.manufacturer = _Manufacturer.NETGEAR
+        cls._logger.info(f"Netgear device found for {snmp.host} -- skipping")
+        return ret
+
     @classmethod
     async def _get_device_info(cls, snmp: _Snmp) -> str:
-        return await cls._snmp_get_value(snmp, ".1.3.6.1.2.1.1.1.0")
+        return await cls._snmp_get_value(snmp, _SYS_DESCR)
 
     @classmethod
     async def _get_telrad_12300(cls, snmp: _Snmp) -> _Item:
         ret = _Item()
-
         ret.model = _Model.T12300
         ret.manufacturer = _Manufacturer.TELRAD
-
-        mac_num = await cls._snmp_search_bulk_regex(
-            snmp, ".1.3.6.1.2.1.2.2.1.2", _re.compile(r"eth0")
-        )
-        if mac_num is None or not mac_num.oid:
-            cls._logger.error(f"could not find the eth0 device for {snmp.host}")
-            return ret
-        mac_num = mac_num.oid.split(".")[-1]
-        mac = await cls._snmp_get_value(snmp, f".1.3.6.1.2.1.2.2.1.6.{mac_num}")
-        if mac:
-            try:
-                ret.mac_address = _MACAddress(mac)
-            except:
-                cls._logger.exception(f"mac address error: {mac}")
-
+        values = await cls.fill(snmp, TELRAD_12300)
+        cls._apply(ret, values, snmp.host)
         cls._logger.debug(f"found {ret} as a Telrad 12300")
         return ret
 
@@ -112,57 +322,21 @@ class Session(object):
         if "7000" in info:
             ret.model = _Model.BEC7000
         ret.manufacturer = _Manufacturer.BEC
-        mac_num = await cls._snmp_search_bulk_regex(
-            snmp, ".1.3.6.1.2.1.2.2.1.2", _re.compile(r"eth0")
-        )
-        if mac_num is None or not mac_num.oid:
-            cls._logger.error(f"could not find the eth0 device for {snmp.host}")
-        else:
-            mac_num = mac_num.oid.split(".")[-1]
-            mac = await cls._snmp_get_value(snmp, f".1.3.6.1.2.1.2.2.1.6.{mac_num}")
-            if mac:
-                try:
-                    ret.mac_address = _MACAddress(mac)
-                except:
-                    try:
-                        ret.mac_address = _MACAddress(mac.encode().hex())
-                    except:
-                        cls._logger.error(f"mac address error: {mac}")
-        signals = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17453.4.1.4.0")
-        if signals:
-            for signal in signals.split(" "):
-                parts = signal.split(":")
-                if parts[0] == "RSRP":
-                    ret.rsrp = parts[1]
-                if parts[0] == "RSRQ":
-                    ret.rsrq = parts[1]
-                if parts[0] == "SINR":
-                    ret.sinr = parts[1]
-        eci = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17453.4.1.6.0")
-        if eci:
-            ret.eci = eci
-        imei = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17453.4.1.8.0")
-        if imei:
-            ret.imei = _IMEI(imei)
-        imsi = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17453.4.1.9.0")
-        if imsi:
-            ret.imsi = _IMSI(imsi)
-        pci = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17453.4.1.7.0")
-        if pci:
-            ret.pci = pci
-        bandwidth = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17453.4.1.11.0")
-        if bandwidth:
-            ret.bandwidth = _re.split(r":\s*", bandwidth)[-1]
-        rssi = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17453.4.1.3.0")
-        if rssi:
-            ret.rssi = rssi
-        rx_mcs = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17453.4.1.20.0")
-        if rx_mcs:
-            ret.rx_mcs = rx_mcs
-        channel = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17453.4.1.17.0")
-        if channel:
-            ret.channel = channel
-
+        values = await cls.fill(snmp, BEC)
+        signals = values.pop("signals", "")
+        for signal in signals.split(" "):
+            parts = signal.split(":")
+            if len(parts) < 2:
+                continue
+            if parts[0] == "RSRP":
+                values["rsrp"] = parts[1]
+            if parts[0] == "RSRQ":
+                values["rsrq"] = parts[1]
+            if parts[0] == "SINR":
+                values["sinr"] = parts[1]
+        if values.get("bandwidth"):
+            values["bandwidth"] = _re.split(r":\s*", values["bandwidth"])[-1]
+        cls._apply(ret, values, snmp.host)
         cls._logger.debug(f"found {ret} as a BEC Device")
         return ret
 
@@ -171,169 +345,171 @@ class Session(object):
         ret = _Item()
         ret.model = _Model.T12000
         ret.manufacturer = _Manufacturer.TELRAD
-        mac = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.3.13.0")
-        if mac:
-            try:
-                ret.mac_address = _MACAddress(mac)
-            except:
-                cls._logger.exception(f"mac address error: {mac}")
-        imei = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.4.11.0")
-        if imei:
-            ret.imei = _IMEI(imei)
-        imsi = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.4.13.0")
-        if imsi:
-            ret.imsi = _IMSI(imsi)
-        serial = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.4.5.0")
-        if serial:
-            ret.serial_number = serial
-        product = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.4.3.0")
-        if product:
-            ret.product_id = product
-        rx_rate = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.14.0")
-        if rx_rate:
-            ret.rx_rate = rx_rate
-        tx_rate = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.11.0")
-        if tx_rate:
-            ret.tx_rate = tx_rate
-        tx_power = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.25.0")
-        if tx_power:
-            ret.tx_power = tx_power
-        rsrp_list = cls._snmp_get_value_bulk(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.6")
-        rsrp = 0
-        cnt = 0
-        async for r in rsrp_list:
-            try:
-                rsrp = float(r)
-                cnt += 1
-            except:
-                pass
-        if rsrp is not None and rsrp:
-            ret.rsrp = str(rsrp / cnt)
-        rsrq_list = cls._snmp_get_value_bulk(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.8")
-        rsrq = 0
-        cnt = 0
-        async for r in rsrq_list:
-            try:
-                rsrq = float(r)
-                cnt += 1
-            except:
-                pass
-        if rsrq is not None and rsrq:
-            ret.rsrq = str(rsrq / cnt)
-        pci = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.18.0")
-        if pci:
-            ret.pci = pci
-        eci = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.48.0")
-        if eci:
-            ret.eci = eci
-        cell_id = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.17.0")
-        if cell_id:
-            ret.cell_id = cell_id
-        full_cell_id = await cls._snmp_get_value(
-            snmp, ".1.3.6.1.4.1.17713.20.2.1.2.36.0"
-        )
-        if full_cell_id:
-            ret.full_cell_id = full_cell_id
-        sinr_list = cls._snmp_get_value_bulk(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.32")
-        sinr = 0
-        cnt = 0
-        async for r in sinr_list:
-            try:
-                sinr = float(r)
-                cnt += 1
-            except:
-                pass
-        if sinr is not None and sinr:
-            ret.sinr = str(sinr / cnt)
-        enb_id = await cls._snmp_get_value(snmp, ".1.3.6.1.4.1.17713.20.2.1.2.30.0")
-        if enb_id:
-            ret.enb_id = enb_id
+        values = await cls.fill(snmp, TELRAD_12000)
+        cls._apply(ret, values, snmp.host)
         cls._logger.debug(f"found {ret} as a Telrad 12000")
         return ret
 
     @classmethod
-    async def _snmp_get_value_bulk(cls, snmp: _Snmp, oid: str) -> _AsyncIterable[str]:
-        async for x in cls._snmp_get_bulk(snmp, oid):
-            if not x:
+    def _apply(cls, ret: _Item, values: dict[str, _Any], host: str) -> None:
+        for field, value in values.items():
+            if value is None or value == "":
                 continue
-            val = x.value
-            if isinstance(val, bytes):
-                val = val.decode()
-            if val is None:
-                yield ""
-            elif str(val).strip().lower() in ["none", "None", "NONE"]:
-                yield ""
-            yield str(val)
+            try:
+                if field in _convert:
+                    value = _convert[field](value)
+                setattr(ret, field, value)
+            except:
+                cls._logger.exception(f"{field} error for {host}: {value}")
 
+    # scalars go out in as few GetRequests as fit, while the columns and the
+    # interface table are walked together with GetBulk, all at the same time
     @classmethod
-    async def _snmp_get_bulk(
-        cls, snmp: _Snmp, oid: str
-    ) -> _AsyncIterable[_SnmpVarBind]:
-        try:
-            for check in await snmp.bulk_walk(oid):
-                if not isinstance(check, _SnmpVarBind):
-                    continue
-                try:
-                    yield check
-                except:
-                    return
-        except _SnmpTimeoutError:
-            pass
-        except:
-            cls._logger.exception(f"getting the oid group {oid} errored")
+    async def fill(cls, snmp: _Snmp, table: "OidTable") -> dict[str, _Any]:
+        bases = list(table.columns.values())
+        if table.interface:
+            bases += [_IF_DESCR, _IF_PHYS_ADDRESS]
+        found, walked = await _gather(
+            cls.get_many(snmp, list(table.scalars.values())),
+            cls.walk_many(snmp, bases),
+        )
+        values = {k: found.get(_oid(v), "") for k, v in table.scalars.items()}
+        for field, column in table.columns.items():
+            chains = [cls._decode(vb) for vb in walked.get(_oid(column), ())]
+            # a 0 dB SINR is a real reading, a 0 dBm RSRP is an idle chain
+            values[field] = _reduce_chains(chains, skip_zero=field != "sinr")
+        if table.interface:
+            values["mac_address"] = cls._interface_mac(walked, table.interface)
+            if not values["mac_address"]:
+                cls._logger.error(
+                    f"could not find the {table.interface} device for {snmp.host}"
+                )
+        return values
 
     @classmethod
-    async def _snmp_search_bulk_value_regex(
-        cls, snmp: _Snmp, oid: str, regex: _re.Pattern
-    ) -> str:
-        try:
-            async for x in cls._snmp_get_value_bulk(snmp, oid):
-                if x is not None and x and x != "NONE" and _re.fullmatch(regex, x):
-                    return x
-        except _SnmpTimeoutError:
-            pass
-        except:
-            cls._logger.exception(f"snmp error", stack_info=True)
+    def _interface_mac(cls, walked: dict[str, list[_SnmpVarBind]], name: str) -> str:
+        addresses = {
+            vb.oid.rsplit(".", 1)[-1]: vb for vb in walked.get(_IF_PHYS_ADDRESS, ())
+        }
+        for vb in walked.get(_IF_DESCR, ()):
+            if cls._decode(vb) == name:
+                mac = addresses.get(vb.oid.rsplit(".", 1)[-1])
+                return cls._decode(mac) if mac else ""
         return ""
 
     @classmethod
-    async def _snmp_search_bulk_regex(
-        cls, snmp: _Snmp, oid: str, regex: _re.Pattern
-    ) -> _SnmpVarBind | None:
+    def _chunks(cls, oids: list[str]) -> list[list[str]]:
+        chunks: list[list[str]] = []
+        size = 0
+        for oid in oids:
+            # the reply carries the oid back along with its value
+            cost = len(oid) + cls._varbind_budget
+            if (
+                not chunks
+                or len(chunks[-1]) >= cls._max_oids
+                or size + cost > cls._pdu_budget
+            ):
+                chunks.append([])
+                size = 0
+            chunks[-1].append(oid)
+            size += cost
+        return chunks
+
+    @classmethod
+    async def get_many(cls, snmp: _Snmp, oids: _Iterable[str]) -> dict[str, str]:
+        wanted = list(dict.fromkeys(_oid(x) for x in oids))
+        ret: dict[str, str] = {}
+        chunks = cls._chunks(wanted)
+        for part in await _gather(*(cls._get_chunk(snmp, c) for c in chunks)):
+            ret.update(part)
+        return ret
+
+    @classmethod
+    async def _get_chunk(cls, snmp: _Snmp, oids: list[str]) -> dict[str, str]:
         try:
-            async for x in cls._snmp_get_bulk(snmp, oid):
-                if not x:
-                    continue
-                val = x.value
-                if isinstance(val, bytes):
-                    try:
-                        val = val.decode()
-                    except:
-                        val = val.hex()
-                if _re.fullmatch(regex, str(val)):
-                    return x
+            vbs = await snmp.get(oids)
         except _SnmpTimeoutError:
-            pass
+            return {}
+        except _SnmpErrorTooBig:
+            if len(oids) == 1:
+                cls._logger.error(f"{oids[0]} is too big to get from {snmp.host}")
+                return {}
+            half = len(oids) // 2
+            first, second = await _gather(
+                cls._get_chunk(snmp, oids[:half]), cls._get_chunk(snmp, oids[half:])
+            )
+            return first | second
         except:
-            return None
+            if len(oids) == 1:
+                cls._logger.exception(f"errored getting oid {oids[0]}")
+                return {}
+            # one bad oid fails the whole PDU, so ask for each on its own
+            cls._logger.info(
+                f"batched get failed for {snmp.host}, retrying {len(oids)} oids singly"
+            )
+            parts = await _gather(*(cls._get_chunk(snmp, [x]) for x in oids))
+            return {k: v for part in parts for k, v in part.items()}
+        return {_oid(vb.oid): cls._decode(vb) for vb in vbs if vb.oid}
+
+    @classmethod
+    async def walk_many(
+        cls, snmp: _Snmp, bases: _Iterable[str]
+    ) -> dict[str, list[_SnmpVarBind]]:
+        ret: dict[str, list[_SnmpVarBind]] = {_oid(b): [] for b in bases}
+        cursor = {b: b for b in ret}
+        while cursor:
+            names = list(cursor)
+            try:
+                vbs = await snmp.get_bulk(
+                    [cursor[b] for b in names],
+                    non_repeaters=0,
+                    max_repetitions=cls._max_repetitions,
+                )
+            except _SnmpTimeoutError:
+                break
+            except:
+                cls._logger.exception(f"getting the oid groups {names} errored")
+                break
+            done: set[str] = set()
+            moved = False
+            # GetBulk replies interleave the requested columns row by row
+            for n, vb in enumerate(vbs):
+                base = names[n % len(names)]
+                if base in done:
+                    continue
+                if vb.value is None or not vb.oid.startswith(f"{base}."):
+                    done.add(base)
+                    continue
+                ret[base].append(vb)
+                cursor[base] = vb.oid
+                moved = True
+            for base in done:
+                cursor.pop(base, None)
+            if not moved:
+                break
+        return ret
+
+    @classmethod
+    def _decode(cls, vb: _SnmpVarBind) -> str:
+        val = vb.value
+        if val is None:
+            return ""
+        if isinstance(val, bytes):
+            try:
+                return val.decode()
+            except:
+                return val.hex()
+        val = str(val)
+        if val.lower().strip() == "none":
+            return ""
+        return val
 
     @classmethod
     async def _snmp_get_value(cls, snmp: _Snmp, oid: str) -> str:
         ret = await cls._snmp_get(snmp, oid)
         if not ret:
             return ""
-        if isinstance(ret.value, bytes):
-            try:
-                ret = ret.value.decode()
-            except:
-                ret = ret.value.hex()
-        else:
-            if ret is None:
-                return ""
-            ret = str(ret.value)
-            if ret.lower().strip() in ["none", "NONE", "None"]:
-                return ""
-        return ret
+        return cls._decode(ret)
 
     @classmethod
     async def _snmp_get(cls, snmp: _Snmp, oid: str) -> _SnmpVarBind | None:
@@ -346,3 +522,141 @@ class Session(object):
             pass
         except:
             cls._logger.exception(f"errored getting oid {oid}")
+
+
+class DeviceCache:
+    _ttl: float
+    _entries: dict[tuple[str, str], tuple[str, str, float]]
+
+    def __init__(self, ttl: float = 86400.0):
+        self._ttl = ttl
+        self._entries = {}
+
+    # addresses get handed to other devices, so a device is only cached by
+    # its address when it has nothing better to go by
+    @classmethod
+    def _keys(cls, host: str, *items: _Item) -> list[tuple[str, str]]:
+        keys = []
+        for i in items:
+            if i.mac_address:
+                keys.append(("mac", str(i.mac_address)))
+            if i.imei:
+                keys.append(("imei", str(i.imei)))
+        if not keys:
+            keys.append(("ip", host))
+        return keys
+
+    def get(self, i: _Item, host: str) -> tuple[str, str] | None:
+        now = _time.monotonic()
+        for key in self._keys(host, i):
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if entry[2] <= now:
+                del self._entries[key]
+                continue
+            return entry[0], entry[1]
+        return None
+
+    def put(self, kind: str, info: str, host: str, *items: _Item) -> None:
+        entry = (kind, info, _time.monotonic() + self._ttl)
+        # whatever was cached for the address may have been another device
+        self._entries.pop(("ip", host), None)
+        for key in self._keys(host, *items):
+            self._entries[key] = entry
+
+    def forget(self, host: str, *items: _Item) -> None:
+        self._entries.pop(("ip", host), None)
+        for key in self._keys(host, *items):
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _oid(oid: str) -> str:
+    return oid if oid.startswith(".") else f".{oid}"
+
+
+def _mac(value: str) -> _MACAddress:
+    try:
+        return _MACAddress(value)
+    except:
+        return _MACAddress(value.encode().hex())
+
+
+_convert = {"mac_address": _mac, "imei": _IMEI, "imsi": _IMSI}
+
+
+@_dc(frozen=True)
+class OidTable:
+    scalars: dict[str, str] = _field(default_factory=dict)
+    columns: dict[str, str] = _field(default_factory=dict)
+    interface: str | None = None
+
+
+_T12300 = "telrad12300"
+_T12000 = "telrad12000"
+_BEC = "bec"
+_NETGEAR = "netgear"
+
+_T120_INFO = _re.compile(r"linux\s*[a-z0-9_]*\s*[-0-9\.]+uc\d")
+_T123_INFO = _re.compile(r"linux\s*gdm\d{1,5}\s*[-0-9\.]+uc\d")
+_BEC69_INFO = _re.compile(
+    r"(bec)?\s*((ridgewave)|(bec))?\s*((6[95]00)|(7000))((ael)|(-r21)|(\s*r28-g))?\s*4g/lte"
+)
+
+_SYS_DESCR = ".1.3.6.1.2.1.1.1.0"
+_TELRAD_PRODUCT = ".1.3.6.1.4.1.17713.20.2.1.4.1.0"
+_IF_DESCR = ".1.3.6.1.2.1.2.2.1.2"
+_IF_PHYS_ADDRESS = ".1.3.6.1.2.1.2.2.1.6"
+
+TELRAD_12000 = OidTable(
+    scalars={
+        "mac_address": ".1.3.6.1.4.1.17713.20.2.1.3.13.0",
+        "imei": ".1.3.6.1.4.1.17713.20.2.1.4.11.0",
+        "imsi": ".1.3.6.1.4.1.17713.20.2.1.4.13.0",
+        "serial_number": ".1.3.6.1.4.1.17713.20.2.1.4.5.0",
+        "product_id": ".1.3.6.1.4.1.17713.20.2.1.4.3.0",
+        "rx_rate": ".1.3.6.1.4.1.17713.20.2.1.2.14.0",
+        "tx_rate": ".1.3.6.1.4.1.17713.20.2.1.2.11.0",
+        "tx_power": ".1.3.6.1.4.1.17713.20.2.1.2.25.0",
+        "pci": ".1.3.6.1.4.1.17713.20.2.1.2.18.0",
+        "eci": ".1.3.6.1.4.1.17713.20.2.1.2.48.0",
+        "cell_id": ".1.3.6.1.4.1.17713.20.2.1.2.17.0",
+        "full_cell_id": ".1.3.6.1.4.1.17713.20.2.1.2.36.0",
+        "enb_id": ".1.3.6.1.4.1.17713.20.2.1.2.30.0",
+    },
+    columns={
+        "rsrp": ".1.3.6.1.4.1.17713.20.2.1.2.6",
+        "rsrq": ".1.3.6.1.4.1.17713.20.2.1.2.8",
+        "sinr": ".1.3.6.1.4.1.17713.20.2.1.2.32",
+    },
+)
+
+TELRAD_12300 = OidTable(interface="eth0")
+
+BEC = OidTable(
+    scalars={
+        "signals": ".1.3.6.1.4.1.17453.4.1.4.0",
+        "eci": ".1.3.6.1.4.1.17453.4.1.6.0",
+        "imei": ".1.3.6.1.4.1.17453.4.1.8.0",
+        "imsi": ".1.3.6.1.4.1.17453.4.1.9.0",
+        "pci": ".1.3.6.1.4.1.17453.4.1.7.0",
+        "bandwidth": ".1.3.6.1.4.1.17453.4.1.11.0",
+        "rssi": ".1.3.6.1.4.1.17453.4.1.3.0",
+        "rx_mcs": ".1.3.6.1.4.1.17453.4.1.20.0",
+        "channel": ".1.3.6.1.4.1.17453.4.1.17.0",
+    },
+    interface="eth0",
+)
+
+
+_config = getattr(Application.config, "snmp", None)
+Session._concurrency = int(getattr(_config, "concurrency", Session._concurrency))
+Session._rate = float(getattr(_config, "rate", Session._rate))
+Session._deadline = float(getattr(_config, "deadline", Session._deadline))
+Session._devices = DeviceCache(float(getattr(_config, "ttl", 86400)))
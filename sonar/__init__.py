@@ -6,7 +6,25 @@
 # https://opensource.org/licenses/MIT.
 
 
-from .api_connection import Sonar, apiUrl
-from .ip_allocation import PullAllocator
+from importlib import import_module as _import_module
 
-__all__ = ["Sonar", "apiUrl", "PullAllocator"]
+# submodules load on first attribute access so importing the allocator does
+# not pull in gql/aiohttp or read the api config
+_exports = {
+    "Sonar": ".api_connection",
+    "apiUrl": ".api_connection",
+    "PullAllocator": ".ip_allocation",
+    "AllocationPlan": ".ip_allocation",
+    "FingerprintStore": ".fingerprints",
+}
+
+
+def __getattr__(name: str):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(_import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+__all__ = ["Sonar", "apiUrl", "PullAllocator", "AllocationPlan", "FingerprintStore"]
@@ -20,6 +20,8 @@ from gql.transport.requests import (
     log as _gql_log,
 )
 from gql.transport.aiohttp import AIOHTTPTransport as _AIOHTTPTransport
+from gql.transport.exceptions import TransportQueryError as _TransportQueryError
+from aiohttp import TCPConnector as _TCPConnector
 import gql
 import gql.transport.aiohttp
 import gql.client
@@ -28,10 +30,10 @@ from typing import (
     Callable as Callable,
     Iterable as _Iterable,
     Coroutine as _Coroutine,
+    AsyncIterator as _AsyncIterator,
     TypeVar as _TypeVar,
     Callable as _Callable,
 )
-from gql import gql as _gql
 from gql.client import (
     AsyncClientSession as _AsyncClientSession,
     Client as _Client,
@@ -39,11 +41,13 @@ from gql.client import (
 import re as _re
 from json import JSONDecoder as _JSONDecoder
 import logging as _logging
-from concurrent.futures import ProcessPoolExecutor as _PPE
 from asyncio import gather as _gather
+from weakref import WeakKeyDictionary as _WeakKeyDictionary
 import sonar.queries as _q
 from sonar.ip_allocation import Attachment as _Attachment
+from sonar.fingerprints import FingerprintStore as _FingerprintStore
 from model.network import IPv4Address as _IPv4Address
+from model.convert import Converter as _Converter
 
 _gql_log.setLevel(_logging.WARNING)
 
@@ -54,10 +58,94 @@ from functools import partial as _partial
 _T = _TypeVar("_T")
 
 
+class SonarSession:
+    _logger = _logging.getLogger(__name__)
+    _url: str
+    _key: str
+    _limit: int
+    _keepalive: float
+    _client: _Client | None
+    _session: _AsyncClientSession | None
+    _lock: asyncio.Lock
+
+    def __init__(self, url: str, key: str, limit: int = 10, keepalive: float = 60):
+        self._url = url
+        self._key = key
+        self._limit = limit
+        self._keepalive = keepalive
+        self._client = None
+        self._session = None
+        self._lock = asyncio.Lock()
+
+    async def connect(self) -> _AsyncClientSession:
+        async with self._lock:
+            if self._session is None:
+                self._logger.info(
+                    f"opening sonar connection pool ({self._limit} connections)"
+                )
+                transport = _AIOHTTPTransport(
+                    url=self._url,
+                    ssl_close_timeout=240,
+                    timeout=None,
+                    headers={
+                        "Authorization": f"Bearer {self._key}",
+                        "Accept": "application/json",
+                    },
+                    client_session_args={
+                        "connector": _TCPConnector(
+                            limit=self._limit, keepalive_timeout=self._keepalive
+                        ),
+                    },
+                )
+                _gql_log.setLevel(_logging.WARNING)
+                self._client = _Client(transport=transport, execute_timeout=240)
+                self._session = await self._client.connect_async()
+            return self._session
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._client is not None:
+                try:
+                    await self._client.close_async()
+                except:
+                    self._logger.exception("failed closing sonar connection pool")
+                self._logger.info("closed sonar connection pool")
+            self._client = None
+            self._session = None
+
+
 class Sonar:
     _apiUrl: str
     _logger = _logging.getLogger(__name__)
     _sonar_api_key: str
+    _connection_limit: int = 10
+    _keepalive: float = 60
+    _page_concurrency: int = 4
+    _page_retries: int = 3
+    _batch_size: int = 25
+    page_info: dict[str, dict[str, _Any]] = {}
+    # aiohttp connectors are bound to the loop they were opened on, so every
+    # event loop gets its own pool and reuses it until it is closed
+    _pools: "_WeakKeyDictionary[asyncio.AbstractEventLoop, SonarSession]" = (
+        _WeakKeyDictionary()
+    )
+
+    @classmethod
+    def pool(cls) -> SonarSession:
+        loop = asyncio.get_running_loop()
+        pool = cls._pools.get(loop)
+        if pool is None:
+            pool = SonarSession(
+                cls._apiUrl, cls._sonar_api_key, cls._connection_limit, cls._keepalive
+            )
+            cls._pools[loop] = pool
+        return pool
+
+    @classmethod
+    async def close(cls) -> None:
+        pool = cls._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.close()
 
     @classmethod
     async def execute(
@@ -66,22 +154,14 @@ class Sonar:
         *args,
         **kwargs,
     ) -> _T:
-        transport = _AIOHTTPTransport(
-            url=cls._apiUrl,
-            ssl_close_timeout=240,
-            timeout=None,
-            headers={
-                "Authorization": f"Bearer {cls._sonar_api_key}",
-                "Accept": "application/json",
-            },
-        )
-        _gql_log.setLevel(_logging.WARNING)
-        async with _Client(transport=transport, execute_timeout=240) as client:
-            return await func(client, *args, **kwargs)
+        client = await cls.pool().connect()
+        return await func(client, *args, **kwargs)
 
     @classmethod
-    async def create_missing(cls, items: _Iterable[_Item]) -> _Iterable[_Item]:
-        create_items: _Iterable[Task[_Item]] = list()
+    async def create_missing(
+        cls, items: _Iterable[_Item], batch_size: int | None = None
+    ) -> _Iterable[_Item]:
+        jobs = list()
         for item in items:
             if not item.sonar_id or item.sonar_id is None:
                 if (
@@ -89,66 +169,70 @@ class Sonar:
                     and item.imei is not None
                     and item.imsi is not None
                 ):
-                    try:
-                        create_items.append(
-                            asyncio.create_task(cls.execute(cls.create_item, item))
-                        )
-                    except:
-                        cls._logger.exception(f"failed creating {item}")
+                    vs = cls._create_item_vars(item)
+                    if vs is not None:
+                        jobs.append((item, vs))
         try:
-            return await _gather(*create_items)
+            done = await cls._mutate_in_batches(_q.create_item, jobs, batch_size)
         except:
             cls._logger.exception(f"failed creating items", stack_info=True)
             return list()
+        for item, ret in done:
+            if ret:
+                item.sonar_id = ret[0]["id"]
+                cls._logger.info(f"created item: {ret}")
+        return [item for item, _ in done]
 
     @classmethod
     async def add_raemis_name_to_items(
-        cls, items: _Iterable[_Item]
+        cls, items: _Iterable[_Item], batch_size: int | None = None
     ) -> _Iterable[_Item]:
-        updated = list()
+        jobs = list()
         for item in items:
-            if (
-                not item.sonar_id
-                or item.model in [_Model.UNKNOWN, _Model.WAC104]
-                or item.account is None
-                or not item.account.name
-                or item.account.sonar_id is not None
-            ):
-                continue
-            try:
-                updated.append(
-                    asyncio.create_task(cls.execute(cls.add_raemis_name_to_notes, item))
-                )
-            except:
-                cls._logger.exception(f"failed adding info to notes field for {item}")
+            vs = cls._raemis_note_vars(item)
+            if vs is not None:
+                jobs.append((item, vs))
         try:
-            return await _gather(*updated)
+            done = await cls._mutate_in_batches(
+                _q.update_inventory_item, jobs, batch_size
+            )
         except:
             cls._logger.exception(f"failed updating notes for items")
             return list()
+        return [item for item, _ in done]
 
     @classmethod
-    async def update_needed(cls, items: _Iterable[_Item]) -> _Iterable[_Item]:
-        updated = list()
+    async def update_needed(
+        cls,
+        items: _Iterable[_Item],
+        batch_size: int | None = None,
+        fingerprints: _FingerprintStore | None = None,
+    ) -> _Iterable[_Item]:
+        jobs = list()
+        skipped = 0
         for item in items:
-            if (
-                item.model == _Model.UNKNOWN
-                or item.model == _Model.WAC104
-                or item.sonar_id is None
-                or not item.sonar_id
+            vs = cls._update_item_fields_vars(item)
+            if vs is None:
+                continue
+            if fingerprints is not None and not fingerprints.changed(
+                item.sonar_id, vs["input"]["fields"]
             ):
+                skipped += 1
                 continue
-            try:
-                updated.append(
-                    asyncio.create_task(cls.execute(cls.update_item_fields, item))
-                )
-            except:
-                cls._logger.exception(f"failed updaiting {item}")
+            jobs.append((item, vs))
+        cls._logger.info(
+            f"updating fields for {len(jobs)} items, {skipped} unchanged since last push"
+        )
         try:
-            return await _gather(*updated)
+            done = await cls._mutate_in_batches(_q.update_item_field, jobs, batch_size)
         except:
             cls._logger.exception(f"failed updating items", stack_info=True)
             return list()
+        if fingerprints is not None:
+            for (item, ret), (_, vs) in zip(done, jobs):
+                if ret is not None:
+                    fingerprints.record(item.sonar_id, vs["input"]["fields"])
+        return [item for item, _ in done]
 
     @classmethod
     async def match_names_and_link(cls, items: _Iterable[_Item]):
@@ -199,48 +283,52 @@ class Sonar:
             cls._logger.exception("failed matching badly")
 
     @classmethod
-    async def link_to_accounts(cls, items: _Iterable[_Item]) -> _Iterable[_Item]:
-        linked = list()
+    async def link_to_accounts(
+        cls, items: _Iterable[_Item], batch_size: int | None = None
+    ) -> _Iterable[_Item]:
+        jobs = list()
         for item in items:
-            if (
-                item.sonar_id
-                and item.account
-                and item.account.sonar_id
-                and item.account.address
-                and item.account.address.sonar_id
-                and not item.linked_to_account
-            ):
-                linked.append(
-                    asyncio.create_task(cls.execute(cls.assign_inventory_item, item))
-                )
-        return await _gather(*linked)
+            if item.linked_to_account:
+                continue
+            vs = cls._assign_inventory_vars(item)
+            if vs is not None:
+                jobs.append((item, vs))
+        done = await cls._mutate_in_batches(_q.assign_inventory, jobs, batch_size)
+        return [item for item, _ in done]
 
     @classmethod
-    async def get_ip_address_assignments(cls) -> _Iterable[_Attachment]:
+    async def get_ip_address_assignments(
+        cls, items_per_page: int = 100
+    ) -> _Iterable[_Attachment]:
         attachments = list()
+        # a partial list would have the allocator hand out addresses that
+        # are taken, so anything short of the whole list is an error
         try:
             infos = await asyncio.create_task(
-                cls.execute(cls._execute_paged_query, _q.current_ip_address_assignments)
+                cls.execute(
+                    cls._execute_paged_query,
+                    _q.current_ip_address_assignments,
+                    items_per_page,
+                )
             )
             for info in infos:
-                try:
-                    if (
-                        "ipassignmentable_id" in info
-                        and "subnet" in info
-                        and "id" in info
-                    ):
-                        ret = _Attachment(info["ipassignmentable_id"])
-                        ret.set_address(_IPv4Address(address=info["subnet"]))
-                        ret.sonar_id = info["id"]
-                        attachments.append(ret)
-                        cls._logger.info(
-                            f"got assignment (id {ret.sonar_id}) at {ret.address} for {ret.sonar_item_id}"
-                        )
-                except:
-                    cls._logger.exception(f"failed to create attachemt for {info}")
+                if not (
+                    "ipassignmentable_id" in info and "subnet" in info and "id" in info
+                ):
                     continue
+                if ":" in str(info["subnet"]):
+                    # ipv6 assignments are not ours to manage
+                    continue
+                ret = _Attachment(info["ipassignmentable_id"])
+                ret.set_address(_IPv4Address.parse(info["subnet"]))
+                ret.sonar_id = info["id"]
+                attachments.append(ret)
+                cls._logger.info(
+                    f"got assignment (id {ret.sonar_id}) at {ret.address} for {ret.sonar_item_id}"
+                )
         except:
             cls._logger.exception(f"failed to get ip address attachments")
+            raise
         return attachments
 
     @classmethod
@@ -261,7 +349,7 @@ class Sonar:
             )
             back = ret["updateIpAssignment"]
             attach.sonar_id = back["id"]
-            attach.set_address(_IPv4Address(address=back["subnet"]))
+            attach.set_address(_IPv4Address.parse(back["subnet"]))
             cls._logger.info(
                 f"updated ip assignment (id: {attach.sonar_id}) for item {attach.sonar_item_id} to address {attach.address}."
             )
@@ -270,6 +358,9 @@ class Sonar:
                 f"failed to update {attach}",
                 stacklevel=_logging.CRITICAL,
             )
+            # the allocator has to know, or it plans against a change that
+            # never happened
+            raise
         return attach
 
     @classmethod
@@ -287,6 +378,7 @@ class Sonar:
                 f"failed to delete {attach}",
                 stacklevel=_logging.CRITICAL,
             )
+            raise
         return attach
 
     @classmethod
@@ -306,7 +398,7 @@ class Sonar:
             )
             back = ret["createIpAssignment"]
             attach.sonar_id = back["id"]
-            attach.set_address(_IPv4Address(address=back["subnet"]))
+            attach.set_address(_IPv4Address.parse(back["subnet"]))
             cls._logger.info(
                 f"(id: {attach.sonar_id}) created ip assignment to address {attach.address} for item {attach.sonar_item_id}."
             )
@@ -315,16 +407,21 @@ class Sonar:
                 f"failed to create {attach}",
                 stacklevel=_logging.CRITICAL,
             )
+            raise
         return attach
 
     @classmethod
     async def get_inventory_items(
         cls,
         client: _AsyncClientSession,
+        items_per_page: int = 100,
     ) -> _Iterable[_Item]:
         cls._logger.info("getting inventory")
         try:
-            ret = await cls._execute_paged_query(client, _q.get_inventory_items)
+            pages = cls._iterate_paged_query(
+                client, _q.get_inventory_items, items_per_page
+            )
+            return await _Converter.convert_pages(_Item.from_sonar, pages)
         except:
             cls._logger.exception(
                 "recieved no data from sonar when attempting to get all inventory items",
@@ -332,34 +429,36 @@ class Sonar:
                 stacklevel=_logging.CRITICAL,
             )
             return list([])
-        return list(_exec.map(_Item.from_sonar, ret, chunksize=50))
 
     @classmethod
     async def get_accounts(
         cls,
         client: _AsyncClientSession,
+        items_per_page: int = 100,
     ) -> _Iterable[_Account]:
         cls._logger.info("getting account user names and id")
         try:
-            ret = await cls._execute_paged_query(client, _q.get_accounts)
+            pages = cls._iterate_paged_query(client, _q.get_accounts, items_per_page)
+            return await _Converter.convert_pages(_Account.from_sonar, pages)
         except:
             cls._logger.exception(
                 "recieved no data from sonar when attempting to get all accounts and addresses",
                 stacklevel=_logging.CRITICAL,
             )
             return list([])
-        return list(_exec.map(_Account.from_sonar, ret, chunksize=50))
 
     @classmethod
     async def get_all_clients_and_assigned_inventory(
         cls,
         client: _AsyncClientSession,
+        items_per_page: int = 100,
     ) -> _Iterable[_Item]:
         cls._logger.info("getting account, addresses and inventory")
         try:
-            d = await cls._execute_paged_query(
-                client, _q.get_accounts_and_assigned_inventory
+            pages = cls._iterate_paged_query(
+                client, _q.get_accounts_and_assigned_inventory, items_per_page
             )
+            return await _Converter.convert_pages(_from_sonar, pages)
         except:
             cls._logger.exception(
                 f"getting sonar accounts with assigned inventory failed",
@@ -367,7 +466,6 @@ class Sonar:
                 stacklevel=_logging.CRITICAL,
             )
             return list([])
-        return list(_exec.map(_from_sonar, d, chunksize=50))
 
     @classmethod
     async def update_billing_parameters(
@@ -384,10 +482,9 @@ class Sonar:
             cls._logger.exception(f"Failed to update account {account_id}")
 
     @classmethod
-    async def assign_inventory_item(
-        cls, client: _AsyncClientSession, item: _Item, loc_type: str = "Address"
-    ) -> _Item:
-
+    def _assign_inventory_vars(
+        cls, item: _Item, loc_type: str = "Address"
+    ) -> dict[str, _Any] | None:
         if (
             not item
             or not item.sonar_id
@@ -396,18 +493,26 @@ class Sonar:
             or not item.account.address
             or not item.account.address.sonar_id
         ):
-            cls._logger.critical(
-                "account, address or inventory item is null or does not have a linked sonar id",
-                stack_info=True,
-            )
-            raise ValueError
-        vs = {
+            return None
+        return {
             "input": {
                 "inventoryitemable_type": loc_type,
                 "inventoryitemable_id": item.account.address.sonar_id,
             },
             "id": item.sonar_id,
         }
+
+    @classmethod
+    async def assign_inventory_item(
+        cls, client: _AsyncClientSession, item: _Item, loc_type: str = "Address"
+    ) -> _Item:
+        vs = cls._assign_inventory_vars(item, loc_type)
+        if vs is None:
+            cls._logger.critical(
+                "account, address or inventory item is null or does not have a linked sonar id",
+                stack_info=True,
+            )
+            raise ValueError
         cls._logger.info(f"assigning inventory item {item} to {item.account}")
         try:
             ret = await cls._execute_update(client, _q.assign_inventory, vs)
@@ -419,27 +524,34 @@ class Sonar:
             )
         return item
 
+    @classmethod
+    def _item_fields(cls, item: _Item) -> list[dict[str, _Any]]:
+        return [
+            {
+                "inventory_model_field_id": _q.inventory_field_ids[item.model][field],
+                "value": str(getattr(item, field)),
+            }
+            for field in _q.inventory_field_ids[item.model]
+            if getattr(item, field) is not None and getattr(item, field)
+        ]
+
+    @classmethod
+    def _update_item_fields_vars(cls, item: _Item) -> dict[str, _Any] | None:
+        if (
+            item.model in [_Model.UNKNOWN, _Model.WAC104]
+            or item.sonar_id is None
+            or not item.sonar_id
+        ):
+            return None
+        return {"id": item.sonar_id, "input": {"fields": cls._item_fields(item)}}
+
     @classmethod
     async def update_item_fields(
         cls, client: _AsyncClientSession, item: _Item
     ) -> _Item:
-        if item.model in [_Model.UNKNOWN, _Model.WAC104] or item.sonar_id is None:
+        data = cls._update_item_fields_vars(item)
+        if data is None:
             return item
-        data: dict[str, _Any] = {
-            "id": item.sonar_id,
-            "input": {
-                "fields": [
-                    {
-                        "inventory_model_field_id": _q.inventory_field_ids[item.model][
-                            field
-                        ],
-                        "value": str(getattr(item, field)),
-                    }
-                    for field in _q.inventory_field_ids[item.model]
-                    if getattr(item, field) is not None and getattr(item, field)
-                ]
-            },
-        }
         try:
             data = await cls._execute_update(client, _q.update_item_field, data)
             cls._logger.info(f"updated item: {data}")
@@ -451,22 +563,27 @@ class Sonar:
         return item
 
     @classmethod
-    async def add_raemis_name_to_notes(cls, client: _AsyncClientSession, item: _Item):
+    def _raemis_note_vars(cls, item: _Item) -> dict[str, _Any] | None:
         if (
-            item.model in [_Model.UNKNOWN, _Model.WAC104]
-            or item.sonar_id is None
+            not item.sonar_id
+            or item.model in [_Model.UNKNOWN, _Model.WAC104]
             or item.account is None
             or not item.account.name
             or item.account.sonar_id is not None
-            or item.account.sonar_id
         ):
-            return item
-        data = {
+            return None
+        return {
             "id": item.sonar_id,
             "input": {
                 "note": {"message": str(item.account.name), "priority": "NORMAL"}
             },
         }
+
+    @classmethod
+    async def add_raemis_name_to_notes(cls, client: _AsyncClientSession, item: _Item):
+        data = cls._raemis_note_vars(item)
+        if data is None:
+            return item
         try:
             ret = await cls._execute_update(client, _q.update_inventory_item, data)
             cls._logger.info(f"added raemis info to item: {ret}")
@@ -477,54 +594,122 @@ class Sonar:
         return item
 
     @classmethod
-    async def create_item(cls, client: _AsyncClientSession, item: _Item) -> _Item:
+    def _create_item_vars(cls, item: _Item) -> dict[str, _Any] | None:
         if (
-            item.model != _Model.UNKNOWN
-            and item.model != _Model.WAC104
-            and not item.sonar_id
-            and item.mac_address
-            and item.imei is not None
+            item.model == _Model.UNKNOWN
+            or item.model == _Model.WAC104
+            or item.sonar_id
+            or not item.mac_address
+            or item.imei is None
         ):
-            data = {
-                "input": {
-                    "inventory_model_id": _Model.item_to_sonar_id(item),
-                    "inventoryitemable_type": "InventoryLocation",
-                    "inventoryitemable_id": 2,
-                    "items": [
-                        {
-                            "individual_inventory_item_fields": [
-                                {
-                                    "inventory_model_field_id": _q.inventory_field_ids[
-                                        item.model
-                                    ][field],
-                                    "value": str(getattr(item, field)),
-                                }
-                                for field in _q.inventory_field_ids[item.model]
-                                if getattr(item, field) is not None
-                                and getattr(item, field)
-                            ],
-                        },
-                    ],
-                }
+            return None
+        return {
+            "input": {
+                "inventory_model_id": _Model.item_to_sonar_id(item),
+                "inventoryitemable_type": "InventoryLocation",
+                "inventoryitemable_id": 2,
+                "items": [
+                    {"individual_inventory_item_fields": cls._item_fields(item)},
+                ],
             }
-            try:
-                ids = await cls._execute_update(client, _q.create_item, data)
-                item.sonar_id = ids["createInventoryItems"][0]["id"]
-                cls._logger.info(f"created item: {ids}")
-            except:
-                cls._logger.exception(
-                    f"error creating item: {item.sonar_id} -- IP/mac: {item.ipv4 if item.ipv4 else item.mac_address}/{item.mac_address} item: {item}",
-                    stacklevel=_logging.CRITICAL,
-                )
+        }
+
+    @classmethod
+    async def create_item(cls, client: _AsyncClientSession, item: _Item) -> _Item:
+        data = cls._create_item_vars(item)
+        if data is None:
+            return item
+        try:
+            ids = await cls._execute_update(client, _q.create_item, data)
+            item.sonar_id = ids["createInventoryItems"][0]["id"]
+            cls._logger.info(f"created item: {ids}")
+        except:
+            cls._logger.exception(
+                f"error creating item: {item.sonar_id} -- IP/mac: {item.ipv4 if item.ipv4 else item.mac_address}/{item.mac_address} item: {item}",
+                stacklevel=_logging.CRITICAL,
+            )
         return item
 
+    @classmethod
+    async def _mutate_in_batches(
+        cls,
+        query: str,
+        jobs: list[tuple[_Item, dict[str, _Any]]],
+        batch_size: int | None = None,
+    ) -> list[tuple[_Item, _Any]]:
+        size = max(1, batch_size or cls._batch_size)
+        chunks = [jobs[i : i + size] for i in range(0, len(jobs), size)]
+        results = await _gather(
+            *(
+                cls.execute(cls._execute_batch, query, [vs for _, vs in chunk])
+                for chunk in chunks
+            ),
+            return_exceptions=True,
+        )
+        done: list[tuple[_Item, _Any]] = list()
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                cls._logger.error(
+                    f"batch of {len(chunk)} {_q.compile_query(query).name} mutations failed",
+                    exc_info=result,
+                )
+                done.extend((item, None) for item, _ in chunk)
+                continue
+            for (item, vs), ret in zip(chunk, result):
+                if isinstance(ret, BaseException):
+                    cls._logger.error(
+                        f"error running {_q.compile_query(query).name} for {item} with values {vs}: {ret}"
+                    )
+                    done.append((item, None))
+                else:
+                    cls._logger.debug(f"ran update for {item}: {ret}")
+                    done.append((item, ret))
+        return done
+
+    @classmethod
+    async def _execute_batch(
+        cls, client: _AsyncClientSession, query: str, vs: list[dict[str, _Any]]
+    ) -> list[_Any]:
+        compiled = _q.compile_batch(query, len(vs))
+        errors: dict[str | None, list[_Any]] = {}
+        try:
+            data = await client.execute(
+                compiled.document, variable_values=_q.batch_variables(vs)
+            )
+        except _TransportQueryError as e:
+            # errors carry the alias of the mutation that raised them in their path
+            data = e.data or {}
+            for error in e.errors or []:
+                path = error.get("path") if isinstance(error, dict) else None
+                errors.setdefault(path[0] if path else None, []).append(error)
+            if not data:
+                cls._logger.error(f"batch {compiled.name} failed: {e.errors}")
+                raise ConnectionError
+        except:
+            cls._logger.exception(f"error running batch {compiled.name}")
+            raise ConnectionError
+        if data is None or not isinstance(data, dict):
+            cls._logger.error(
+                f"incorrect or no data returned from sonar for {compiled.name}"
+            )
+            raise ConnectionError
+        ret: list[_Any] = list()
+        for i in range(len(vs)):
+            alias = _q.batch_alias(i)
+            if alias in errors or alias not in data:
+                ret.append(ConnectionError(errors.get(alias, errors.get(None))))
+            else:
+                ret.append(data[alias])
+        return ret
+
     @classmethod
     async def _execute_update(
         cls, client: _AsyncClientSession, query: str, vs: dict[str, _Any]
     ) -> dict[str, _Any]:
-        name = query.split(" ")[1].split("(")[0]
+        compiled = _q.compile_query(query)
+        name = compiled.name
         try:
-            data = await client.execute(_gql(query), variable_values=vs)
+            data = await client.execute(compiled.document, variable_values=vs)
             cls._logger.debug(f"ran update for {name} with values {vs}")
         except:
             cls._logger.exception(
@@ -536,70 +721,91 @@ class Sonar:
             raise ConnectionError
         return data
 
+    @classmethod
+    async def _fetch_page(
+        cls,
+        client: _AsyncClientSession,
+        document: _Any,
+        paged: str,
+        page: int,
+        items_per_page: int,
+    ) -> dict[str, _Any]:
+        vs = {"page": {"page": page, "records_per_page": items_per_page}}
+        for attempt in range(1, cls._page_retries + 1):
+            try:
+                cls._logger.debug(f"getting page {page} of {paged}")
+                data = await client.execute(document, variable_values=vs)
+                if not isinstance(data, dict):
+                    cls._logger.error(
+                        f"got the wrong type for a result, wanted ExecutionResult got {type(data)}"
+                    )
+                    raise ConnectionError
+                return data[paged]
+            except (InterruptedError, asyncio.CancelledError):
+                raise
+            except:
+                cls._logger.exception(
+                    f"Failed while fetching page {page} of {paged} (attempt {attempt} of {cls._page_retries})"
+                )
+                if attempt < cls._page_retries:
+                    await asyncio.sleep(2 ** (attempt - 1))
+        raise ConnectionError(f"could not fetch page {page} of {paged}")
+
+    @classmethod
+    async def _iterate_paged_query(
+        cls,
+        client: _AsyncClientSession,
+        query: str,
+        items_per_page: int = 100,
+        concurrency: int | None = None,
+    ) -> _AsyncIterator[list[dict[str, _Any]]]:
+        compiled = _q.compile_query(query)
+        paged = compiled.root
+        document = compiled.document
+        first = await cls._fetch_page(client, document, paged, 1, items_per_page)
+        numPages = first["page_info"]["total_pages"]
+        cls.page_info[paged] = dict(first["page_info"], records_per_page=items_per_page)
+        yield first["entities"]
+        if numPages <= 1:
+            return
+        limit = asyncio.Semaphore(concurrency or cls._page_concurrency)
+
+        async def bounded(page: int) -> dict[str, _Any]:
+            async with limit:
+                return await cls._fetch_page(
+                    client, document, paged, page, items_per_page
+                )
+
+        # pages are fetched concurrently but handed out in order
+        tasks = [asyncio.create_task(bounded(x)) for x in range(2, numPages + 1)]
+        try:
+            for task in tasks:
+                data = await task
+                if numPages != data["page_info"]["total_pages"]:
+                    cls._logger.error(
+                        f"Different number of pages between requests for {paged}"
+                    )
+                yield data["entities"]
+        finally:
+            for task in tasks:
+                task.cancel()
+
     @classmethod
     async def _execute_paged_query(
         cls, client: _AsyncClientSession, query: str, items_per_page: int = 100
     ) -> _Iterable[dict[str, _Any]]:
-        page = {"page": {"page": 1, "records_per_page": items_per_page}}
-        top = _re.search(_re.compile(r"""([a-zA-Z_]+)\(paginator..page."""), query)
-        if top is None:
-            cls._logger.error("couldnt find the name of the paged item")
-            raise ValueError
-        top = top.groups()
-        if top is None or len(top) == 0:
-            cls._logger.error("there were no groups for the paged item")
-            raise ValueError
-        paged = top[0]
-        try:
-            cls._logger.debug(f"getting page 1 of {paged}")
-            data = await client.execute(_gql(query), variable_values=page)
-            if not isinstance(data, dict):
-                cls._logger.error(
-                    f"got the wrong type for a result, wanted ExecutionResult got {type(data)}"
-                )
-                raise ConnectionError
-            pageInfo = data[paged]["page_info"]
-            numPages = pageInfo["total_pages"]
-            currPage = pageInfo["page"]
-            invItems = data[paged]["entities"]
-            while currPage < numPages:
-                page["page"]["page"] += 1
-                try:
-                    try:
-                        cls._logger.info(f"getting page {page} of {paged}")
-                        data = await client.execute(_gql(query), variable_values=page)
-                        if not isinstance(data, dict):
-                            cls._logger.error(
-                                f"got the wrong type for a result, wanted ExecutionResult got {type(data)}"
-                            )
-                            continue
-                    except:
-                        cls._logger.exception(
-                            f'Failed while fetching paged data of page {page["page"]["[page]"]}',
-                            stack_info=True,
-                        )
-                        continue
-                    pageInfo = data[paged]["page_info"]
-                    if numPages != pageInfo["total_pages"]:
-                        cls._logger.error("Different number of pages between requests")
-                        raise ValueError
-                    currPage = pageInfo["page"]
-                    invItems.extend(data[paged]["entities"])
-                except:
-                    cls._logger.exception(
-                        f"adding page {currPage} to aggregate result failed for {paged}",
-                        stack_info=True,
-                    )
-                    continue
-        except InterruptedError as ie:
-            raise ie
-        except Exception as e:
-            raise e
+        invItems = list()
+        async for page in cls._iterate_paged_query(client, query, items_per_page):
+            invItems.extend(page)
         return invItems
 
-
 apiUrl: str = Application.config.sonar.url
 Sonar._apiUrl = apiUrl
 Sonar._sonar_api_key = Application.config.sonar.key
+Sonar._connection_limit = int(getattr(Application.config.sonar, "connections", 10))
+Sonar._keepalive = float(getattr(Application.config.sonar, "keepalive", 60))
+Sonar._batch_size = int(getattr(Application.config.sonar, "batch", 25))
 
-_exec = _PPE()
+_convert = getattr(Application.config, "convert", None)
+_Converter.processes = int(getattr(_convert, "processes", 0))
+_Converter.threshold = int(getattr(_convert, "threshold", 5000))
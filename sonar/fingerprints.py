@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Copyright 2021 Brenden Smith
+#
+# Use of this source code is governed by an MIT-style
+# license that can be found in the LICENSE file or at
+# https://opensource.org/licenses/MIT.
+
+import json as _json
+import logging as _logging
+import os as _os
+from hashlib import blake2b as _blake2b
+from threading import Lock as _Lock
+from typing import Any as _Any
+
+
+class FingerprintStore:
+    _logger = _logging.getLogger(__name__)
+    _path: str
+    _prints: dict[str, str]
+    _dirty: bool
+    _lock: _Lock
+
+    def __init__(self, path: str):
+        self._path = path
+        self._prints = {}
+        self._dirty = False
+        self._lock = _Lock()
+        self.load()
+
+    @classmethod
+    def fingerprint(cls, fields: _Any) -> str:
+        data = _json.dumps(fields, sort_keys=True, separators=(",", ":"), default=str)
+        return _blake2b(data.encode(), digest_size=16).hexdigest()
+
+    def changed(self, sonar_id: str, fields: _Any) -> bool:
+        return self._prints.get(str(sonar_id)) != self.fingerprint(fields)
+
+    def record(self, sonar_id: str, fields: _Any) -> None:
+        with self._lock:
+            self._prints[str(sonar_id)] = self.fingerprint(fields)
+            self._dirty = True
+
+    def forget(self, sonar_id: str) -> None:
+        with self._lock:
+            if self._prints.pop(str(sonar_id), None) is not None:
+                self._dirty = True
+
+    def load(self) -> None:
+        try:
+            with open(self._path, "r") as f:
+                data = _json.load(f)
+        except FileNotFoundError:
+            self._logger.info(f"no fingerprint store at {self._path}, starting empty")
+            return
+        except:
+            self._logger.exception(
+                f"could not read fingerprint store {self._path}, starting empty"
+            )
+            return
+        if not isinstance(data, dict):
+            self._logger.error(f"fingerprint store {self._path} is not a mapping")
+            return
+        with self._lock:
+            self._prints = {str(k): str(v) for k, v in data.items()}
+            self._dirty = False
+        self._logger.info(f"loaded {len(self._prints)} item fingerprints")
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp = f"{self._path}.tmp"
+            try:
+                with open(tmp, "w") as f:
+                    _json.dump(self._prints, f, separators=(",", ":"))
+                    f.flush()
+                    _os.fsync(f.fileno())
+                _os.replace(tmp, self._path)
+                self._dirty = False
+            except:
+                self._logger.exception(
+                    f"could not write fingerprint store {self._path}"
+                )
+
+    def __len__(self) -> int:
+        return len(self._prints)
+
+    def __contains__(self, sonar_id: object) -> bool:
+        return str(sonar_id) in self._prints
@@ -7,19 +7,29 @@
 
 
 import logging as _logging
-from asyncio import run as _run
-from threading import Event as _Event
+from asyncio import (
+    AbstractEventLoop as _AbstractEventLoop,
+    new_event_loop as _new_event_loop,
+    gather as _gather,
+    Semaphore as _Semaphore,
+)
+from dataclasses import dataclass as _dc, field as _field
+from threading import Event as _Event, Lock as _Lock
 from typing import (
     Callable as _Callable,
     Any as _Any,
     Coroutine as _Coroutine,
     Iterable as _Iterable,
+    TypeVar as _TypeVar,
 )
 from typing_extensions import Self as _Self
 from model.atoms import Item as _Item
-from model.network import IPv4Address as _IPv4Address
+from model.network import IMSI as _IMSI, IPv4Address as _IPv4Address
+from model.journal import Journal as _Journal
+from model.sessions import SessionSnapshot as _SessionSnapshot
 import time as _time
 
+_T = _TypeVar("_T")
 
 class Attachment:
     sonar_id: str | None
@@ -33,7 +43,7 @@ class Attachment:
         self.sonar_id = None
 
     def set_address(self, ipv4: _IPv4Address):
-        self.address = _IPv4Address(address=repr(ipv4), cidr_mask=ipv4._cidr_mask)
+        self.address = ipv4
 
     def __str__(self) -> str:
         return f'(id: {self.sonar_id if self.sonar_id else "NOT IN SONAR YET"}) Item id: {self.sonar_item_id} IP: {self.address} Attached at {_time.strftime("%m/%d/%y %H:%M:%S",_time.localtime(self.timestamp))}'
@@ -56,9 +66,7 @@ class Attachment:
     def item_to_attachment(cls, item: _Item) -> _Self:
         attach = cls.__new__(cls)
         if item.ipv4:
-            attach.address = _IPv4Address(
-                octets=item.ipv4.address, netmask=item.ipv4.netmask
-            )
+            attach.address = item.ipv4
         if item.sonar_id:
             attach.sonar_item_id = item.sonar_id
         attach.sonar_id = None
@@ -66,6 +74,42 @@ class Attachment:
         return attach
 
 
+@_dc
+class AllocationPlan:
+    creates: list[Attachment] = _field(default_factory=list)
+    updates: list[tuple[Attachment, Attachment]] = _field(default_factory=list)
+    deletes: list[Attachment] = _field(default_factory=list)
+    unmatched: list[_Item] = _field(default_factory=list)
+    unchanged: int = 0
+    can_delete: bool = True
+    failed: int = 0
+    # attachments whose create, update or delete did not go through
+    rejected: list[Attachment] = _field(default_factory=list)
+
+    def __len__(self) -> int:
+        return (
+            len(self.creates)
+            + len(self.updates)
+            + (len(self.deletes) if self.can_delete else 0)
+        )
+
+    @property
+    def summary(self) -> str:
+        return (
+            f"{len(self.creates)} create(s), {len(self.updates)} update(s), "
+            f'{len(self.deletes)} delete(s){"" if self.can_delete else " (held back)"}, '
+            f"{self.unchanged} unchanged, {len(self.unmatched)} unmatched session(s)"
+        )
+
+    def __str__(self) -> str:
+        lines = [self.summary]
+        lines.extend(f"  create {x}" for x in self.creates)
+        lines.extend(f"  update {old} -> {new}" for old, new in self.updates)
+        lines.extend(f"  delete {x}" for x in self.deletes)
+        lines.extend(f"  unmatched {x.imsi} at {x.ipv4}" for x in self.unmatched)
+        return "\n".join(lines)
+
+
 class PullAllocator:
     _event: _Event
     _create: _Callable[[Attachment], _Coroutine[_Any, _Any, Attachment]]
@@ -76,6 +120,15 @@ class PullAllocator:
     _logger = _logging.getLogger(__name__)
     _inventory: list[_Item]
     _delay: float
+    _concurrency: int
+    _finalize: _Callable[[], _Coroutine[_Any, _Any, None]] | None
+    _shutdown: _Callable[[], _Coroutine[_Any, _Any, None]] | None
+    _loop: _AbstractEventLoop | None
+    _full_interval: float
+    _next_full: float
+    _sessions: _SessionSnapshot
+    _unmatched: set[str]
+    _held: list[str]
 
     def __init__(
         self,
@@ -87,6 +140,10 @@ class PullAllocator:
         event: _Event,
         base_list: list[_Item],
         delay: float,
+        concurrency: int = 10,
+        finalize: _Callable[[], _Coroutine[_Any, _Any, None]] | None = None,
+        shutdown: _Callable[[], _Coroutine[_Any, _Any, None]] | None = None,
+        full_interval: float = 15 * 60,
     ):
         self._delay = delay
         self._get_addresses = get_addresses
@@ -96,142 +153,580 @@ class PullAllocator:
         self._delete = delete
         self._inventory = base_list
         self._event = event
+        self._concurrency = concurrency
+        self._finalize = finalize
+        self._shutdown = shutdown
+        self._loop = None
+        self._full_interval = full_interval
+        self._next_full = 0.0
+        self._sessions = _SessionSnapshot()
+        self._unmatched = set()
+        self._held = []
+
+    # one event loop for the life of the poller, so pooled clients opened on
+    # it are reused from pass to pass; `finalize` runs after every pass and
+    # `shutdown` once when the poller stops
+    def _run(self, coro: _Coroutine[_Any, _Any, _T]) -> _T:
+        if self._loop is None:
+            self._loop = _new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    def _stop(self) -> None:
+        if self._loop is None:
+            return
+        try:
+            if self._shutdown is not None:
+                self._loop.run_until_complete(self._shutdown())
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+        except:
+            self._logger.exception("failed shutting down the allocator")
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    def _index_inventory(self) -> dict[str, _Item]:
+        index: dict[str, _Item] = {}
+        # a single slice is one round trip through a SyncManager list proxy
+        for item in self._inventory[:]:
+            if item.imsi:
+                index.setdefault(str(item.imsi), item)
+        return index
+
+    @classmethod
+    def _index_attachments(
+        cls, attachments: _Iterable[Attachment]
+    ) -> tuple[dict[str, list[Attachment]], dict[_IPv4Address, list[Attachment]]]:
+        by_item: dict[str, list[Attachment]] = {}
+        by_address: dict[_IPv4Address, list[Attachment]] = {}
+        for attachment in attachments:
+            by_item.setdefault(attachment.sonar_item_id, []).append(attachment)
+            if getattr(attachment, "address", None) is not None:
+                by_address.setdefault(attachment.address, []).append(attachment)
+        return by_item, by_address
+
+    def plan(
+        self,
+        attachments: _Iterable[Attachment],
+        addresses: _Iterable[_Item],
+        items_by_imsi: dict[str, _Item] | None = None,
+    ) -> AllocationPlan:
+        attachments = list(attachments)
+        if items_by_imsi is None:
+            items_by_imsi = self._index_inventory()
+        by_item, by_address = self._index_attachments(attachments)
+        taken: set[int] = set()
+        ret = AllocationPlan()
+
+        def lookup(index: dict, key: _Any) -> Attachment | None:
+            return next((x for x in index.get(key, ()) if id(x) not in taken), None)
+
+        for address in addresses:
+            self._logger.debug(f"Finding inventory item with IMSI: {address.imsi}")
+            item = items_by_imsi.get(str(address.imsi))
+            if item is None:
+                self._logger.error(
+                    f"Unable to find matching item by imsi ({address.imsi}) for IP address {address.ipv4}, skipping item"
+                )
+                ret.unmatched.append(address)
+                ret.can_delete = False
+                continue
+            item.ipv4 = address.ipv4
+            if item.ipv4 is None or item.sonar_id is None:
+                self._logger.error(
+                    f"No IP address or sonar_id for item: {item}; skipping"
+                )
+                continue
+            attachment = lookup(by_item, item.sonar_id)
+            if attachment is None:
+                self._logger.debug(
+                    f"No attachment for item: {item.sonar_id} found in sonar, checking IP addresses"
+                )
+                attachment = lookup(by_address, item.ipv4)
+            if attachment is None:
+                self._logger.debug(
+                    f"No attachment for IP address {item.ipv4} found in sonar, creating new allocation record"
+                )
+                ret.creates.append(Attachment.item_to_attachment(item))
+                continue
+            taken.add(id(attachment))
+            if attachment.sonar_id is None:
+                self._logger.error(f"No sonar_id for attachment: {attachment}; skipping")
+                continue
+            if (
+                attachment.address == item.ipv4
+                and attachment.sonar_item_id == item.sonar_id
+            ):
+                self._logger.debug(
+                    f"{attachment} already has the IP address {item.ipv4} and associated item {item.sonar_id}, no need to update"
+                )
+                ret.unchanged += 1
+                continue
+            wanted = Attachment(item.sonar_id, attachment.timestamp)
+            wanted.sonar_id = attachment.sonar_id
+            wanted.set_address(item.ipv4)
+            ret.updates.append((attachment, wanted))
+        for attachment in attachments:
+            if id(attachment) in taken:
+                continue
+            if attachment.sonar_id is None:
+                self._logger.error(f"No sonar id for attachment {attachment}")
+                continue
+            ret.deletes.append(attachment)
+        return ret
+
+    # plans only the sessions in `changes` (imsi -> address, None when the
+    # session is gone) against the attachments they touch
+    def delta_plan(
+        self,
+        changes: dict[str, _IPv4Address | None],
+        items_by_imsi: dict[str, _Item],
+        by_item: dict[str, list[Attachment]],
+        by_address: dict[_IPv4Address, list[Attachment]],
+    ) -> AllocationPlan:
+        related: dict[int, Attachment] = {}
+        addresses = []
+        for imsi, ipv4 in changes.items():
+            item = items_by_imsi.get(imsi)
+            if item is not None and item.sonar_id is not None:
+                for x in by_item.get(item.sonar_id, ()):
+                    related[id(x)] = x
+            if ipv4 is None:
+                continue
+            # whoever held the address before has to give it up
+            for x in by_address.get(ipv4, ()):
+                related[id(x)] = x
+            address = _Item()
+            address.imsi = _IMSI(imsi)
+            address.ipv4 = ipv4
+            addresses.append(address)
+        return self.plan(related.values(), addresses, items_by_imsi)
+
+    async def build_plan(self) -> AllocationPlan:
+        attachments, addresses = await _gather(
+            self._get_assignments(), self._get_addresses()
+        )
+        self._logger.debug(f"Attachements from sonar:\n{attachments}")
+        self._logger.debug(f"Addresses from raemis:\n{addresses}")
+        return self.plan(attachments, addresses)
+
+    async def _preview(self) -> AllocationPlan:
+        try:
+            return await self.build_plan()
+        finally:
+            if self._finalize is not None:
+                await self._finalize()
+
+    def dry_run(self) -> AllocationPlan:
+        try:
+            return self._run(self._preview())
+        finally:
+            self._stop()
+
+    async def apply(self, plan: AllocationPlan) -> AllocationPlan:
+        limit = _Semaphore(self._concurrency)
+
+        async def bounded(
+            fn: _Callable[[Attachment], _Coroutine[_Any, _Any, Attachment]],
+            attachment: Attachment,
+        ) -> Attachment:
+            async with limit:
+                return await fn(attachment)
+
+        attempted = list(plan.creates)
+        attempted.extend(new for _, new in plan.updates)
+        changes = [bounded(self._create, x) for x in plan.creates]
+        changes.extend(bounded(self._update, new) for _, new in plan.updates)
+        results = await _gather(*changes, return_exceptions=True)
+        for attachment, result in zip(attempted, results):
+            # a create that comes back without an id did not make it either
+            if not isinstance(result, BaseException) and attachment.sonar_id is None:
+                result = ValueError(f"no sonar id after creating {attachment}")
+            if isinstance(result, BaseException):
+                plan.rejected.append(attachment)
+                self._logger.error(
+                    f"Failed to apply an IP attachment change; will try again next time: {result!r}"
+                )
+        failed = plan.rejected
+        plan.failed = len(failed)
+        if failed or not plan.can_delete:
+            self._logger.warning(
+                f"skipping {len(plan.deletes)} delete(s) on this pass"
+            )
+            return plan
+        results = await _gather(
+            *(bounded(self._delete, x) for x in plan.deletes), return_exceptions=True
+        )
+        for attachment, result in zip(plan.deletes, results):
+            if isinstance(result, BaseException):
+                plan.failed += 1
+                plan.rejected.append(attachment)
+                self._logger.error(
+                    f"Failed to delete attachment: {attachment}: {result!r}"
+                )
+        return plan
+
+    async def _reconcile(self) -> AllocationPlan:
+        try:
+            plan = await self.build_plan()
+            self._logger.info(f"allocation plan: {plan.summary}")
+            self._logger.debug(f"allocation plan:\n{plan}")
+            return await self.apply(plan)
+        finally:
+            if self._finalize is not None:
+                await self._finalize()
+
+    # a pull pass that only goes to sonar for the sessions that changed since
+    # the last one, and not at all when none did. every `full_interval`
+    # seconds, and after anything failed, the whole plan is built instead
+    async def _pull(self) -> AllocationPlan:
+        try:
+            items = self._index_inventory()
+            # sessions without an item are retried once an item shows up
+            found = [x for x in self._unmatched if x in items]
+            self._unmatched.difference_update(found)
+            self._sessions.forget(found)
+            addresses = list(await self._get_addresses())
+            delta = self._sessions.diff(addresses)
+            # ended sessions whose deletes were held back last time
+            changes = dict.fromkeys(self._held)
+            changes.update(delta.changes)
+            self._held = []
+            if _time.monotonic() >= self._next_full:
+                self._next_full = _time.monotonic() + self._full_interval
+                plan = self.plan(await self._get_assignments(), addresses, items)
+            elif not changes:
+                self._logger.debug("no data session changes, skipping sonar")
+                return AllocationPlan()
+            else:
+                self._logger.info(f"data session changes: {delta.summary}")
+                attachments = await self._get_assignments()
+                by_item, by_address = self._index_attachments(attachments)
+                plan = self.delta_plan(changes, items, by_item, by_address)
+                if plan.deletes and not plan.can_delete:
+                    self._held = [x for x, ip in changes.items() if ip is None]
+            self._unmatched.update(str(x.imsi) for x in plan.unmatched if x.imsi)
+            self._logger.info(f"allocation plan: {plan.summary}")
+            self._logger.debug(f"allocation plan:\n{plan}")
+            plan = await self.apply(plan)
+            if plan.failed:
+                self._next_full = 0.0
+            return plan
+        except:
+            self._next_full = 0.0
+            raise
+        finally:
+            if self._finalize is not None:
+                await self._finalize()
 
     def poll(self):
         self._logger.debug(f"inventory list:\n{self._inventory}")
-        while not self._event.is_set():
-            attachments = set(_run(self._get_assignments()))
-            addresses = _run(self._get_addresses())
-            self._logger.debug(f"Attachements from sonar:\n{attachments}")
-            self._logger.debug(f"Addresses from raemis:\n{addresses}")
-            can_delete = True
-            for address in addresses:
+        try:
+            while not self._event.is_set():
                 try:
-                    self._logger.debug(
-                        f"Finding inventory item with IMSI: {address.imsi}"
-                    )
-                    item = next(
-                        x for x in self._inventory if str(x.imsi) == str(address.imsi)
-                    )
-                    item.ipv4 = address.ipv4
+                    self._run(self._pull())
                 except:
                     self._logger.exception(
-                        f"Unable to find matching item by imsi ({address.imsi}) for IP address {address.ipv4}, skipping item"
+                        "IP allocation pass failed; will try again on the next pass"
                     )
-                    can_delete = False
+                _time.sleep(self._delay)
+        finally:
+            self._stop()
+
+
+# applies ip changes pushed by raemis session events as they happen. events
+# are coalesced per imsi over a short window and planned against the
+# assignments cached from the last full pass, so sonar only sees the changes.
+# a full pull pass still runs every `delay` seconds to catch missed events.
+# with a journal, sonar mutations are written down before they are sent and
+# events stay pending until their changes are applied; both are picked up
+# again on restart instead of waiting for a full pass
+class PushAllocator(PullAllocator):
+    _window: float
+    _pending: dict[str, _IPv4Address | None]
+    _pending_lock: _Lock
+    _wake: _Event
+    _resync: bool
+    _items: dict[str, _Item]
+    _by_item: dict[str, list[Attachment]]
+    _by_address: dict[_IPv4Address, list[Attachment]]
+    _journal: _Journal | None
+    _pending_lsns: list[int]
+    _retry: float
+
+    def __init__(
+        self,
+        *args,
+        window: float = 0.25,
+        journal: _Journal | None = None,
+        retry: float = 5.0,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self._window = window
+        self._retry = retry
+        self._journal = journal
+        self._pending = {}
+        self._pending_lsns = []
+        self._pending_lock = _Lock()
+        self._wake = _Event()
+        self._resync = True
+        self._items = {}
+        self._by_item = {}
+        self._by_address = {}
+
+    def submit(self, imsi: str, ipv4: _IPv4Address | None, lsn: int = 0) -> None:
+        imsi = str(_IMSI(imsi))
+        with self._pending_lock:
+            if lsn:
+                self._pending_lsns.append(lsn)
+            if imsi:
+                # only the latest state of each session matters
+                self._pending[imsi] = ipv4
+        self._wake.set()
+
+    def on_event(
+        self, event: str, imsi: str, ipv4: _IPv4Address | None, lsn: int = 0
+    ) -> None:
+        if event == "pdp_context_deactivated":
+            self.submit(imsi, None, lsn)
+        elif ipv4 is not None:
+            self.submit(imsi, ipv4, lsn)
+        else:
+            self._logger.warning(f"no address in {event} for {imsi}, resyncing")
+            if lsn and self._journal is not None:
+                self._journal.ack([lsn])
+            self.resync()
+
+    def on_events(self, events: _Iterable[_Any]) -> None:
+        for e in events:
+            self.on_event(e.event, e.imsi, e.ipv4, getattr(e, "lsn", 0))
+
+    def resync(self) -> None:
+        self._resync = True
+        self._wake.set()
+
+    def _take(self) -> tuple[dict[str, _IPv4Address | None], list[int]]:
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            lsns, self._pending_lsns = self._pending_lsns, []
+            self._wake.clear()
+        return pending, lsns
+
+    def _remember(self, attachment: Attachment) -> None:
+        self._by_item.setdefault(attachment.sonar_item_id, []).append(attachment)
+        if getattr(attachment, "address", None) is not None:
+            self._by_address.setdefault(attachment.address, []).append(attachment)
+
+    def _forget(self, attachment: Attachment) -> None:
+        for index, key in (
+            (self._by_item, attachment.sonar_item_id),
+            (self._by_address, getattr(attachment, "address", None)),
+        ):
+            found = index.get(key, [])
+            found[:] = [x for x in found if x is not attachment]
+            if not found:
+                index.pop(key, None)
+
+    async def build_plan(self) -> AllocationPlan:
+        attachments, addresses = await _gather(
+            self._get_assignments(), self._get_addresses()
+        )
+        attachments = list(attachments)
+        self._items = self._index_inventory()
+        self._by_item, self._by_address = self._index_attachments(attachments)
+        return self.plan(attachments, addresses, self._items)
+
+    @classmethod
+    def _mutations(cls, plan: AllocationPlan) -> list[dict[str, _Any]]:
+        def record(op: str, a: Attachment) -> dict[str, _Any]:
+            address = getattr(a, "address", None)
+            return {
+                "op": op,
+                "id": a.sonar_id,
+                "item": a.sonar_item_id,
+                "ip": repr(address) if address is not None else None,
+            }
+
+        ret = [record("create", x) for x in plan.creates]
+        ret.extend(record("update", new) for _, new in plan.updates)
+        if plan.can_delete:
+            ret.extend(record("delete", x) for x in plan.deletes)
+        return ret
+
+    # lines up with _mutations: whether each one reached sonar
+    @classmethod
+    def _applied(cls, plan: AllocationPlan) -> list[bool]:
+        rejected = {id(x) for x in plan.rejected}
+        ret = [id(x) not in rejected for x in plan.creates]
+        ret.extend(id(new) not in rejected for _, new in plan.updates)
+        if plan.can_delete:
+            # deletes are held back when a create or update failed
+            held = not all(ret)
+            ret.extend(not held and id(x) not in rejected for x in plan.deletes)
+        return ret
+
+    async def apply(self, plan: AllocationPlan) -> AllocationPlan:
+        lsns = []
+        if self._journal is not None:
+            lsns = self._journal.extend(self._mutations(plan))
+            if lsns:
+                self._journal.sync(lsns[-1])
+        return await self._apply_recorded(plan, lsns)
+
+    async def _apply_recorded(
+        self, plan: AllocationPlan, lsns: list[int]
+    ) -> AllocationPlan:
+        plan = await super().apply(plan)
+        if self._journal is not None:
+            # what did not get through stays pending until a full pass
+            # covers it, or for the replay after a restart
+            applied = self._applied(plan)
+            self._journal.ack(lsn for lsn, ok in zip(lsns, applied) if ok)
+        if plan.failed:
+            self._resync = True
+            return plan
+        for attachment in plan.creates:
+            if attachment.sonar_id is not None:
+                self._remember(attachment)
+        for old, new in plan.updates:
+            self._forget(old)
+            self._remember(new)
+        if plan.can_delete:
+            for attachment in plan.deletes:
+                self._forget(attachment)
+        return plan
+
+    def push_plan(self, changes: dict[str, _IPv4Address | None]) -> AllocationPlan:
+        if any(imsi not in self._items for imsi in changes):
+            # picks up items added by an inventory refresh
+            self._items = self._index_inventory()
+        return self.delta_plan(changes, self._items, self._by_item, self._by_address)
+
+    async def _push(
+        self, changes: dict[str, _IPv4Address | None], lsns: list[int] | None = None
+    ) -> AllocationPlan:
+        lsns = lsns or []
+        try:
+            plan = self.push_plan(changes)
+            if plan:
+                self._logger.info(f"pushed allocation plan: {plan.summary}")
+                plan = await self.apply(plan)
+            if self._journal is not None:
+                self._journal.ack(lsns)
+            return plan
+        finally:
+            if self._finalize is not None:
+                await self._finalize()
+
+    # returns the plan, the lsns lined up with its mutations and the lsns of
+    # the ones that need nothing more
+    def _replay_plan(
+        self, mutations: list[tuple[int, dict[str, _Any]]]
+    ) -> tuple[AllocationPlan, list[int], list[int]]:
+        by_id = {x.sonar_id: x for xs in self._by_item.values() for x in xs}
+        plan = AllocationPlan()
+        creates, updates, deletes, done = [], [], [], []
+        for lsn, m in mutations:
+            wanted = Attachment(m["item"])
+            wanted.sonar_id = m["id"]
+            if m["ip"]:
+                wanted.set_address(_IPv4Address.parse(m["ip"]))
+            current = by_id.get(m["id"])
+            # skip whatever reached sonar before the restart
+            if m["op"] == "create":
+                held = self._by_item.get(m["item"], ())
+                if not any(x.address == wanted.address for x in held):
+                    plan.creates.append(wanted)
+                    creates.append(lsn)
+                    continue
+            elif m["op"] == "update" and current is not None:
+                if (current.address, current.sonar_item_id) != (
+                    wanted.address,
+                    wanted.sonar_item_id,
+                ):
+                    plan.updates.append((current, wanted))
+                    updates.append(lsn)
                     continue
+            elif m["op"] == "delete" and current is not None:
+                plan.deletes.append(current)
+                deletes.append(lsn)
+                continue
+            done.append(lsn)
+        return plan, creates + updates + deletes, done
+
+    # loads the sonar assignments (but not the raemis sessions) and finishes
+    # whatever the journal says was left in flight
+    async def _recover(self) -> None:
+        try:
+            attachments = list(await self._get_assignments())
+            self._items = self._index_inventory()
+            self._by_item, self._by_address = self._index_attachments(attachments)
+            mutations = []
+            for lsn, record in self._journal.pending():
+                if "op" in record:
+                    mutations.append((lsn, record))
+                elif "event" in record:
+                    ipv4 = _IPv4Address.parse(record["ip"]) if record["ip"] else None
+                    self.on_event(record["event"], record["imsi"], ipv4, lsn)
+            plan, lsns, done = self._replay_plan(mutations)
+            self._journal.ack(done)
+            self._logger.info(
+                f"replaying {len(mutations)} journaled mutations ({plan.summary}) and {len(self._pending)} sessions"
+            )
+            await self._apply_recorded(plan, lsns)
+        finally:
+            if self._finalize is not None:
+                await self._finalize()
+
+    def poll(self):
+        try:
+            next_full = 0.0
+            # after a crash, finish the journaled work instead of a full pass
+            if self._journal is not None and len(self._journal):
+                self._resync = False
                 try:
-                    attachment = next(
-                        x for x in attachments if x.sonar_item_id == item.sonar_id
-                    )
+                    self._run(self._recover())
+                    next_full = _time.monotonic() + self._delay
                 except:
-                    self._logger.debug(
-                        f"No attachment for item: {item.sonar_id} found in sonar, checking IP addresses"
-                    )
-                    try:
-                        attachment = next(
-                            x for x in attachments if x.address == item.ipv4
-                        )
-                    except:
-                        self._logger.debug(
-                            f"No attachment for IP address {item.ipv4} found in sonar, creating new allocation record"
-                        )
-                        try:
-                            attachment = _run(
-                                self._create(Attachment.item_to_attachment(item))
-                            )
-                            self._logger.info(f"created attachment: {attachment}")
-                            continue
-                        except:
-                            self._logger.exception(
-                                f"Failed to create an IP attachment in Sonar for item: {item} at address {item.ipv4}; will try again on the next pass"
-                            )
-                            continue
-                if (
-                    attachment.sonar_id is None
-                    or item.ipv4 is None
-                    or item.sonar_id is None
-                ):
-                    self._logger.error(
-                        f"No sonar_id for attachment: {attachment}; skipping"
+                    self._logger.exception(
+                        "journal replay failed, running a full pass"
                     )
+                    self._resync = True
+            # pushes are planned against the cache of the last full pass, so
+            # nothing is pushed until a full pass has gone through cleanly
+            while not self._event.is_set():
+                if self._resync or _time.monotonic() >= next_full:
+                    self._resync = False
+                    # a clean full pass covers everything journaled before it,
+                    # including events from a push that failed
+                    before = []
+                    if self._journal is not None:
+                        before = [lsn for lsn, _ in self._journal.pending()]
                     try:
-                        self._logger.debug(
-                            f"deleting {attachment} from the set of current attachemnts"
-                        )
-                        attachments.remove(attachment)
+                        self._run(self._reconcile())
                     except:
                         self._logger.exception(
-                            f"Failed to delete the attachment from the set; have to skip deletes this time"
+                            f"IP allocation pass failed; trying again in {self._retry}s"
                         )
-                        can_delete = False
+                        self._resync = True
+                    if before and not self._resync:
+                        self._journal.ack(before)
+                    if self._resync:
+                        self._event.wait(self._retry)
+                    next_full = _time.monotonic() + self._delay
                     continue
-                if (
-                    attachment.address == item.ipv4
-                    and attachment.sonar_item_id == item.sonar_id
-                ):
-                    self._logger.info(
-                        f"{attachment} already has the IP address {item.ipv4} and associated item {item.sonar_id}, no need to update"
-                    )
-                    try:
-                        self._logger.debug(
-                            f"deleting {attachment} from the set of current attachemnts"
-                        )
-                        attachments.remove(attachment)
-                    except:
-                        self._logger.exception(
-                            f"Failed to delete the attachment from the set; have to skip deletes this time"
-                        )
-                        can_delete = False
+                # wake up at least once a second to notice the stop event
+                timeout = min(1.0, max(0.0, next_full - _time.monotonic()))
+                if not self._wake.wait(timeout):
                     continue
-                else:
-                    self._logger.info(
-                        f"updating {attachment} with ip address {item.ipv4}"
-                    )
-                    attachment.set_address(item.ipv4)
-                    self._logger.debug(f"updated IP address for {attachment}")
-                    self._logger.info(
-                        f"updating {attachment} with item id {item.sonar_id}"
-                    )
-                    attachment.sonar_item_id = item.sonar_id
-                    self._logger.debug(f"updated item ID for {attachment}")
-                    try:
-                        self._logger.debug(
-                            f"attempting to update attachment: {attachment}"
-                        )
-                        attachment = _run(self._update(attachment))
-                        self._logger.info(f"updated attachment: {attachment}")
-                    except:
-                        self._logger.exception(
-                            f"Failed to update attachment: {attachment}; will try again next time"
-                        )
-                        can_delete = False
-                    try:
-                        self._logger.debug(
-                            f"deleting {attachment} from the set of current attachemnts"
-                        )
-                        attachments.remove(attachment)
-                    except:
-                        self._logger.exception(
-                            f"Failed to delete the attachment from the set; have to skip deletes this time"
-                        )
-                        can_delete = False
-            self._logger.debug(f"attachments after loop:\n{attachments}")
-            if can_delete:
-                for attachment in attachments:
-                    self._logger.info(
-                        f"Remaining attachment {attachment} needs to be deleted from Sonar"
-                    )
-                    try:
-                        if attachment.sonar_id is not None:
-                            _run(self._delete(attachment))
-                            self._logger.debug(f"deleted {attachment}")
-                        else:
-                            self._logger.error(
-                                f"No sonar id for attachment {attachment}"
-                            )
-                    except:
-                        self._logger.exception(
-                            f"Failed to delete attachment: {attachment}"
-                        )
-            _time.sleep(self._delay)
+                _time.sleep(self._window)
+                changes, lsns = self._take()
+                if not changes and not lsns:
+                    continue
+                try:
+                    self._run(self._push(changes, lsns))
+                except:
+                    self._logger.exception("pushing IP changes failed, resyncing")
+                    self._resync = True
+        finally:
+            self._stop()
@@ -5,8 +5,89 @@
 # license that can be found in the LICENSE file or at
 # https://opensource.org/licenses/MIT.
 
+from dataclasses import dataclass as _dc
+from functools import cache as _cache
+from typing import Any as _Any
+from gql import gql as _gql
+from graphql import (
+    FieldNode as _FieldNode,
+    NameNode as _NameNode,
+    OperationDefinitionNode as _OperationDefinitionNode,
+    SelectionSetNode as _SelectionSetNode,
+    VariableNode as _VariableNode,
+    Visitor as _Visitor,
+    print_ast as _print_ast,
+    visit as _visit,
+)
 from model.atoms import Model as _Model
 
+
+@_dc(frozen=True)
+class CompiledQuery:
+    query: str
+    document: _Any
+    operation: str | None
+    root: str
+
+    @property
+    def name(self) -> str:
+        return self.operation if self.operation else self.root
+
+
+@_cache
+def compile_query(query: str) -> CompiledQuery:
+    document = _gql(query)
+    definition = document.definitions[0]
+    operation = definition.name.value if definition.name else None
+    root = definition.selection_set.selections[0].name.value
+    return CompiledQuery(query, document, operation, root)
+
+
+class _SuffixVariables(_Visitor):
+    def __init__(self, suffix: str):
+        super().__init__()
+        self._suffix = suffix
+
+    def enter_variable(self, node: _VariableNode, *_) -> _VariableNode:
+        return _VariableNode(name=_NameNode(value=f"{node.name.value}{self._suffix}"))
+
+
+def batch_alias(index: int) -> str:
+    return f"m{index}"
+
+
+def batch_variables(vs: list[dict[str, _Any]]) -> dict[str, _Any]:
+    return {f"{k}{i}": v for i, values in enumerate(vs) for k, v in values.items()}
+
+
+@_cache
+def compile_batch(query: str, size: int) -> CompiledQuery:
+    definition = compile_query(query).document.definitions[0]
+    variables = []
+    selections = []
+    for i in range(size):
+        renamed = _visit(definition, _SuffixVariables(str(i)))
+        variables.extend(renamed.variable_definitions)
+        field = renamed.selection_set.selections[0]
+        selections.append(
+            _FieldNode(
+                alias=_NameNode(value=batch_alias(i)),
+                name=field.name,
+                arguments=field.arguments,
+                directives=field.directives,
+                selection_set=field.selection_set,
+            )
+        )
+    name = compile_query(query).name
+    batch = _OperationDefinitionNode(
+        operation=definition.operation,
+        name=_NameNode(value=f"{name}_batch_{size}"),
+        variable_definitions=tuple(variables),
+        directives=(),
+        selection_set=_SelectionSetNode(selections=tuple(selections)),
+    )
+    return compile_query(_print_ast(batch))
+
 get_inventory_items = """
         query ($page: Paginator!) {
         inventory_items(paginator:$page){
@@ -9,6 +9,7 @@
 import asyncio
 from asyncio.tasks import Task
 from typing import (
+    Any as _Any,
     Callable as _Callable,
     Coroutine as _Coroutine,
     AsyncIterable as _AsyncIterable,
@@ -34,6 +35,7 @@ from asyncio import (
 )
 from model.atoms import Item as _Item, Manufacturer as _Manufacturer, Model as _Model
 from model.network import IMEI as _IMEI, IMSI as _IMSI, MACAddress as _MACAddress
+from model.metrics import MetricStore as _MetricStore, reduce_chains as _reduce_chains
 
 
 _disable_warnings()
@@ -41,6 +43,9 @@ _disable_warnings()
 
 class Baicells:
     _logger = _logging.getLogger(__name__)
+    metrics: _MetricStore | None = None
+    # values reported once per antenna chain
+    _chains = ("rsrp", "rsrq", "rssi")
 
     @classmethod
     async def get_items(cls, i: _Iterable[_Item]) -> _Iterable[_Item]:
@@ -125,7 +130,7 @@ class Baicells:
                     value["rsrq"] = cls.get_rsrq
                     value["rssi"] = cls.get_rssi
 
-                    it: dict[str, str] = {}
+                    it: dict[str, _Any] = {}
                     ret = _Item()
                     for k in value:
                         if session.closed:
@@ -134,7 +139,10 @@ class Baicells:
                             async for v in value[k](session):
                                 if v is not None:
                                     try:
-                                        it[k] = v
+                                        if k in cls._chains:
+                                            it.setdefault(k, []).append(v)
+                                        else:
+                                            it[k] = v
                                     except:
                                         cls._logger.exception(
                                             f"failed to get {k} for Baicells at {baseUrl}"
@@ -145,6 +153,8 @@ class Baicells:
                         except:
                             break
                     ret = cls._assign(it)
+                    if cls.metrics is not None:
+                        cls.metrics.record(ret, item)
 
                 except:
                     cls._logger.exception(f"failed for baicells at {baseUrl}")
@@ -158,14 +168,7 @@ class Baicells:
         return ret
 
     @classmethod
-    def str_to_float(cls, s: str) -> float | None:
-        try:
-            return float(s)
-        except:
-            return None
-
-    @classmethod
-    def _assign(cls, d: dict[str, str]) -> _Item:
+    def _assign(cls, d: dict[str, _Any]) -> _Item:
         i: _Item = _Item()
         i.imei = _IMEI(d["imei"]) if "imei" in d else None
         i.imsi = _IMSI(d["imsi"]) if "imsi" in d else None
@@ -184,33 +187,9 @@ class Baicells:
         i.earfcn = d["earfcn"] if "earfcn" in d else None
         i.pci = d["pci"] if "pci" in d else None
         i.sinr = d["sinr"] if "sinr" in d else None
-        part = 0
-        many = 0
-        if "rsrp" in d:
-            for val in d["rsrp"]:
-                check = cls.str_to_float(val)
-                if check:
-                    part += check
-                    many += 1
-        i.rsrp = str(part // many) if part else None
-        part = 0
-        many = 0
-        if "rsrq" in d:
-            for val in d["rsrq"]:
-                check = cls.str_to_float(val)
-                if check:
-                    part += check
-                    many += 1
-        i.rsrq = str(part // many) if part else None
-        part = 0
-        many = 0
-        if "rssi" in d:
-            for val in d["rssi"]:
-                check = cls.str_to_float(val)
-                if check:
-                    part += check
-                    many += 1
-        i.rssi = str(part // many) if part else None
+        i.rsrp = _reduce_chains(d["rsrp"]) if "rsrp" in d else None
+        i.rsrq = _reduce_chains(d["rsrq"]) if "rsrq" in d else None
+        i.rssi = _reduce_chains(d["rssi"]) if "rssi" in d else None
         return i
 
     @staticmethod
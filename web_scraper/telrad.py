@@ -14,8 +14,8 @@ from model.network import (
     MACAddress as _MACAddress,
 )
 from model.atoms import Item as _Item, Model as _Model, Manufacturer as _Manufacturer
+from model.metrics import MetricStore as _MetricStore, reduce_chains as _reduce_chains
 import xml.etree.ElementTree as _ElementTree
-import re as _re
 import logging as _logging
 from typing import Iterable as _Iterable
 from asyncio import gather as _gather
@@ -23,6 +23,7 @@ from asyncio import gather as _gather
 
 class Telrad12300:
     _log = _logging.getLogger(__name__)
+    metrics: _MetricStore | None = None
 
     @classmethod
     async def get_items(cls, items: _Iterable[_Item]):
@@ -50,6 +51,8 @@ class Telrad12300:
                 i = await cls.rate_info(ip=ip, i=i, session=session)
                 i = await cls.mac_info(ip=ip, i=i, session=session)
                 # i = await cls.radio_info(ip=ip, i=i, session=session)
+                if cls.metrics is not None:
+                    cls.metrics.record(i)
                 return i
         except:
             cls._log.exception(f"could not get telrad info for {ip}")
@@ -99,26 +102,10 @@ class Telrad12300:
         root = await cls.get_page(ip, page, radio, session)
         rsrp = root.find("RSRP")
         if rsrp is not None and rsrp.text is not None:
-            parts = _re.split(r"\s*,\s*", rsrp.text)
-            tot = 0
-            for part in parts:
-                try:
-                    if float(part) != 0:
-                        tot += float(part)
-                except:
-                    continue
-            i.rsrp = str(tot) if tot != 0 else None
+            i.rsrp = _reduce_chains(rsrp.text)
         rsrq = root.find("RSRQ")
         if rsrq is not None and rsrq.text is not None:
-            parts = _re.split(r"\s*,\s*", rsrq.text)
-            tot = 0
-            for part in parts:
-                try:
-                    if float(part) != 0:
-                        tot += float(part)
-                except:
-                    continue
-            i.rsrq = str(tot) if tot != 0 else None
+            i.rsrq = _reduce_chains(rsrq.text)
         earfcn = root.find("EARFCN")
         if earfcn is not None and earfcn.text is not None:
             i.earfcn = earfcn.text